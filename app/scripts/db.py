@@ -1,7 +1,12 @@
 import psycopg2
+import psycopg2.extras
 import logging
+import io
+import csv
+import time
 import sys 
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 from psycopg2.extensions import connection
 
 # Configure logging
@@ -43,6 +48,8 @@ def connectDB() -> connection:
         
 def writeDB(connection: connection, databaseEntries):
     today = datetime.now()  # Keeps full timestamp
+    start = time.perf_counter()
+    count = 0
 
     cursor = connection.cursor()
 
@@ -62,9 +69,264 @@ def writeDB(connection: connection, databaseEntries):
         try:
             cursor.execute(insert_query, values)
             connection.commit()
+            count += 1
         except Exception as e:
             print("Error inserting data:", e)
             connection.rollback()
 
     cursor.close()
 
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    logging.info(f"writeDB: wrote {count} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+
+PRICE_COLUMNS = ("card", "listing_quantity", "lowest_price", "market_price",
+                 "rarity", "card_number", "set_name", "link", "date")
+
+# Column limits from the prices table in db/scripts/initDB.py
+MAX_TEXT_LENGTH = 100
+MAX_PRICE = Decimal("99999999.99")
+
+
+def clean_price_row(entry, date):
+    """
+    Convert a scraped Data entry into a tuple matching PRICE_COLUMNS.
+
+    Raises:
+        ValueError: If the entry would be rejected by the prices table.
+    """
+    card = (entry.card or "").strip()
+    if not card:
+        raise ValueError("missing card name")
+
+    try:
+        listing_quantity = int(entry.listing_quantity)
+    except (TypeError, ValueError):
+        raise ValueError(f"bad listing_quantity {entry.listing_quantity!r}")
+
+    prices = []
+    for field in ("lowest_price", "market_price"):
+        raw = str(getattr(entry, field)).replace("$", "").replace(",", "").strip()
+        try:
+            price = Decimal(raw).quantize(Decimal("0.01"))
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"bad {field} {getattr(entry, field)!r}")
+        if not price.is_finite() or abs(price) > MAX_PRICE:
+            raise ValueError(f"{field} out of range {price}")
+        prices.append(price)
+
+    rarity = entry.rarity.replace(',', '')
+    for field, value in (("card", card), ("rarity", rarity),
+                         ("card_number", entry.card_number), ("set_name", entry.set_name)):
+        if value is not None and len(value) > MAX_TEXT_LENGTH:
+            raise ValueError(f"{field} longer than {MAX_TEXT_LENGTH} characters")
+
+    return (card, listing_quantity, prices[0], prices[1], rarity,
+            entry.card_number, entry.set_name, entry.link, date)
+
+
+def bulk_write_db(connection: connection, databaseEntries, date=None):
+    """
+    Stream scraped Data entries into public.prices with a single COPY FROM STDIN.
+
+    Rows are validated up front; bad rows are returned in a reject list instead of
+    being inserted and rolled back one at a time. Everything else is written in one
+    transaction.
+
+    Args:
+        connection: An open psycopg2 connection.
+        databaseEntries: Iterable of Data objects from a scrape.
+        date: Timestamp to stamp on every row, defaults to now.
+
+    Returns:
+        tuple: (rows written, list of (entry, reason) rejects)
+    """
+    today = date or datetime.now()  # Keeps full timestamp
+    start = time.perf_counter()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rejects = []
+    count = 0
+    for entry in databaseEntries:
+        try:
+            row = clean_price_row(entry, today)
+        except Exception as e:
+            rejects.append((entry, str(e)))
+            continue
+        writer.writerow(["\\N" if value is None else value for value in row])
+        count += 1
+
+    if count == 0:
+        logging.warning(f"bulk_write_db: nothing to write, {len(rejects)} rejected")
+        return 0, rejects
+
+    buffer.seek(0)
+    copy_query = f"COPY public.prices ({', '.join(PRICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor = connection.cursor()
+    try:
+        cursor.copy_expert(copy_query, buffer)
+        connection.commit()
+    except Exception as e:
+        logging.error(f"Error bulk copying {count} rows into prices: {e}")
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    logging.info(f"bulk_write_db: wrote {count} rows in {elapsed:.2f}s ({rate:.0f} rows/sec), {len(rejects)} rejected")
+    for entry, reason in rejects:
+        logging.warning(f"Rejected row {getattr(entry, 'card', entry)!r}: {reason}")
+    return count, rejects
+
+
+
+def ensure_crawl_ledger(connection: connection):
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.crawl_ledger (
+            run_id TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            row_count INTEGER,
+            duration NUMERIC(10,2),
+            updated_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (run_id, page_number)
+        )
+    """)
+    connection.commit()
+    cursor.close()
+
+
+def get_completed_pages(connection: connection, run_id):
+    """
+    Return the set of page numbers already marked done for a crawl run.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT page_number FROM public.crawl_ledger
+            WHERE run_id = %s AND status = 'done'
+        """, (run_id,))
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def record_pages(connection: connection, run_id, pages):
+    """
+    Upsert ledger rows for finished pages.
+
+    Args:
+        connection: An open psycopg2 connection.
+        run_id (str): The crawl run the pages belong to.
+        pages: Iterable of (page_number, status, row_count, duration_seconds).
+    """
+    rows = [(run_id, page_number, status, row_count, round(duration, 2))
+            for page_number, status, row_count, duration in pages]
+    if not rows:
+        return
+    cursor = connection.cursor()
+    try:
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO public.crawl_ledger (run_id, page_number, status, row_count, duration)
+            VALUES %s
+            ON CONFLICT (run_id, page_number) DO UPDATE SET
+                status = EXCLUDED.status,
+                row_count = EXCLUDED.row_count,
+                duration = EXCLUDED.duration,
+                updated_at = now()
+        """, rows)
+        connection.commit()
+    except Exception as e:
+        logging.error(f"Error recording crawl ledger pages for run {run_id}: {e}")
+        connection.rollback()
+    finally:
+        cursor.close()
+
+
+def ensure_latest_prices(connection: connection):
+    """
+    Create public.latest_prices, the most recent snapshot of every card.
+
+    Returns:
+        bool: True when the table was just created and still has to be filled
+        from the full history.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT to_regclass('public.latest_prices')")
+    created = cursor.fetchone()[0] is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.latest_prices (
+            card VARCHAR(100) NOT NULL,
+            card_number VARCHAR(100) NOT NULL,
+            date DATE NOT NULL,
+            listing_quantity INTEGER,
+            lowest_price NUMERIC(10,2),
+            market_price NUMERIC(10,2),
+            rarity VARCHAR(100),
+            set_name VARCHAR(100),
+            link TEXT,
+            PRIMARY KEY (card, card_number)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS latest_prices_listing_quantity_idx ON public.latest_prices (listing_quantity)")
+    connection.commit()
+    cursor.close()
+    return created
+
+
+def refresh_latest_prices(connection: connection, since=None):
+    """
+    Fold snapshots from public.prices into public.latest_prices.
+
+    Args:
+        connection: An open psycopg2 connection.
+        since (date): Only read snapshots on or after this date, normally the
+            start of the scrape run. None rebuilds from the full history, as
+            does the first refresh after the table is created.
+
+    Returns:
+        int: Number of cards inserted or updated.
+    """
+    if ensure_latest_prices(connection):
+        since = None
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        # Only move a card forward, so refreshing an old date range never
+        # overwrites a newer snapshot. Sales rows written by fetch_all_sales
+        # have no listing_quantity and are not listing snapshots.
+        cursor.execute("""
+            INSERT INTO public.latest_prices
+                (card, card_number, date, listing_quantity, lowest_price, market_price, rarity, set_name, link)
+            SELECT DISTINCT ON (card, card_number)
+                card, card_number, date, listing_quantity, lowest_price, market_price, rarity, set_name, link
+            FROM public.prices
+            WHERE card IS NOT NULL AND card_number IS NOT NULL AND date IS NOT NULL
+                AND listing_quantity IS NOT NULL
+                AND (%(since)s::date IS NULL OR date >= %(since)s::date)
+            ORDER BY card, card_number, date DESC
+            ON CONFLICT (card, card_number) DO UPDATE SET
+                date = EXCLUDED.date,
+                listing_quantity = EXCLUDED.listing_quantity,
+                lowest_price = EXCLUDED.lowest_price,
+                market_price = EXCLUDED.market_price,
+                rarity = EXCLUDED.rarity,
+                set_name = EXCLUDED.set_name,
+                link = EXCLUDED.link
+            WHERE public.latest_prices.date <= EXCLUDED.date
+        """, {"since": since})
+        count = cursor.rowcount
+        connection.commit()
+    except Exception as e:
+        logging.error(f"Error refreshing latest_prices: {e}")
+        connection.rollback()
+        return 0
+    finally:
+        cursor.close()
+    logging.info(f"refresh_latest_prices: {count} cards updated in {time.perf_counter() - start:.2f}s")
+    return count
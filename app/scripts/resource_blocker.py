@@ -0,0 +1,124 @@
+"""Route interception shared by the Playwright scrapers.
+
+Aborts resource types the scrapers never read (images, fonts, stylesheets, media)
+and any request to a domain outside the scraper's allowlist (analytics, ads, tag
+managers). Counts what was blocked and how many bytes the allowed responses cost,
+so a run with TCG_BLOCK_RESOURCES=0 can be compared against a normal run.
+"""
+
+import os
+import logging
+from collections import Counter
+from urllib.parse import urlparse
+
+# Resource types the scrapers need to render TCGPlayer's search and product pages
+DEFAULT_ALLOWED_TYPES = frozenset({"document", "script", "xhr", "fetch"})
+# Scrapers that click through the page (modals, "Load More" buttons) need the
+# stylesheets, elements that are never laid out can't be clicked
+INTERACTIVE_ALLOWED_TYPES = DEFAULT_ALLOWED_TYPES | {"stylesheet"}
+
+# First party domains, subdomains are allowed too
+DEFAULT_ALLOWED_DOMAINS = ("tcgplayer.com",)
+
+
+def blocking_enabled():
+    return os.getenv("TCG_BLOCK_RESOURCES", "1").lower() not in ("0", "false", "no")
+
+
+class ResourceBlocker:
+    """
+    Abort unneeded requests for a Playwright context or page.
+
+    Args:
+        name (str): Scraper name used in the summary log line.
+        allowed_types (iterable): Playwright resource types to let through.
+        allowed_domains (iterable): Domains (and their subdomains) to let through.
+        enabled (bool): Defaults to the TCG_BLOCK_RESOURCES environment variable.
+    """
+
+    def __init__(self, name, allowed_types=DEFAULT_ALLOWED_TYPES, allowed_domains=DEFAULT_ALLOWED_DOMAINS, enabled=None):
+        self.name = name
+        self.allowed_types = frozenset(allowed_types)
+        self.allowed_domains = tuple(d.lower().lstrip(".") for d in allowed_domains)
+        self.enabled = blocking_enabled() if enabled is None else enabled
+        self.allowed_requests = 0
+        self.blocked_by_type = Counter()
+        self.blocked_by_domain = Counter()
+        self.bytes_loaded = 0
+
+    def _domain_allowed(self, host):
+        host = (host or "").lower()
+        return any(host == d or host.endswith("." + d) for d in self.allowed_domains)
+
+    def should_block(self, request):
+        """
+        Return the reason a request should be aborted, or None to let it through.
+        """
+        if not self.enabled:
+            return None
+        if request.resource_type not in self.allowed_types:
+            return "type"
+        url = urlparse(request.url)
+        if url.scheme in ("http", "https") and not self._domain_allowed(url.hostname):
+            return "domain"
+        return None
+
+    def _record(self, request, reason):
+        if reason == "type":
+            self.blocked_by_type[request.resource_type] += 1
+        elif reason == "domain":
+            self.blocked_by_domain[urlparse(request.url).hostname] += 1
+        else:
+            self.allowed_requests += 1
+
+    def handle(self, route):
+        reason = self.should_block(route.request)
+        self._record(route.request, reason)
+        if reason:
+            route.abort()
+        else:
+            route.continue_()
+
+    async def handle_async(self, route):
+        reason = self.should_block(route.request)
+        self._record(route.request, reason)
+        if reason:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_response(self, response):
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.bytes_loaded += int(length)
+
+    def attach(self, target):
+        """
+        Install the route handler on a sync API BrowserContext or Page.
+        """
+        target.route("**/*", self.handle)
+        target.on("response", self._on_response)
+        return self
+
+    async def attach_async(self, target):
+        """
+        Install the route handler on an async API BrowserContext or Page.
+        """
+        await target.route("**/*", self.handle_async)
+        target.on("response", self._on_response)
+        return self
+
+    @property
+    def blocked_requests(self):
+        return sum(self.blocked_by_type.values()) + sum(self.blocked_by_domain.values())
+
+    def summary(self):
+        if not self.enabled:
+            return f"[{self.name}] Resource blocking disabled: {self.allowed_requests} requests, {self.bytes_loaded / 1024:.0f} KB loaded"
+        types = ", ".join(f"{t}={n}" for t, n in self.blocked_by_type.most_common())
+        domains = ", ".join(f"{d}={n}" for d, n in self.blocked_by_domain.most_common(5))
+        return (f"[{self.name}] Blocked {self.blocked_requests} of {self.blocked_requests + self.allowed_requests} requests "
+                f"(types: {types or 'none'}; top domains: {domains or 'none'}), {self.bytes_loaded / 1024:.0f} KB loaded")
+
+    def log_summary(self):
+        logging.info(self.summary())
@@ -1,18 +1,27 @@
+import argparse
 import asyncio
-from asyncio import Semaphore
 from playwright.async_api import async_playwright
 from datetime import datetime
 import re
 import requests
 import db
+from resource_blocker import ResourceBlocker
+from search_extract import SEARCH_RESULTS_JS, normalize_row
 import sys
 import logging
 import os 
+import time
 DISCORD_WEBHOOK = "https://discord.com/api/webhooks/1420127534598848572/ooBttCltht5DZtO5SCvnV1d7z1wD8DIrn3VUxuyDl5KtFZ5CivPe-k0K5I0gC4KVijnx"
 
 #DISCORD_WEBHOOK = os.getenv("DISCORD_WEBHOOK")
 
-CONCURRENT_LIMIT = 3  # Try 2-5 to start
+CONCURRENT_LIMIT = 3  # Starting number of pages in flight
+MIN_CONCURRENT_LIMIT = 1
+MAX_CONCURRENT_LIMIT = 12
+LATENCY_TARGET = 15  # Seconds; slower pages stop the limit from growing
+BACKOFF_COOLDOWN = 10  # Seconds between multiplicative decreases
+QUEUE_MAX_PAGES = 20  # Pages waiting to be written before scrapers block
+WRITE_BATCH_SIZE = 500  # Rows per COPY into public.prices
 
 def send_discord_alert(message, webhook_url):
     data = {"content": message}
@@ -31,85 +40,267 @@ class Data:
         self.set_name = set_name
         self.link = link
 
+class Throttled(Exception):
+    pass
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for page workers.
+
+    The limit grows by one after a full window of healthy pages (no errors and
+    latency under LATENCY_TARGET) and halves on a timeout, an empty result page or
+    an HTTP 429. Decreases are rate limited so one burst of failures from pages that
+    were already in flight only backs off once.
+    """
+    def __init__(self, initial=CONCURRENT_LIMIT, minimum=MIN_CONCURRENT_LIMIT, maximum=MAX_CONCURRENT_LIMIT,
+                 latency_target=LATENCY_TARGET, cooldown=BACKOFF_COOLDOWN):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.healthy = 0
+        self.increases = 0
+        self.decreases = 0
+        self.peak = initial
+        self.low = initial
+        self._last_decrease = 0.0
+        self._busy_time = 0.0
+        self._last_change = time.monotonic()
+        self._started = self._last_change
+        self._cond = asyncio.Condition()
+
+    def _tick(self):
+        now = time.monotonic()
+        self._busy_time += self.in_flight * (now - self._last_change)
+        self._last_change = now
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self._tick()
+            self.in_flight += 1
+
+    async def release(self, ok, latency):
+        async with self._cond:
+            self._tick()
+            self.in_flight -= 1
+            now = time.monotonic()
+            if not ok:
+                self.healthy = 0
+                if now - self._last_decrease >= self.cooldown and self.limit > self.minimum:
+                    self.limit = max(self.minimum, self.limit // 2)
+                    self.decreases += 1
+                    self._last_decrease = now
+                    logging.info(f"Backing off, concurrency now {self.limit}")
+            elif latency <= self.latency_target:
+                self.healthy += 1
+                if self.healthy >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.increases += 1
+                    self.healthy = 0
+                    logging.info(f"Pages healthy, concurrency now {self.limit}")
+            self.peak = max(self.peak, self.limit)
+            self.low = min(self.low, self.limit)
+            self._cond.notify_all()
+
+    def summary(self):
+        elapsed = time.monotonic() - self._started
+        average = self._busy_time / elapsed if elapsed > 0 else 0
+        return (f"Concurrency: final {self.limit}, range {self.low}-{self.peak}, "
+                f"avg in flight {average:.1f}, +{self.increases}/-{self.decreases} adjustments")
+
 URL_TEMPLATE = "https://www.tcgplayer.com/search/pokemon/product?productLineName=pokemon&view=grid&ProductTypeName=Cards&page={page}&Condition=Near+Mint&Rarity=Ultra+Rare|Illustration+Rare|Special+Illustration+Rare|Hyper+Rare|Rare+BREAK|Amazing+Rare|Shiny+Ultra+Rare|Prism+Rare|Secret+Rare&inStock=true&Language=English&ListingType=standard"
 
-async def scrape_page(page_num, context, sem):
-    async with sem:
-        page = await context.new_page()
-        page_start = datetime.now()
-        print(f"Scraping page {page_num}")
-        await page.goto(URL_TEMPLATE.format(page=page_num))
-        try:
-            await page.wait_for_selector(".search-result", timeout=10000)
-        except Exception:
-            print(f"No listings on page {page_num}")
-            await page.close()
-            return []
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape TCGPlayer Pokemon search results into public.prices")
+    parser.add_argument('--resume', metavar='RUN_ID', help="Resume a previous run, skipping pages already marked done in the crawl ledger")
+    parser.add_argument('--extract', choices=['script', 'dom'], default='script',
+                        help="script reads every card in one in-page evaluate, dom walks each field with query_selector")
+    return parser.parse_args()
 
-        listings = await page.query_selector_all(".search-result")
+async def scrape_page(page_num, context, limiter, queue, extract="script"):
+    await limiter.acquire()
+    page_start = time.perf_counter()
+    try:
+        page_data = await parse_page(page_num, context, extract)
+        status = "done" if page_data else "empty"
+    except Exception as e:
+        logging.error(f"Failed to scrape page {page_num}: {e}")
         page_data = []
-        for listing in listings:
+        status = "failed"
+    duration = time.perf_counter() - page_start
+    try:
+        # Keep the limiter slot until the writer has room for the rows, so a slow
+        # writer stops new page loads instead of piling finished pages up in memory
+        await queue.put((page_num, status, page_data, duration))
+    finally:
+        # Empty result pages are how TCGPlayer soft-throttles, so treat them as failures
+        await limiter.release(status == "done", duration)
+    return len(page_data)
+
+async def page_worker(pending, context, limiter, queue, extract="script"):
+    """
+    Scrape page numbers from `pending` until it is empty.
+
+    Returns:
+        int: Rows scraped by this worker.
+    """
+    rows = 0
+    while True:
+        try:
+            page_num = pending.get_nowait()
+        except asyncio.QueueEmpty:
+            return rows
+        rows += await scrape_page(page_num, context, limiter, queue, extract)
+
+async def parse_page(page_num, context, extract="script"):
+    page = await context.new_page()
+    page_start = datetime.now()
+    print(f"Scraping page {page_num}")
+    try:
+        response = await page.goto(URL_TEMPLATE.format(page=page_num))
+    except Exception:
+        await page.close()
+        raise
+    if response is not None and response.status == 429:
+        await page.close()
+        raise Throttled(f"HTTP 429 on page {page_num}")
+    try:
+        await page.wait_for_selector(".search-result", timeout=10000)
+    except Exception:
+        print(f"No listings on page {page_num}")
+        await page.close()
+        return []
+
+    parse_start = time.perf_counter()
+    if extract == "script":
+        page_data = [Data(*normalize_row(raw)) for raw in await page.evaluate(SEARCH_RESULTS_JS)]
+    else:
+        page_data = await walk_listings(page, page_num)
+    logging.debug(f"Extracted {len(page_data)} cards from page {page_num} ({extract}) in {time.perf_counter() - parse_start:.3f}s")
+
+    # Print time taken for this page
+    page_end = datetime.now()
+    page_elapsed = page_end - page_start
+    p_min, p_sec = divmod(page_elapsed.total_seconds(), 60)
+    print(f"Finished page {page_num} in {int(p_min)} min {int(p_sec)} sec")
+    await page.close()
+    return page_data
+
+async def walk_listings(page, page_num):
+    # One query_selector round trip per field, kept for comparing against the script extractor
+    listings = await page.query_selector_all(".search-result")
+    page_data = []
+    for listing in listings:
+        try:
+            name_el = await listing.query_selector("[class*='product-card__title']")
+            name = await name_el.inner_text() if name_el else "Unknown"
+
+            listing_count_el = await listing.query_selector("span.inventory__listing-count")
+            listing_count_text = await listing_count_el.inner_text() if listing_count_el else "0"
+            listing_count = int(re.search(r"\d+", listing_count_text).group()) if re.search(r"\d+", listing_count_text) else 0
+
+            lowest_price_el = await listing.query_selector("span.inventory__price-with-shipping")
+            lowest_price = await lowest_price_el.inner_text() if lowest_price_el else "0"
+            lowest_price = lowest_price.replace("$", "").replace(",", "")
+
+            rarity_section = await listing.query_selector(".product-card__rarity__variant")
+            if rarity_section:
+                rarity_parts = await rarity_section.query_selector_all("span")
+                rarity = await rarity_parts[0].inner_text() if len(rarity_parts) > 0 else "Unknown"
+                card_number = await rarity_parts[1].inner_text() if len(rarity_parts) > 1 else "Unknown"
+            else:
+                rarity = "Unknown"
+                card_number = "Unknown"
+
+            set_name_el = await listing.query_selector(".product-card__set-name__variant")
+            set_name = await set_name_el.inner_text() if set_name_el else "Unknown"
+
+            market_price_el = await listing.query_selector("span.product-card__market-price--value")
+            market_price = await market_price_el.inner_text() if market_price_el else "0"
+            market_price = market_price.replace("$", "").replace(",", "")
+
+            link_el = await listing.query_selector("a[data-testid*='product-card__image']")
+            product_link = await link_el.get_attribute("href") if link_el else ""
+            if product_link and not product_link.startswith("http"):
+                product_link = "https://www.tcgplayer.com" + product_link
+
+            page_data.append(Data(
+                name, listing_count, lowest_price, market_price, rarity, card_number, set_name, product_link
+            ))
+        except Exception as e:
+            print(f"Error on page {page_num}: {e}")
+    return page_data
+
+async def db_writer(queue, connection, run_id, run_date, stats):
+    """
+    Drain parsed pages from the queue and flush them to Postgres in fixed-size batches
+    while the page workers keep scraping. Pages are only marked done in the crawl
+    ledger once the batch holding their rows has been committed.
+    """
+    batch = []
+    pages = []
+
+    async def flush():
+        if not pages:
+            return
+        rows = list(batch)
+        finished = list(pages)
+        batch.clear()
+        pages.clear()
+        if rows:
             try:
-                name_el = await listing.query_selector("[class*='product-card__title']")
-                name = await name_el.inner_text() if name_el else "Unknown"
-
-                listing_count_el = await listing.query_selector("span.inventory__listing-count")
-                listing_count_text = await listing_count_el.inner_text() if listing_count_el else "0"
-                listing_count = int(re.search(r"\d+", listing_count_text).group()) if re.search(r"\d+", listing_count_text) else 0
-
-                lowest_price_el = await listing.query_selector("span.inventory__price-with-shipping")
-                lowest_price = await lowest_price_el.inner_text() if lowest_price_el else "0"
-                lowest_price = lowest_price.replace("$", "").replace(",", "")
-
-                rarity_section = await listing.query_selector(".product-card__rarity__variant")
-                if rarity_section:
-                    rarity_parts = await rarity_section.query_selector_all("span")
-                    rarity = await rarity_parts[0].inner_text() if len(rarity_parts) > 0 else "Unknown"
-                    card_number = await rarity_parts[1].inner_text() if len(rarity_parts) > 1 else "Unknown"
-                else:
-                    rarity = "Unknown"
-                    card_number = "Unknown"
-
-                set_name_el = await listing.query_selector(".product-card__set-name__variant")
-                set_name = await set_name_el.inner_text() if set_name_el else "Unknown"
-
-                market_price_el = await listing.query_selector("span.product-card__market-price--value")
-                market_price = await market_price_el.inner_text() if market_price_el else "0"
-                market_price = market_price.replace("$", "").replace(",", "")
-
-                link_el = await listing.query_selector("a[data-testid*='product-card__image']")
-                product_link = await link_el.get_attribute("href") if link_el else ""
-                if product_link and not product_link.startswith("http"):
-                    product_link = "https://www.tcgplayer.com" + product_link
-
-                page_data.append(Data(
-                    name, listing_count, lowest_price, market_price, rarity, card_number, set_name, product_link
-                ))
+                written, rejects = await asyncio.to_thread(db.bulk_write_db, connection, rows, run_date)
+                stats["written"] += written
+                stats["rejected"] += len(rejects)
             except Exception as e:
-                print(f"Error on page {page_num}: {e}")
+                logging.error(f"Failed to write batch of {len(rows)} rows: {e}")
+                stats["failed"] += len(rows)
+                finished = [(page_num, "failed", count, duration) for page_num, _, count, duration in finished]
+        try:
+            await asyncio.to_thread(db.record_pages, connection, run_id, finished)
+        except Exception as e:
+            # The pages are simply scraped again on --resume
+            logging.error(f"Failed to record {len(finished)} pages in the crawl ledger: {e}")
 
-        # Print time taken for this page
-        page_end = datetime.now()
-        page_elapsed = page_end - page_start
-        p_min, p_sec = divmod(page_elapsed.total_seconds(), 60)
-        print(f"Finished page {page_num} in {int(p_min)} min {int(p_sec)} sec")
-        await page.close()
-        return page_data
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        page_num, status, rows, duration = item
+        batch.extend(rows)
+        pages.append((page_num, status, len(rows), duration))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            await flush()
+    await flush()
 
 async def main():
+    args = parse_args()
+
     # Logging and startup message
     start = datetime.now()
-    msg = f"Started Scraping {start.strftime('%Y-%m-%d %I:%M:%S %p')}"
+    run_id = args.resume or start.strftime("%Y%m%d-%H%M%S")
+    connection = db.connectDB()
+    db.ensure_crawl_ledger(connection)
+    completed_pages = db.get_completed_pages(connection, run_id) if args.resume else set()
+    msg = f"Started Scraping {start.strftime('%Y-%m-%d %I:%M:%S %p')} (run {run_id})"
+    if args.resume:
+        msg += f"\nResuming, {len(completed_pages)} pages already done"
     send_discord_alert(msg, DISCORD_WEBHOOK)
 
-    sem = Semaphore(CONCURRENT_LIMIT)
-    all_data = []
+    limiter = AdaptiveLimiter()
+    queue = asyncio.Queue(maxsize=QUEUE_MAX_PAGES)
+    stats = {"written": 0, "rejected": 0, "failed": 0}
+    writer = asyncio.create_task(db_writer(queue, connection, run_id, start, stats))
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         context = await browser.new_context(
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
             viewport={"width": 1280, "height": 800}
         )
+        blocker = await ResourceBlocker("search").attach_async(context)
 
         # Determine total pages
         page = await context.new_page()
@@ -133,28 +324,44 @@ async def main():
         print(f"Total pages detected: {total_pages}")
         await page.close()
 
-        tasks = [scrape_page(page_num, context, sem) for page_num in range(1, total_pages + 1)]
-        results = await asyncio.gather(*tasks)
-        for result in results:
-            all_data.extend(result)
+        pending_pages = [page_num for page_num in range(1, total_pages + 1) if page_num not in completed_pages]
+        print(f"Pages left to scrape: {len(pending_pages)}")
+        pending = asyncio.Queue()
+        for page_num in pending_pages:
+            pending.put_nowait(page_num)
+        # A fixed set of workers, the limiter decides how many of them load a page at once
+        workers = [page_worker(pending, context, limiter, queue, args.extract)
+                   for _ in range(min(MAX_CONCURRENT_LIMIT, len(pending_pages)))]
+        scraping = asyncio.gather(*workers)
+        try:
+            await asyncio.wait([scraping, writer], return_when=asyncio.FIRST_COMPLETED)
+            if not scraping.done():
+                # Nothing drains the queue once the writer is gone, the workers would block on put forever
+                logging.error(f"DB writer stopped early, cancelling the page workers: {writer.exception()!r}")
+                scraping.cancel()
+                results = []
+            else:
+                results = scraping.result()
+        finally:
+            if not writer.done():
+                # Let the writer flush whatever was already scraped, even if a page crashed
+                await queue.put(None)
+            await writer
 
         await browser.close()
-    
-        end = datetime.now()
-        elapsed = end - start
-        minutes, seconds = divmod(elapsed.total_seconds(), 60)
-        msg = f"Finished Scraping {end.strftime('%Y-%m-%d %I:%M:%S %p')}\nTime elapsed: {int(minutes)} min {int(seconds)} sec"
-        send_discord_alert(msg, DISCORD_WEBHOOK)
-
-    if all_data:
-        start = datetime.now()
-        db.writeDB(db.connectDB(), all_data)
-        end = datetime.now()
-        
-        elapsed = end - start
-        minutes, seconds = divmod(elapsed.total_seconds(), 60)
-        msg = f"Finished Writing to DB {end.strftime('%Y-%m-%d %I:%M:%S %p')}\nTime elapsed: {int(minutes)} min {int(seconds)} sec"
-        send_discord_alert(msg, DISCORD_WEBHOOK)
+
+    # A resumed run has rows from earlier days, so fold in the full history
+    refreshed = db.refresh_latest_prices(connection, None if args.resume else start.date())
+
+    logging.info(limiter.summary())
+    blocker.log_summary()
+    end = datetime.now()
+    elapsed = end - start
+    minutes, seconds = divmod(elapsed.total_seconds(), 60)
+    msg = (f"Finished Scraping {end.strftime('%Y-%m-%d %I:%M:%S %p')} (run {run_id})\nTime elapsed: {int(minutes)} min {int(seconds)} sec\n"
+           f"Rows scraped: {sum(results)}, written: {stats['written']}, rejected: {stats['rejected']}, failed: {stats['failed']}, latest prices refreshed: {refreshed}\n"
+           f"{limiter.summary()}\n{blocker.summary()}")
+    send_discord_alert(msg, DISCORD_WEBHOOK)
 
 if __name__ == "__main__":
     asyncio.run(main())
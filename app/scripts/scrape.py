@@ -6,6 +6,7 @@ from datetime import datetime
 import re
 import requests
 import db
+from search_extract import SELENIUM_SEARCH_RESULTS_JS, normalize_row
 import sys
 import argparse
 import logging
@@ -39,10 +40,19 @@ URL_TEMPLATE = "https://www.tcgplayer.com/search/pokemon/product?productLineName
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--resume', metavar='RUN_ID', help="Resume a previous run, skipping pages already marked done in the crawl ledger")
+    parser.add_argument('--extract', choices=['script', 'dom'], default='script',
+                        help="script reads every card in one execute_script call, dom walks each field with find_element")
     return parser.parse_args()
 
 args = parse_args()
 
+run_id = args.resume or start.strftime("%Y%m%d-%H%M%S")
+connection = db.connectDB()
+db.ensure_crawl_ledger(connection)
+completed_pages = db.get_completed_pages(connection, run_id) if args.resume else set()
+print(f"Crawl run {run_id}, {len(completed_pages)} pages already done")
+
 options = webdriver.ChromeOptions()
 options.add_argument('--headless=new')
 options.add_argument('--no-sandbox')
@@ -69,11 +79,13 @@ except Exception as e:
     total_pages = 1
 print(f"Total pages detected: {total_pages}")
 
-# Scrape each page sequentially
-all_data = []
+# Scrape each page sequentially, writing and checkpointing as each page finishes
+rows_written = 0
 
 # Inside your scraping loop
 for page in range(1, total_pages + 1):
+    if page in completed_pages:
+        continue
     page_start = datetime.now()
     print(f"Scraping page {page}")
     driver.get(URL_TEMPLATE.format(page=page))
@@ -82,9 +94,16 @@ for page in range(1, total_pages + 1):
         wait.until(EC.presence_of_element_located((By.CLASS_NAME, "search-result")))
     except:
         print(f"No listings on page {page}")
+        db.record_pages(connection, run_id, [(page, "empty", 0, (datetime.now() - page_start).total_seconds())])
         continue
 
-    listings = driver.find_elements(By.CLASS_NAME, "search-result")
+    all_data = []
+
+    if args.extract == "script":
+        all_data = [Data(*normalize_row(raw)) for raw in driver.execute_script(SELENIUM_SEARCH_RESULTS_JS)]
+        listings = []
+    else:
+        listings = driver.find_elements(By.CLASS_NAME, "search-result")
     for listing in listings:
         try:
             name = listing.find_element(By.CSS_SELECTOR, "[class*='product-card__title']").text.strip()
@@ -109,20 +128,30 @@ for page in range(1, total_pages + 1):
         except Exception as e:
             print(f"Error on page {page}: {e}")
     
+    status = "done" if all_data else "empty"
+    if all_data:
+        try:
+            written, rejects = db.bulk_write_db(connection, all_data, start)
+            rows_written += written
+        except Exception as e:
+            print(f"Failed to write page {page}: {e}")
+            status = "failed"
+
     # Print time taken for this page
     page_end = datetime.now()
     page_elapsed = page_end - page_start
+    db.record_pages(connection, run_id, [(page, status, len(all_data), page_elapsed.total_seconds())])
     p_min, p_sec = divmod(page_elapsed.total_seconds(), 60)
     print(f"Finished page {page} in {int(p_min)} min {int(p_sec)} sec")
 
 
 driver.quit()
 
-if all_data:
-    db.writeDB(db.connectDB(), all_data)
+# A resumed run has rows from earlier days, so fold in the full history
+refreshed = db.refresh_latest_prices(connection, None if args.resume else start.date())
 
 end = datetime.now()
 elapsed = end - start
 minutes, seconds = divmod(elapsed.total_seconds(), 60)
-msg = f"Finished Scraping {end.strftime('%Y-%m-%d %I:%M:%S %p')}\nTime elapsed: {int(minutes)} min {int(seconds)} sec"
+msg = f"Finished Scraping {end.strftime('%Y-%m-%d %I:%M:%S %p')} (run {run_id})\nTime elapsed: {int(minutes)} min {int(seconds)} sec\nRows written: {rows_written}, latest prices refreshed: {refreshed}"
 send_discord_alert(msg, DISCORD_WEBHOOK)
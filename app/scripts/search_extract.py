@@ -0,0 +1,65 @@
+"""Single round trip extraction of TCGPlayer search results.
+
+Walking each card with query_selector / find_element costs one browser round trip
+per field, up to eight per card. SEARCH_RESULTS_JS reads every card on the page in
+one evaluate call and normalize_row turns each raw dict into the same fields the
+DOM walkers produce, so both the Playwright and Selenium scrapers can use it.
+"""
+
+import re
+
+SEARCH_RESULTS_JS = """
+() => {
+    const text = (root, selector) => {
+        const el = root.querySelector(selector);
+        return el ? el.innerText.trim() : null;
+    };
+    return Array.from(document.querySelectorAll('.search-result')).map(listing => {
+        const rarityParts = Array.from(listing.querySelectorAll('.product-card__rarity__variant span'));
+        const link = listing.querySelector("a[data-testid*='product-card__image']");
+        return {
+            name: text(listing, "[class*='product-card__title']"),
+            listing_count: text(listing, 'span.inventory__listing-count'),
+            lowest_price: text(listing, 'span.inventory__price-with-shipping'),
+            market_price: text(listing, 'span.product-card__market-price--value'),
+            rarity: rarityParts.length > 0 ? rarityParts[0].innerText.trim() : null,
+            card_number: rarityParts.length > 1 ? rarityParts[1].innerText.trim() : null,
+            set_name: text(listing, '.product-card__set-name__variant'),
+            link: link ? link.getAttribute('href') : null,
+        };
+    });
+}
+"""
+
+# Selenium's execute_script runs a function body rather than an expression
+SELENIUM_SEARCH_RESULTS_JS = f"return ({SEARCH_RESULTS_JS})();"
+
+
+def _price(text):
+    return (text or "0").replace("$", "").replace(",", "")
+
+
+def normalize_row(raw):
+    """
+    Convert one dict from SEARCH_RESULTS_JS into Data constructor arguments.
+
+    Args:
+        raw (dict): Raw strings read from a .search-result element.
+
+    Returns:
+        tuple: (card, listing_quantity, lowest_price, market_price, rarity, card_number, set_name, link)
+    """
+    match = re.search(r"\d+", raw.get("listing_count") or "")
+    link = raw.get("link") or ""
+    if link and not link.startswith("http"):
+        link = "https://www.tcgplayer.com" + link
+    return (
+        raw.get("name") or "Unknown",
+        int(match.group()) if match else 0,
+        _price(raw.get("lowest_price")),
+        _price(raw.get("market_price")),
+        raw.get("rarity") or "Unknown",
+        raw.get("card_number") or "Unknown",
+        raw.get("set_name") or "Unknown",
+        link,
+    )
@@ -62,6 +62,51 @@ def createTable():
                 Link TEXT
             )               
         """)
+
+        # Per-page checkpoints so interrupted scrapes can be resumed with --resume
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_ledger (
+                Run_Id TEXT NOT NULL,
+                Page_Number INTEGER NOT NULL,
+                Status TEXT NOT NULL,
+                Row_Count INTEGER,
+                Duration NUMERIC(10,2),
+                Updated_At TIMESTAMP NOT NULL DEFAULT now(),
+                PRIMARY KEY (Run_Id, Page_Number)
+            )
+        """)
+        # Most recent snapshot per card, refreshed by the scrapers after each run
+        cursor.execute("SELECT to_regclass('public.latest_prices')")
+        latest_prices_missing = cursor.fetchone()[0] is None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS latest_prices (
+                Card VARCHAR(100) NOT NULL,
+                Card_Number VARCHAR(100) NOT NULL,
+                Date date NOT NULL,
+                Listing_Quantity INTEGER,
+                Lowest_Price NUMERIC(10,2),
+                Market_Price NUMERIC(10,2),
+                Rarity VARCHAR(100),
+                Set_Name VARCHAR(100),
+                Link TEXT,
+                PRIMARY KEY (Card, Card_Number)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS latest_prices_listing_quantity_idx ON latest_prices (Listing_Quantity)")
+        if latest_prices_missing:
+            # Backfill from the full history, the scrapers only fold in their own run.
+            # Sales rows (no Listing_Quantity) are not listing snapshots.
+            cursor.execute("""
+                INSERT INTO latest_prices
+                    (Card, Card_Number, Date, Listing_Quantity, Lowest_Price, Market_Price, Rarity, Set_Name, Link)
+                SELECT DISTINCT ON (Card, Card_Number)
+                    Card, Card_Number, Date, Listing_Quantity, Lowest_Price, Market_Price, Rarity, Set_Name, Link
+                FROM prices
+                WHERE Card IS NOT NULL AND Card_Number IS NOT NULL AND Date IS NOT NULL
+                    AND Listing_Quantity IS NOT NULL
+                ORDER BY Card, Card_Number, Date DESC
+            """)
+            logging.info(f"Backfilled latest_prices with {cursor.rowcount} cards.")
         newConnection.commit()
         cursor.close()
         newConnection.close()
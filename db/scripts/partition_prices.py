@@ -0,0 +1,333 @@
+import argparse
+import json
+import logging
+import statistics
+import sys
+from datetime import date
+
+import psycopg2
+
+# Covering indexes for the tracker queries in streamlit/functions/db.py:
+# get_card_data / get_price_date / estimate_velocity look up one card's history
+# newest first, get_card_name filters snapshots by listing quantity.
+# get_market_data joins an inventory's TCGplayer Ids, parsed from the link, to
+# the price history and latest_prices. The expression must match
+# PRODUCT_ID_SQL in streamlit/functions/db.py for the planner to use it.
+PRODUCT_ID_SQL = "(substring(link from '/product/([0-9]+)'))::int"
+INDEXES = {
+    "prices_card_number_date_idx": "(card, card_number, date DESC) INCLUDE (listing_quantity, lowest_price, market_price, rarity, set_name, link)",
+    "prices_listing_quantity_date_idx": "(listing_quantity, date)",
+    "prices_product_id_date_idx": f"(({PRODUCT_ID_SQL}), date)",
+}
+LATEST_PRICES_INDEXES = {
+    "latest_prices_product_id_idx": f"(({PRODUCT_ID_SQL}))",
+}
+MONTHS_AHEAD = 3  # Empty partitions created past the newest snapshot
+BENCHMARK_RUNS = 3
+
+
+def connect(args):
+    return psycopg2.connect(
+        dbname=args.dbname,
+        user=args.user,
+        password=args.password,
+        host=args.host,
+        port=args.port
+    )
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(first, last):
+    month = date(first.year, first.month, 1)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month):
+    return f"prices_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(cursor, table="public.prices"):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def create_partition(cursor, parent, month):
+    """
+    Create the partition holding `month` on `parent`. Rows that already landed in
+    the default partition for that month are moved into it.
+    """
+    name = partition_name(month)
+    cursor.execute("SELECT to_regclass(%s)", (f"public.{name}",))
+    if cursor.fetchone()[0] is not None:
+        return False
+    upper = add_months(month, 1)
+    cursor.execute("SELECT to_regclass(%s)", (f"public.{parent}_default",))
+    has_default = cursor.fetchone()[0] is not None
+    if has_default:
+        cursor.execute(f"""
+            CREATE TEMP TABLE moved_prices ON COMMIT DROP AS
+            WITH moved AS (
+                DELETE FROM public.{parent}_default WHERE date >= %s AND date < %s RETURNING *
+            )
+            SELECT * FROM moved
+        """, (month, upper))
+    cursor.execute(
+        f"CREATE TABLE public.{name} PARTITION OF public.{parent} FOR VALUES FROM (%s) TO (%s)",
+        (month, upper)
+    )
+    if has_default:
+        cursor.execute(f"INSERT INTO public.{parent} SELECT * FROM moved_prices")
+        logging.info(f"Moved {cursor.rowcount} rows from the default partition into {name}")
+        cursor.execute("DROP TABLE moved_prices")
+    logging.info(f"Created partition {name} [{month}, {upper})")
+    return True
+
+
+def sample_card(cursor):
+    cursor.execute("""
+        SELECT card, card_number FROM public.prices
+        WHERE date = (SELECT MAX(date) FROM public.prices)
+        LIMIT 1
+    """)
+    return cursor.fetchone()
+
+
+def benchmark_queries(card, card_number, min_quantity=5):
+    """
+    The read paths of the tracker pages, with parameters bound for EXPLAIN.
+    """
+    return {
+        "get_card_name": ("""
+            SELECT DISTINCT p.card, p.card_number, p.link, p.listing_quantity
+            FROM public.prices p
+            INNER JOIN (
+                SELECT card, MAX(date) AS latest_date
+                FROM public.prices
+                WHERE listing_quantity <= %s
+                GROUP BY card
+            ) latest ON p.card = latest.card AND p.date = latest.latest_date
+            WHERE p.listing_quantity <= %s
+            ORDER BY p.card ASC
+        """, (min_quantity, min_quantity)),
+        "get_card_data": ("""
+            SELECT date, card, listing_quantity, lowest_price, market_price, link, rarity, card_number, set_name
+            FROM public.prices
+            WHERE card = %s AND card_number = %s
+            ORDER BY date DESC
+            LIMIT 1
+        """, (card, card_number)),
+        "get_price_date": ("""
+            SELECT date, lowest_price, market_price, listing_quantity
+            FROM public.prices
+            WHERE card = %s AND card_number = %s
+            ORDER BY date DESC
+        """, (card, card_number)),
+        "estimate_velocity": ("""
+            SELECT date, listing_quantity,
+                COALESCE(LAG(listing_quantity) OVER (ORDER BY date) - listing_quantity, 0) AS velocity_sold
+            FROM public.prices
+            WHERE card = %s AND card_number = %s
+            ORDER BY date DESC
+        """, (card, card_number)),
+    }
+
+
+def time_queries(connection, card):
+    """
+    Run each benchmark query under EXPLAIN ANALYZE and return the median execution time in ms.
+    """
+    timings = {}
+    cursor = connection.cursor()
+    try:
+        for name, (query, params) in benchmark_queries(*card).items():
+            runs = []
+            for _ in range(BENCHMARK_RUNS):
+                cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                runs.append(plan[0]["Execution Time"])
+            timings[name] = statistics.median(runs)
+    finally:
+        connection.rollback()
+        cursor.close()
+    return timings
+
+
+def print_report(before, after=None):
+    if after is None:
+        print(f"{'query':<20}{'ms':>12}")
+        for name, ms in before.items():
+            print(f"{name:<20}{ms:>12.2f}")
+        return
+    print(f"{'query':<20}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, b in before.items():
+        a = after[name]
+        print(f"{name:<20}{b:>12.2f}{a:>12.2f}{b / a if a else float('inf'):>9.1f}x")
+
+
+def migrate(connection, drop_old=False):
+    """
+    Rebuild public.prices as a table range partitioned by month and swap it in.
+
+    The copy, indexing and rename happen in one transaction, so readers see
+    either the old heap or the finished partitioned table. Writers are locked
+    out from the copy until the swap commits, so no row written meanwhile is
+    left behind in the old heap.
+    """
+    cursor = connection.cursor()
+    try:
+        if is_partitioned(cursor):
+            logging.info("public.prices is already partitioned, nothing to migrate")
+            return False
+        # Blocks inserts and updates but not reads until the rename commits
+        cursor.execute("LOCK TABLE public.prices IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute("SELECT MIN(date), MAX(date), COUNT(*) FROM public.prices")
+        first, last, total = cursor.fetchone()
+        today = date.today()
+        first = first or today
+        last = max(last or today, today)
+        logging.info(f"Migrating {total} rows dated {first} to {last}")
+
+        cursor.execute("DROP TABLE IF EXISTS public.prices_partitioned")
+        cursor.execute("""
+            CREATE TABLE public.prices_partitioned (LIKE public.prices INCLUDING DEFAULTS)
+            PARTITION BY RANGE (date)
+        """)
+        for month in month_range(first, add_months(date(last.year, last.month, 1), MONTHS_AHEAD)):
+            create_partition(cursor, "prices_partitioned", month)
+        # Rows with a NULL date or outside the created months
+        cursor.execute("CREATE TABLE public.prices_partitioned_default PARTITION OF public.prices_partitioned DEFAULT")
+
+        cursor.execute("INSERT INTO public.prices_partitioned SELECT * FROM public.prices")
+        logging.info(f"Copied {cursor.rowcount} rows")
+        # Build indexes after the load, it is much cheaper than maintaining them row by row
+        for name, definition in INDEXES.items():
+            cursor.execute(f"CREATE INDEX {name} ON public.prices_partitioned {definition}")
+
+        cursor.execute("ALTER TABLE public.prices RENAME TO prices_unpartitioned")
+        cursor.execute("ALTER TABLE public.prices_partitioned RENAME TO prices")
+        cursor.execute("ALTER TABLE public.prices_partitioned_default RENAME TO prices_default")
+        if drop_old:
+            cursor.execute("DROP TABLE public.prices_unpartitioned")
+        connection.commit()
+        cursor.execute("ANALYZE public.prices")
+        connection.commit()
+        logging.info("public.prices is now partitioned by month" +
+                     ("" if drop_old else ", the old heap is kept as public.prices_unpartitioned"))
+        return True
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def create_market_indexes(connection):
+    """
+    Build the product id indexes get_market_data needs on an existing database.
+
+    Plain tables are indexed CONCURRENTLY so scrapers keep inserting during the
+    build. Postgres can't build an index concurrently on a partitioned table,
+    so a partitioned public.prices gets a regular build, which blocks writes
+    until it finishes. migrate() already creates these on the new table.
+    """
+    autocommit = connection.autocommit
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+    connection.autocommit = True
+    cursor = connection.cursor()
+    try:
+        targets = [("public.prices", INDEXES["prices_product_id_date_idx"], "prices_product_id_date_idx")]
+        targets += [("public.latest_prices", definition, name) for name, definition in LATEST_PRICES_INDEXES.items()]
+        for table, definition, name in targets:
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            if cursor.fetchone()[0] is None:
+                logging.warning(f"{table} does not exist, skipping {name}")
+                continue
+            concurrently = "" if is_partitioned(cursor, table) else "CONCURRENTLY "
+            logging.info(f"Creating {name} on {table}{' concurrently' if concurrently else ''}")
+            cursor.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} {definition}")
+    finally:
+        cursor.close()
+        connection.autocommit = autocommit
+
+
+def extend(connection, months=MONTHS_AHEAD):
+    """
+    Make sure partitions exist from the current month through `months` ahead.
+    """
+    cursor = connection.cursor()
+    try:
+        if not is_partitioned(cursor):
+            raise RuntimeError("public.prices is not partitioned, run the migration first")
+        this_month = date.today().replace(day=1)
+        created = sum(
+            create_partition(cursor, "prices", month)
+            for month in month_range(this_month, add_months(this_month, months))
+        )
+        connection.commit()
+        logging.info(f"Created {created} partitions")
+        return created
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert public.prices to monthly range partitions with covering indexes")
+    parser.add_argument("mode", nargs="?", choices=["migrate", "extend", "report", "indexes"], default="migrate",
+                        help="migrate (default) converts the table, extend adds upcoming monthly partitions, "
+                             "report only times the queries, indexes builds the repricer market data indexes")
+    parser.add_argument("--months", type=int, default=MONTHS_AHEAD, help="Months ahead to create partitions for in extend mode")
+    parser.add_argument("--drop-old", action="store_true", help="Drop the unpartitioned table after the swap")
+    parser.add_argument("--dbname", default="tcgplayerdb")
+    parser.add_argument("--user", default="rmangana")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5432)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    connection = connect(args)
+    try:
+        if args.mode == "extend":
+            extend(connection, args.months)
+            return
+        if args.mode == "indexes":
+            create_market_indexes(connection)
+            return
+        cursor = connection.cursor()
+        card = sample_card(cursor)
+        cursor.close()
+        if card is None:
+            logging.warning("public.prices is empty, skipping the timing report")
+        before = time_queries(connection, card) if card else {}
+        if args.mode == "report":
+            print_report(before)
+            return
+        if migrate(connection, args.drop_old) and card:
+            print_report(before, time_queries(connection, card))
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    main()
@@ -0,0 +1,196 @@
+"""Long-lived Playwright browser pool for resolving TCGPlayer AddToCart IDs.
+
+Launching Chromium costs far more than loading a product page, so instead of one
+subprocess and one browser per URL the pool keeps a single browser with a few warm
+contexts on a background event loop and resolves whole batches of product URLs
+concurrently.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import math
+import threading
+import time
+from playwright.async_api import async_playwright
+
+try:
+    from functions.resource_blocker import ResourceBlocker
+except ImportError:
+    # Run directly as a script from the functions directory
+    from resource_blocker import ResourceBlocker
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+ADD_TO_CART_SELECTOR = "section[data-testid^='AddToCart_'], button[data-testid^='add-to-cart__submit--']"
+DEFAULT_CONTEXTS = 4
+PAGE_TIMEOUT = 5000
+START_TIMEOUT = 60  # Seconds allowed for launching or closing the browser
+
+
+def parse_add_to_cart_id(section_testid=None, button_testid=None):
+    """
+    Extract the numeric AddToCart ID from the section or button data-testid.
+
+    Examples:
+        AddToCart_FS_5505819-1519259b -> 5505819
+        add-to-cart__submit--5505819-1519259b -> 5505819
+    """
+    if section_testid:
+        parts = section_testid.split('_')
+        if len(parts) >= 3 and parts[1] == 'FS':
+            return parts[2].split('-')[0]
+        elif len(parts) >= 2:
+            return parts[1].split('-')[0]
+    if button_testid:
+        parts = button_testid.split('--')
+        if len(parts) == 2:
+            return parts[1].split('-')[0]
+    return None
+
+
+class BrowserPool:
+    """
+    One Chromium with `size` warm contexts, driven from a private event loop thread
+    so synchronous callers (Streamlit pages, CLI scripts) can submit batches.
+    """
+
+    def __init__(self, size=DEFAULT_CONTEXTS, headless=True):
+        self.size = size
+        self.headless = headless
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+        self._thread.start()
+        self._playwright = None
+        self._browser = None
+        self._contexts = None
+        self._blocker = ResourceBlocker("browser_pool")
+        self._run(self._start(), START_TIMEOUT)
+
+    def _run(self, coro, timeout):
+        """
+        Run `coro` on the pool's loop, cancelling it if it takes longer than `timeout` seconds.
+
+        Raises:
+            concurrent.futures.TimeoutError: The coroutine did not finish in time.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def _start(self):
+        start = time.perf_counter()
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(
+            headless=self.headless, args=["--disable-blink-features=AutomationControlled"])
+        self._contexts = asyncio.Queue()
+        for _ in range(self.size):
+            context = await self._browser.new_context(user_agent=USER_AGENT, extra_http_headers={"Accept-Language": "en-US,en;q=0.9"})
+            await context.add_init_script("Object.defineProperty(navigator, 'webdriver', { get: () => undefined })")
+            await self._blocker.attach_async(context)
+            self._contexts.put_nowait(context)
+        logging.info(f"Browser pool started with {self.size} contexts in {time.perf_counter() - start:.2f}s")
+
+    async def _resolve_one(self, url):
+        # Return the context to the queue it came from, even if the browser is relaunched meanwhile
+        contexts = self._contexts
+        context = await contexts.get()
+        page = None
+        try:
+            page = await context.new_page()
+            await page.goto(url, wait_until="domcontentloaded", timeout=PAGE_TIMEOUT)
+            await page.wait_for_selector(ADD_TO_CART_SELECTOR, timeout=PAGE_TIMEOUT)
+            section = await page.query_selector("section[data-testid^='AddToCart_']")
+            section_testid = await section.get_attribute("data-testid") if section else None
+            button = await page.query_selector("button[data-testid^='add-to-cart__submit--']")
+            button_testid = await button.get_attribute("data-testid") if button else None
+            return parse_add_to_cart_id(section_testid, button_testid)
+        except Exception as e:
+            logging.warning(f"Could not resolve AddToCart ID for {url}: {e}")
+            return None
+        finally:
+            try:
+                if page is not None:
+                    await page.close()
+            except Exception as e:
+                logging.warning(f"Could not close page for {url}: {e}")
+            contexts.put_nowait(context)
+
+    async def _ensure_started(self):
+        if self._browser is None or not self._browser.is_connected():
+            logging.warning("Browser pool is not connected, relaunching")
+            if self._playwright is not None:
+                await self._playwright.stop()
+            await self._start()
+
+    async def _resolve_batch(self, urls):
+        await self._ensure_started()
+        results = await asyncio.gather(*(self._resolve_one(url) for url in urls))
+        return dict(zip(urls, results))
+
+    def resolve_add_to_cart_ids(self, urls):
+        """
+        Resolve a batch of TCGPlayer product URLs concurrently.
+
+        Args:
+            urls (list): Product page URLs, duplicates are only loaded once.
+
+        Returns:
+            dict: url -> AddToCart ID string, or None when it could not be found.
+        """
+        unique = list(dict.fromkeys(urls))
+        if not unique:
+            return {}
+        start = time.perf_counter()
+        # Each context loads its share of the URLs one after another, up to two page timeouts each
+        timeout = START_TIMEOUT + math.ceil(len(unique) / self.size) * 2 * PAGE_TIMEOUT / 1000
+        try:
+            resolved = self._run(self._resolve_batch(unique), timeout)
+        except concurrent.futures.TimeoutError:
+            logging.error(f"Timed out after {timeout:.0f}s resolving {len(unique)} AddToCart IDs")
+            return dict.fromkeys(unique)
+        found = sum(1 for v in resolved.values() if v)
+        logging.info(f"Resolved {found}/{len(unique)} AddToCart IDs in {time.perf_counter() - start:.2f}s")
+        self._blocker.log_summary()
+        return resolved
+
+    async def _close(self):
+        await self._browser.close()
+        await self._playwright.stop()
+
+    def close(self):
+        if self._browser is not None:
+            self._run(self._close(), START_TIMEOUT)
+            self._browser = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(size=DEFAULT_CONTEXTS):
+    """
+    Return the process-wide browser pool, starting it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(size=size)
+            atexit.register(shutdown)
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def resolve_add_to_cart_ids(urls):
+    return get_pool().resolve_add_to_cart_ids(urls)
@@ -0,0 +1,173 @@
+"""Columnar cache for Scryfall card JSON files.
+
+Parsing a multi-megabyte Scryfall dump with json.load on every click is most of
+the cost of the set tools. The first load of a file keeps only the columns the
+tools use and writes each one as a .npy file under data/cache/card_sets. Later
+loads memory-map those arrays instead of parsing JSON. The cache is keyed by
+the source file's path, size and mtime, or by a content hash for uploaded files.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "cache", "card_sets")
+
+STRING_COLUMNS = ("id", "name", "set", "collector_number", "rarity", "frame_effects")
+BOOL_COLUMNS = ("foil", "nonfoil")
+FLOAT_COLUMNS = ("usd", "usd_foil", "estimated_pull_probability")
+INT_COLUMNS = ("tcgplayer_id", "tcgplayer_etched_id")
+MISSING_INT = -1
+
+
+def _float(value):
+    try:
+        return float(value) if value not in (None, "") else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _int(value):
+    try:
+        return int(value) if value not in (None, "") else MISSING_INT
+    except (TypeError, ValueError):
+        return MISSING_INT
+
+
+def columns_from_cards(cards):
+    """
+    Convert Scryfall card dicts into a dict of numpy column arrays.
+
+    Missing prices and pull probabilities are NaN, missing TCGplayer ids are -1,
+    and frame effects are joined with commas.
+    """
+    prices = [card.get("prices") or {} for card in cards]
+    columns = {
+        "id": [card.get("id") or "" for card in cards],
+        "name": [card.get("name") or "" for card in cards],
+        "set": [card.get("set") or "" for card in cards],
+        "collector_number": [str(card.get("collector_number") or "") for card in cards],
+        "rarity": [card.get("rarity") or "" for card in cards],
+        "frame_effects": [",".join(card.get("frame_effects") or []) for card in cards],
+    }
+    columns = {name: np.array(values, dtype=str) for name, values in columns.items()}
+    for name in BOOL_COLUMNS:
+        columns[name] = np.array([bool(card.get(name, False)) for card in cards], dtype=bool)
+    columns["usd"] = np.array([_float(p.get("usd")) for p in prices], dtype=float)
+    columns["usd_foil"] = np.array([_float(p.get("usd_foil")) for p in prices], dtype=float)
+    columns["estimated_pull_probability"] = np.array(
+        [_float(card.get("estimated_pull_probability")) for card in cards], dtype=float)
+    for name in INT_COLUMNS:
+        columns[name] = np.array([_int(card.get(name)) for card in cards], dtype=np.int64)
+    return columns
+
+
+def records(columns, sets=None):
+    """
+    Rebuild Scryfall-shaped card dicts from cached columns.
+
+    Args:
+        columns (dict): Column arrays from load_card_columns.
+        sets (iterable): Only return cards from these set codes.
+
+    Returns:
+        list: dicts with the cached fields, prices nested under 'prices' like the API.
+    """
+    indexes = np.arange(len(columns["id"]))
+    if sets is not None:
+        indexes = indexes[np.isin(columns["set"], list(sets))]
+    cards = []
+    for i in indexes:
+        card = {name: str(columns[name][i]) for name in STRING_COLUMNS if name != "frame_effects"}
+        card["frame_effects"] = [f for f in str(columns["frame_effects"][i]).split(",") if f]
+        for name in BOOL_COLUMNS:
+            card[name] = bool(columns[name][i])
+        card["prices"] = {
+            key: None if np.isnan(columns[key][i]) else f"{columns[key][i]:.2f}"
+            for key in ("usd", "usd_foil")
+        }
+        probability = columns["estimated_pull_probability"][i]
+        card["estimated_pull_probability"] = None if np.isnan(probability) else float(probability)
+        for name in INT_COLUMNS:
+            value = int(columns[name][i])
+            card[name] = None if value == MISSING_INT else value
+        cards.append(card)
+    return cards
+
+
+def _cache_key(*parts):
+    return hashlib.sha1("|".join(str(p) for p in (CACHE_VERSION,) + parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _read_cache(folder):
+    if not os.path.exists(os.path.join(folder, "meta.json")):
+        return None
+    names = STRING_COLUMNS + BOOL_COLUMNS + FLOAT_COLUMNS + INT_COLUMNS
+    return {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def _write_cache(folder, columns, source):
+    # Write into a temporary folder and rename, so readers never see a partial cache
+    tmp = f"{folder}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), values)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"source": source, "cards": len(columns["id"]), "version": CACHE_VERSION}, f)
+    if os.path.exists(folder):
+        shutil.rmtree(folder, ignore_errors=True)
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        # Another process finished the same cache first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _load(key, source, parse):
+    folder = os.path.join(CACHE_DIR, key)
+    columns = _read_cache(folder)
+    if columns is not None:
+        return columns
+    start = time.perf_counter()
+    columns = columns_from_cards(parse())
+    try:
+        _write_cache(folder, columns, source)
+    except OSError as e:
+        logging.warning(f"Could not write card cache for {source}: {e}")
+        return columns
+    logging.info(f"Built card cache for {source} ({len(columns['id'])} cards) in {time.perf_counter() - start:.2f}s")
+    return _read_cache(folder)
+
+
+def load_card_columns(path):
+    """
+    Load the cached columns for a Scryfall card JSON file, building the cache
+    if the file is new or has changed since it was cached.
+
+    Returns:
+        dict: column name -> read-only memory-mapped numpy array.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    def parse():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    return _load(_cache_key(path, stat.st_size, stat.st_mtime_ns), path, parse)
+
+
+def load_uploaded_card_columns(uploaded_file):
+    """
+    Cached columns for an uploaded Scryfall JSON file (e.g. a Streamlit UploadedFile),
+    keyed by a hash of its contents.
+    """
+    data = uploaded_file.getvalue()
+    key = _cache_key("upload", hashlib.sha1(data).hexdigest())
+    return _load(key, getattr(uploaded_file, "name", "upload"), lambda: json.loads(data))
@@ -1,77 +1,107 @@
-import requests
-import time
-import json
-import os
-from functions import db
-from urllib.parse import quote_plus
+from functions import db, decklist, scryfall_bulk, scryfall_client
+import pandas as pd
 import streamlit as st
 
 def search_card(card_name, set_code, collector_number=None, treatment=None, is_foil="nonfoil"):
-    
+    client = scryfall_client.get_client()
+    try:
+        if collector_number is not None:
+            card = client.card_by_number(set_code, collector_number).result()
+        elif not treatment:
+            card = client.card_by_name(card_name, set_code).result()
+        else:
+            # Frame treatments can't be expressed as a /cards/collection identifier
+            frame_treatment = {
+                "extended": "frame:extendedart",
+                "borderless": "frame:borderless",
+                "retro": "frame:1997",
+                "showcase": "frame:showcase",
+            }.get(treatment, '')
+            card = client.search_first(f'name:"{card_name}" set:{set_code} {frame_treatment} is:{is_foil}')
+    except Exception as e:
+        print("Failed to fetch from Scryfall:", e)
+        return
+    if card is None:
+        print(f"No cards found for {card_name} ({set_code})")
+        return
+
+    prices = card['prices']
+    return prices.get(scryfall_bulk.FINISH_COLUMNS.get(is_foil, 'usd')) or prices['usd']
+
+def queue_lookup(card_name, set_code, collector_number=None, treatment=''):
+    """
+    Queue the Scryfall request for a decklist line the local mirror can't price,
+    so the lines of a decklist are fetched in /cards/collection batches.
+    """
+    client = scryfall_client.get_client()
+    if collector_number is not None:
+        client.card_by_number(set_code, collector_number)
+    elif not treatment:
+        client.card_by_name(card_name, set_code)
+
+def lookup_price(card_name, set_code, collector_number=None, treatment='', is_foil="nonfoil", queue_only=False):
+    """
+    Price a decklist line from the local Scryfall mirror, falling back to the API on a miss.
+
+    Args:
+        queue_only (bool): On a miss, only queue the API request and return None.
+
+    Returns:
+        tuple: (price or None, whether the Scryfall API was needed)
+    """
+    index = scryfall_bulk.get_index()
+    if index is not None:
+        if collector_number is not None:
+            price = index.price(set_code, collector_number, is_foil)
+        else:
+            price = index.price_by_name(card_name, set_code, treatment, is_foil)
+        if price is not None:
+            return price, False
+    if queue_only:
+        queue_lookup(card_name, set_code, collector_number, treatment)
+        return None, True
     if collector_number is not None:
-        url = f'https://api.scryfall.com/cards/{set_code}/{collector_number}'
-        response = requests.get(url)
-        if response.status_code != 200:
-            print("Failed to fetch from Scryfall:", response.status_code)
-            return
-
-        card = response.json()
-        
-    else:
-        if treatment == "extended":
-            frame_treatment = "frame:extendedart"
-        elif treatment == '':
-            frame_treatment = ''
-        elif treatment == 'borderless':
-            frame_treatment = "frame:borderless"
-        elif treatment == "retro":
-             frame_treatment = "frame:1997"
-        elif treatment == "showcase":
-            frame_treatment = "frame:showcase"
-        
-        
-        query = f'name:{card_name} set:{set_code} {frame_treatment} is:{is_foil}'
-        # print(query)
-        url = f'https://api.scryfall.com/cards/search?q={quote_plus(query)}'
-        # print(url)
-        response = requests.get(url)
-        if response.status_code != 200:
-            print("Failed to fetch from Scryfall:", response.status_code)
-            print(url)
-            print(card_name)
-            return
-
-        card = response.json()
-        with open("data.json", 'w') as card_data:
-            json.dump(card, card_data, indent=4)
-
-        if card['object'] == 'error':
-            print("Error:", card['details'])
-            return
-
-        if card['total_cards'] == 0:
-            print("No cards found.")
-            return
-
-        # Print the first match
-        card = card['data'][0]
-        # print(f"Name: {card['name']}")
-        # print(f"Set: {card['set_name']}")
-        # print(f"Price (USD): {card['prices']['usd']}")
-        # print(f"Scryfall URL: {card['scryfall_uri']}")
-    
-    return card['prices']['usd']
+        return search_card(card_name=card_name, set_code=set_code, collector_number=collector_number, is_foil=is_foil), True
+    return search_card(card_name=card_name, set_code=set_code, treatment=treatment, is_foil=is_foil), True
 
 def get_tcgplayerid(set_code, collector_number):
-    url = f'https://api.scryfall.com/cards/{set_code}/{collector_number}'
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(url)
-        print("Failed to fetch from Scryfall:", response.status_code)
+    index = scryfall_bulk.get_index()
+    tcgplayer_id = index.tcgplayer_id(set_code, collector_number) if index is not None else None
+    if tcgplayer_id is not None:
+        return tcgplayer_id
+    try:
+        card = scryfall_client.get_client().card_by_number(set_code, collector_number).result()
+    except Exception as e:
+        print("Failed to fetch from Scryfall:", e)
         return
+    return card.get("tcgplayer_id") if card else None
+
+def price_keys(keys, progress=None):
+    """
+    Price every distinct card key of one or more compiled decklists.
+
+    Lookups the local mirror can't answer are queued on the Scryfall client first,
+    so they go out in /cards/collection batches.
+
+    Args:
+        keys (DataFrame): decklist.KEY_COLUMNS, e.g. from decklist.unique_keys.
+        progress: Optional st.progress bar to update.
 
-    card = response.json()
-    return card.get("tcgplayer_id")
+    Returns:
+        DataFrame: `keys` with a 'price' column, NaN where no price was found.
+    """
+    rows = list(keys.itertuples(index=False))
+    for key in rows:
+        lookup_price(key.name, key.set_code, key.collector_number or None, key.treatment, key.finish, queue_only=True)
+    prices = []
+    for idx, key in enumerate(rows):
+        price, _ = lookup_price(key.name, key.set_code, key.collector_number or None, key.treatment, key.finish)
+        if price is None:
+            print(f"No price found for {key.name} ({key.set_code}), counting it as $0")
+        prices.append(float(price) if price is not None else float("nan"))
+        if progress is not None:
+            progress.progress((idx + 1) / len(rows), text=f"Pricing {idx + 1}/{len(rows)} cards: {key.name} ({key.set_code})")
+    return keys.assign(price=prices)
 
 def calculate_ev(set, precon):
     # Check if the precon value was already calculated today in the db
@@ -79,52 +109,35 @@ def calculate_ev(set, precon):
     if value is not None:
         return value
 
-    cwd = os.getcwd()
-    path = os.path.join(cwd,"TCGScraper", "streamlit", "data", "precons", f"{set}", f"{precon}.txt")
-    with open(path, "r") as decklist:
-        lines = [line for line in decklist if line.strip()]
-        total = len(lines)
-        progress = st.progress(0, text="Starting...")
-        EV = 0
-        for idx, line in enumerate(lines):
-            collector_number = None
-            treatment = ''
-            line = line.strip()
-            if not line: 
-                continue
-            if '<' in line and '>' in line:
-                start = line.index('<')
-                end = line.index('>')
-                between_less_than_greater_than = line[start+1: end]
-                if between_less_than_greater_than == "borderless" or between_less_than_greater_than == "extended" or between_less_than_greater_than == "retro" or between_less_than_greater_than == "showcase":
-                    treatment = between_less_than_greater_than
-                    line = line.replace(f"<{treatment}>", "")
-                else:
-                    collector_number = between_less_than_greater_than
-                    line = line.replace(f"<{collector_number}>", "")
-            if '(' in line and ')' in line:
-                start = line.index('(')
-                end = line.index(')')
-                between_parans = line[start+1: end]
-                if between_parans == "F":
-                    is_foil = "foil"
-                    line = line.replace(f"F", "")
-            else:
-                is_foil = "nonfoil"
-            start = line.index('[')
-            end = line.index(']')
-            set_code = line[start+1:end]
-            before_set = line[:start].strip()
-            parts = before_set.split(" ", 1)
-            quantity = parts[0]
-            card_name = parts[1]
-            if collector_number is not None:
-                price = search_card(card_name=card_name, set_code=set_code.lower(), collector_number=collector_number, is_foil=is_foil)
-            else:
-                price = search_card(card_name=card_name, set_code=set_code.lower(), treatment=treatment, is_foil=is_foil)
-            EV += (float(price) * float(quantity))
-            progress.progress((idx + 1) / total, text=f"Calculating EV: {idx + 1}/{total} cards processed. Current EV: ${EV:.2f} Processing: {card_name} ({set_code})")
-            time.sleep(0.101)
-        db.add_precon_value(set, precon, EV)
-        progress.empty()
-        return EV
+    deck = decklist.compile_decklist(decklist.precon_path(set, precon))
+    progress = st.progress(0, text="Starting...")
+    prices = price_keys(decklist.unique_keys(deck), progress)
+    EV = decklist.value_decks(deck, prices, by=())
+    db.add_precon_value(set, precon, EV)
+    progress.empty()
+    return EV
+
+def revalue_precons(sets=None):
+    """
+    Value every precon in data/precons in one pass and store the results in precon_values,
+    with each card's contribution in precon_card_values.
+
+    Each distinct card is priced once, even when it appears in several decks.
+
+    Returns:
+        DataFrame: set_name, precon_name, value.
+    """
+    decks = decklist.compile_precons(sets=sets)
+    prices = price_keys(decklist.unique_keys(decks))
+    cards = decklist.card_values(decks, prices)
+    # A card listed on two lines of the same deck is stored as one row
+    cards = cards.groupby(["set_name", "precon_name"] + decklist.KEY_COLUMNS, as_index=False).agg(
+        quantity=("quantity", "sum"), price=("price", "first"), value=("value", "sum"))
+    values = cards.groupby(["set_name", "precon_name"], as_index=False)["value"].sum()
+    db.add_precon_card_values([
+        (row.set_name, row.precon_name, row.set_code, row.collector_number, row.name, row.treatment,
+         row.finish, int(row.quantity), None if pd.isna(row.price) else float(row.price), float(row.value))
+        for row in cards.itertuples(index=False)
+    ])
+    db.add_precon_values(list(values.itertuples(index=False, name=None)))
+    return values
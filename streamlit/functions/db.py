@@ -1,9 +1,23 @@
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
 import logging
+import io
+import csv
+import time
 import sys
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 from psycopg2.extensions import connection
-import requests
+import streamlit as st
+
+try:
+    from functions import scryfall_client
+except ImportError:
+    # Run directly as a script from the functions directory
+    import scryfall_client
 
 # Configure logging
 logging.basicConfig(
@@ -74,8 +88,175 @@ def connectDB(dbname, isTest=False) -> connection:
 
     return newConnection
 
+
+DB_USER = 'rmangana'
+DB_PASSWORD = 'password'
+DB_HOST = '52.73.212.127'
+DB_PORT = 5432
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 8
+POOL_WAIT_TIMEOUT = 30  # Seconds a caller waits for a free connection before giving up
+POOL_SLOW_WAIT = 1.0  # Checkouts that waited at least this many seconds are logged with the pool stats
+POOL_STATS_INTERVAL = 300  # Seconds between periodic pool stats log lines
+
+_pools = {}
+
+
+class ConnectionPool:
+    """
+    ThreadedConnectionPool that makes callers wait for a free connection instead
+    of raising PoolError when every connection is checked out, and records how
+    long callers waited and how long they held a connection.
+    """
+
+    def __init__(self, dbname, minconn=POOL_MIN_CONNECTIONS, maxconn=POOL_MAX_CONNECTIONS):
+        self.dbname = dbname
+        self.maxconn = maxconn
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn, maxconn,
+            dbname=dbname,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT
+        )
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._checkout_started = {}
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.hold_time = 0.0
+        self.max_hold = 0.0
+        self.discarded = 0
+        self._last_report = time.perf_counter()
+
+    def getconn(self, timeout=POOL_WAIT_TIMEOUT):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            raise psycopg2.pool.PoolError(f"Timed out after {timeout}s waiting for a {self.dbname} connection")
+        try:
+            conn = self._pool.getconn()
+            if conn.closed:
+                # Dropped by the server while idle, replace it
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.checkouts += 1
+            if waited > 0.001:
+                self.waits += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+            self._checkout_started[id(conn)] = time.perf_counter()
+            report = time.perf_counter() - self._last_report >= POOL_STATS_INTERVAL
+            if report:
+                self._last_report = time.perf_counter()
+        if waited >= POOL_SLOW_WAIT:
+            logging.warning(f"Waited {waited:.2f}s for a {self.dbname} connection: {format_pool_stats(self.stats())}")
+        elif report:
+            logging.info(f"Connection pool {format_pool_stats(self.stats())}")
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            held = time.perf_counter() - self._checkout_started.pop(id(conn), time.perf_counter())
+            self.hold_time += held
+            self.max_hold = max(self.max_hold, held)
+        close = close or bool(conn.closed)
+        try:
+            if not close:
+                # Never hand the next caller a connection with an open transaction
+                try:
+                    conn.rollback()
+                except Exception as e:
+                    logging.warning(f"Closing {self.dbname} connection that failed to roll back: {e}")
+                    close = True
+            if close:
+                with self._lock:
+                    self.discarded += 1
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            checkouts = self.checkouts or 1
+            return {
+                "dbname": self.dbname,
+                "max_connections": self.maxconn,
+                "in_use": len(self._checkout_started),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": self.wait_time / checkouts * 1000,
+                "max_wait_ms": self.max_wait * 1000,
+                "avg_checkout_ms": self.hold_time / checkouts * 1000,
+                "max_checkout_ms": self.max_hold * 1000,
+                "discarded": self.discarded,
+            }
+
+    def close(self):
+        self._pool.closeall()
+
+
+@st.cache_resource
+def get_pool(dbname):
+    """
+    Return the process-wide connection pool for `dbname`, shared across Streamlit sessions and reruns.
+    """
+    pool = ConnectionPool(dbname)
+    _pools[dbname] = pool
+    logging.info(f"Created connection pool for {dbname} (max {pool.maxconn} connections)")
+    return pool
+
+
+@contextmanager
+def pooled_connection(dbname="tcgplayerdb"):
+    """
+    Borrow a connection from the pool for `dbname`.
+
+    Uncommitted work is rolled back when the block exits, so callers commit
+    explicitly, the same as with connectDB. Connections that fail with an
+    OperationalError or InterfaceError are discarded instead of reused.
+
+    Example:
+        with db.pooled_connection("scryfall") as conn:
+            cur = conn.cursor()
+    """
+    pool = get_pool(dbname)
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
+
+def pool_stats():
+    """
+    Return wait and checkout time metrics for every pool created in this process.
+    """
+    return {dbname: pool.stats() for dbname, pool in _pools.items()}
+
+
+def format_pool_stats(stats):
+    return (f"{stats['dbname']}: {stats['in_use']}/{stats['max_connections']} in use, "
+            f"{stats['checkouts']} checkouts, {stats['waits']} waited "
+            f"(avg {stats['avg_wait_ms']:.1f} ms, max {stats['max_wait_ms']:.1f} ms), "
+            f"held avg {stats['avg_checkout_ms']:.1f} ms, max {stats['max_checkout_ms']:.1f} ms, "
+            f"{stats['discarded']} discarded")
+
 def writeDB(connection: connection, databaseEntries):
     today = datetime.now()  # Keeps full timestamp
+    start = time.perf_counter()
+    count = 0
 
     cursor = connection.cursor()
 
@@ -95,12 +276,204 @@ def writeDB(connection: connection, databaseEntries):
         try:
             cursor.execute(insert_query, values)
             connection.commit()
+            count += 1
         except Exception as e:
             print("Error inserting data:", e)
             connection.rollback()
 
     cursor.close()
 
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    logging.info(f"writeDB: wrote {count} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+
+PRICE_COLUMNS = ("card", "listing_quantity", "lowest_price", "market_price",
+                 "rarity", "card_number", "set_name", "link", "date")
+
+# Column limits from the prices table in db/scripts/initDB.py
+MAX_TEXT_LENGTH = 100
+MAX_PRICE = Decimal("99999999.99")
+
+
+def clean_price_row(entry, date):
+    """
+    Convert a scraped Data entry into a tuple matching PRICE_COLUMNS.
+
+    Raises:
+        ValueError: If the entry would be rejected by the prices table.
+    """
+    card = (entry.card or "").strip()
+    if not card:
+        raise ValueError("missing card name")
+
+    try:
+        listing_quantity = int(entry.listing_quantity)
+    except (TypeError, ValueError):
+        raise ValueError(f"bad listing_quantity {entry.listing_quantity!r}")
+
+    prices = []
+    for field in ("lowest_price", "market_price"):
+        raw = str(getattr(entry, field)).replace("$", "").replace(",", "").strip()
+        try:
+            price = Decimal(raw).quantize(Decimal("0.01"))
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"bad {field} {getattr(entry, field)!r}")
+        if not price.is_finite() or abs(price) > MAX_PRICE:
+            raise ValueError(f"{field} out of range {price}")
+        prices.append(price)
+
+    rarity = entry.rarity.replace(',', '')
+    for field, value in (("card", card), ("rarity", rarity),
+                         ("card_number", entry.card_number), ("set_name", entry.set_name)):
+        if value is not None and len(value) > MAX_TEXT_LENGTH:
+            raise ValueError(f"{field} longer than {MAX_TEXT_LENGTH} characters")
+
+    return (card, listing_quantity, prices[0], prices[1], rarity,
+            entry.card_number, entry.set_name, entry.link, date)
+
+
+def bulk_write_db(connection: connection, databaseEntries, date=None):
+    """
+    Stream scraped Data entries into public.prices with a single COPY FROM STDIN.
+
+    Rows are validated up front; bad rows are returned in a reject list instead of
+    being inserted and rolled back one at a time. Everything else is written in one
+    transaction.
+
+    Args:
+        connection: An open psycopg2 connection.
+        databaseEntries: Iterable of Data objects from a scrape.
+        date: Timestamp to stamp on every row, defaults to now.
+
+    Returns:
+        tuple: (rows written, list of (entry, reason) rejects)
+    """
+    today = date or datetime.now()  # Keeps full timestamp
+    start = time.perf_counter()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rejects = []
+    count = 0
+    for entry in databaseEntries:
+        try:
+            row = clean_price_row(entry, today)
+        except Exception as e:
+            rejects.append((entry, str(e)))
+            continue
+        writer.writerow(["\\N" if value is None else value for value in row])
+        count += 1
+
+    if count == 0:
+        logging.warning(f"bulk_write_db: nothing to write, {len(rejects)} rejected")
+        return 0, rejects
+
+    buffer.seek(0)
+    copy_query = f"COPY public.prices ({', '.join(PRICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor = connection.cursor()
+    try:
+        cursor.copy_expert(copy_query, buffer)
+        connection.commit()
+    except Exception as e:
+        logging.error(f"Error bulk copying {count} rows into prices: {e}")
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    logging.info(f"bulk_write_db: wrote {count} rows in {elapsed:.2f}s ({rate:.0f} rows/sec), {len(rejects)} rejected")
+    for entry, reason in rejects:
+        logging.warning(f"Rejected row {getattr(entry, 'card', entry)!r}: {reason}")
+    return count, rejects
+
+
+def ensure_latest_prices(connection: connection):
+    """
+    Create public.latest_prices, the most recent snapshot of every card.
+
+    Returns:
+        bool: True when the table was just created and still has to be filled
+        from the full history.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT to_regclass('public.latest_prices')")
+    created = cursor.fetchone()[0] is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.latest_prices (
+            card VARCHAR(100) NOT NULL,
+            card_number VARCHAR(100) NOT NULL,
+            date DATE NOT NULL,
+            listing_quantity INTEGER,
+            lowest_price NUMERIC(10,2),
+            market_price NUMERIC(10,2),
+            rarity VARCHAR(100),
+            set_name VARCHAR(100),
+            link TEXT,
+            PRIMARY KEY (card, card_number)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS latest_prices_listing_quantity_idx ON public.latest_prices (listing_quantity)")
+    connection.commit()
+    cursor.close()
+    return created
+
+
+def refresh_latest_prices(connection: connection, since=None):
+    """
+    Fold snapshots from public.prices into public.latest_prices.
+
+    Args:
+        connection: An open psycopg2 connection.
+        since (date): Only read snapshots on or after this date, normally the
+            start of the scrape run. None rebuilds from the full history, as
+            does the first refresh after the table is created.
+
+    Returns:
+        int: Number of cards inserted or updated.
+    """
+    if ensure_latest_prices(connection):
+        since = None
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        # Only move a card forward, so refreshing an old date range never
+        # overwrites a newer snapshot. Sales rows written by fetch_all_sales
+        # have no listing_quantity and are not listing snapshots.
+        cursor.execute("""
+            INSERT INTO public.latest_prices
+                (card, card_number, date, listing_quantity, lowest_price, market_price, rarity, set_name, link)
+            SELECT DISTINCT ON (card, card_number)
+                card, card_number, date, listing_quantity, lowest_price, market_price, rarity, set_name, link
+            FROM public.prices
+            WHERE card IS NOT NULL AND card_number IS NOT NULL AND date IS NOT NULL
+                AND listing_quantity IS NOT NULL
+                AND (%(since)s::date IS NULL OR date >= %(since)s::date)
+            ORDER BY card, card_number, date DESC
+            ON CONFLICT (card, card_number) DO UPDATE SET
+                date = EXCLUDED.date,
+                listing_quantity = EXCLUDED.listing_quantity,
+                lowest_price = EXCLUDED.lowest_price,
+                market_price = EXCLUDED.market_price,
+                rarity = EXCLUDED.rarity,
+                set_name = EXCLUDED.set_name,
+                link = EXCLUDED.link
+            WHERE public.latest_prices.date <= EXCLUDED.date
+        """, {"since": since})
+        count = cursor.rowcount
+        connection.commit()
+    except Exception as e:
+        logging.error(f"Error refreshing latest_prices: {e}")
+        connection.rollback()
+        return 0
+    finally:
+        cursor.close()
+    logging.info(f"refresh_latest_prices: {count} cards updated in {time.perf_counter() - start:.2f}s")
+    return count
+
+
 def get_cards_by_listing_quantity(connection: connection, min_quantity: int):
     cursor = connection.cursor()
     query = """
@@ -121,20 +494,15 @@ def get_cards_by_listing_quantity(connection: connection, min_quantity: int):
 
 def get_card_name(connection: connection, min_quantity: int):
     cursor = connection.cursor()
+    # latest_prices holds one row per card, refreshed at the end of each scrape
     query = """
-        SELECT DISTINCT p.card, p.card_number, p.link, p.listing_quantity
-        FROM public.prices p
-        INNER JOIN (
-            SELECT card, MAX(date) AS latest_date
-            FROM public.prices
-            WHERE listing_quantity <= %s
-            GROUP BY card
-        ) latest ON p.card = latest.card AND p.date = latest.latest_date
-        WHERE p.listing_quantity <= %s
-        ORDER BY p.card ASC;
+        SELECT card, card_number, link, listing_quantity
+        FROM public.latest_prices
+        WHERE listing_quantity <= %s
+        ORDER BY card ASC;
     """
     try:
-        cursor.execute(query, (min_quantity, min_quantity))
+        cursor.execute(query, (min_quantity,))
         results = cursor.fetchall()
         return results
     except Exception as e:
@@ -148,10 +516,8 @@ def get_card_data(connection: connection, card_name, card_number):
     cursor = connection.cursor()
     query = """
         SELECT date, card, listing_quantity, lowest_price, market_price, link, rarity, card_number, set_name
-        FROM public.prices
+        FROM public.latest_prices
         WHERE card = %s AND card_number = %s
-       ORDER BY date DESC
-        LIMIT 1 
     """
     try:
         cursor.execute(query, (card_name, card_number,))
@@ -210,79 +576,137 @@ def estimate_velocity(connection: connection, card_name, card_number):
         cursor.close()
 
 
-def add_card_data(converted_date, card_number, market_price, lowest_price):
-    connection = connectDB()
-    if not connection:
-        logging.error("Failed to connect to the database.")
-        return
+# TCGplayer product id from a scraped product link, e.g. https://www.tcgplayer.com/product/113682/...
+# Indexed on public.prices and public.latest_prices by
+# `db/scripts/partition_prices.py indexes`, keep the two expressions identical.
+PRODUCT_ID_SQL = "(substring(link from '/product/([0-9]+)'))::int"
 
-    try:
-        cursor = connection.cursor()
 
-        # Pull data for card already in DB
-        query = """
-            SELECT card, listing_quantity, lowest_price, market_price, rarity, card_number, set_name, link
-            FROM public.prices
-            WHERE card_number ILIKE %s
-            ORDER BY date DESC
-            LIMIT 1
-        """
-        cursor.execute(query, (card_number,))
-        result = cursor.fetchone()
-        logging.info(f"Querying for card_number: {card_number} {result}")
+def get_market_data(connection: connection, product_ids, days=7):
+    """
+    Current listings and recent sales for many products in one query.
 
-        if result is None:
-            logging.error(
-                f"No existing card found in DB for card_number: {card_number}. Cannot insert new price entry.")
-            return  # or handle as needed
+    Sales rows are the ones fetch_all_sales writes into public.prices, which have
+    no listing_quantity and the day's average sale as market_price. Velocity is
+    the average daily drop in listing_quantity between snapshots.
 
-        # Insert new price entry
-        insert_query = """
-            INSERT INTO public.prices (date, card, listing_quantity, lowest_price, market_price, rarity, card_number, set_name, link)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        cursor.execute(insert_query, (converted_date,
-                                      result[0], None, lowest_price, market_price, result[4], card_number, result[6], result[7]))
-        connection.commit()
-        logging.info(
-            f"Successfully added new price entry for card_number: {card_number}")
+    Args:
+        connection: An open psycopg2 connection.
+        product_ids (list): TCGplayer Ids.
+        days (int): Length of the sales and velocity window, ending today.
 
+    Returns:
+        list: (product_id, lowest_listing, median_sale, velocity) tuples, one per
+        product with a snapshot in latest_prices.
+    """
+    if not product_ids:
+        return []
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    query = f"""
+        WITH latest AS (
+            SELECT DISTINCT ON ({PRODUCT_ID_SQL}) {PRODUCT_ID_SQL} AS product_id, lowest_price
+            FROM public.latest_prices
+            WHERE {PRODUCT_ID_SQL} = ANY(%(ids)s)
+            ORDER BY {PRODUCT_ID_SQL}, date DESC
+        ),
+        history AS (
+            SELECT {PRODUCT_ID_SQL} AS product_id, date, listing_quantity, market_price,
+                LAG(listing_quantity) OVER (
+                    PARTITION BY {PRODUCT_ID_SQL}, listing_quantity IS NULL ORDER BY date
+                ) AS previous_quantity
+            FROM public.prices
+            WHERE {PRODUCT_ID_SQL} = ANY(%(ids)s) AND date >= CURRENT_DATE - %(days)s
+        ),
+        recent AS (
+            SELECT product_id,
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY market_price)
+                    FILTER (WHERE listing_quantity IS NULL) AS median_sale,
+                COALESCE(SUM(GREATEST(previous_quantity - listing_quantity, 0)), 0)::float / %(days)s AS velocity
+            FROM history
+            GROUP BY product_id
+        )
+        SELECT l.product_id, l.lowest_price::float, r.median_sale, COALESCE(r.velocity, 0)
+        FROM latest l
+        LEFT JOIN recent r ON r.product_id = l.product_id
+    """
+    try:
+        cursor.execute(query, {"ids": [int(product_id) for product_id in product_ids], "days": days})
+        result = cursor.fetchall()
     except Exception as e:
-        logging.error(f"Error in add_card_data: {e}")
+        logging.error(f"Error querying market data: {e}")
         connection.rollback()
+        return []
     finally:
-        if connection:
-            connection.close()
+        cursor.close()
+    logging.info(f"get_market_data: {len(result)} of {len(product_ids)} products in {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def add_card_data(converted_date, card_number, market_price, lowest_price):
+    with pooled_connection("tcgplayerdb") as connection:
+        try:
+            cursor = connection.cursor()
+
+            # Pull data for card already in DB
+            query = """
+                SELECT card, listing_quantity, lowest_price, market_price, rarity, card_number, set_name, link
+                FROM public.prices
+                WHERE card_number ILIKE %s
+                ORDER BY date DESC
+                LIMIT 1
+            """
+            cursor.execute(query, (card_number,))
+            result = cursor.fetchone()
+            logging.info(f"Querying for card_number: {card_number} {result}")
+
+            if result is None:
+                logging.error(
+                    f"No existing card found in DB for card_number: {card_number}. Cannot insert new price entry.")
+                return  # or handle as needed
+
+            # Insert new price entry
+            insert_query = """
+                INSERT INTO public.prices (date, card, listing_quantity, lowest_price, market_price, rarity, card_number, set_name, link)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """
+            cursor.execute(insert_query, (converted_date,
+                                          result[0], None, lowest_price, market_price, result[4], card_number, result[6], result[7]))
+            connection.commit()
+            logging.info(
+                f"Successfully added new price entry for card_number: {card_number}")
+
+        except Exception as e:
+            logging.error(f"Error in add_card_data: {e}")
+            connection.rollback()
 
 def get_tcgplayer_id_from_db(scryfall_id):
-    conn = connectDB("scryfall")
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT tcgplayer_id FROM scryfall
-            WHERE id = %s
-            LIMIT 1
-        """, (scryfall_id,))
-        result = cur.fetchone()
-        return result[0] if result and result[0] is not None else None
-    finally:
-        cur.close()
-        conn.close()
+    with pooled_connection("scryfall") as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT tcgplayer_id FROM scryfall
+                WHERE id = %s
+                LIMIT 1
+            """, (scryfall_id,))
+            result = cur.fetchone()
+            return result[0] if result and result[0] is not None else None
+        finally:
+            cur.close()
 
 def get_tcgplayer_id_from_db(scryfall_id):
-    conn = connectDB("scryfall")
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT tcgplayer_id FROM scryfall
-            WHERE id = %s
-            LIMIT 1
-        """, (scryfall_id,))
-        result = cur.fetchone()
-        return result[0] if result and result[0] is not None else None
-    finally:
-        cur.close()
-        conn.close()
+    with pooled_connection("scryfall") as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT tcgplayer_id FROM scryfall
+                WHERE id = %s
+                LIMIT 1
+            """, (scryfall_id,))
+            result = cur.fetchone()
+            return result[0] if result and result[0] is not None else None
+        finally:
+            cur.close()
 
 def get_tcgplayer_id_from_scryfall_id(scryfall_id, foil=False):
     """
@@ -290,11 +714,9 @@ def get_tcgplayer_id_from_scryfall_id(scryfall_id, foil=False):
     If foil=True, prefer tcgplayer_foil_id. If foil=False, prefer tcgplayer_nonfoil_id.
     Fallback to tcgplayer_id if specific field is missing.
     """
-    url = f"https://api.scryfall.com/cards/{scryfall_id}"
     try:
-        resp = requests.get(url, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
+        data = scryfall_client.get_client().card_by_id(scryfall_id).result()
+        if data is not None:
             if foil:
                 tcg_id = data.get("tcgplayer_foil_id")
                 if tcg_id is not None:
@@ -322,42 +744,41 @@ def batch_get_tcgplayer_ids_by_name_collector_set(card_info_list):
     Returns: dict mapping (name, collector_number, set) -> tcgplayer_card_id
     """
 
-    conn = connectDB("scryfall")
-    cur = conn.cursor()
-    try:
-        # Build WHERE clause for batch query
-        #print(f"{len(card_info_list)} cards to process")
-        # Query by (name, collector_number, set_name) only, ignore foil in SQL
-        format_strings = ','.join(['(%s,%s,%s)'] * len(card_info_list))
-        params = []
-        for name, collector_number, set_name, foil in card_info_list:
-            params.extend([name, collector_number, set_name])
-        query = f"""
-            SELECT name, collector_number, set_name, tcgplayer_id_normal, tcgplayer_id_foil FROM scryfall_to_tcgplayer
-            WHERE (name, collector_number, set_name) IN ({format_strings})
-        """
-        cur.execute(query, params)
-        results = cur.fetchall()
-        # Build a lookup for quick access
-        result_dict = {(n, c, s): (normal, foil) for n, c, s, normal, foil in results}
-        lookup = {}
-        for name, collector_number, set_name, foil in card_info_list:
-            ids = result_dict.get((name, collector_number, set_name))
-            if ids:
-                tcg_id = ids[1] if foil else ids[0]
-                if tcg_id is not None:
-                    lookup[(name, collector_number, set_name, foil)] = tcg_id
-        return lookup
-    finally:
-        cur.close()
-        conn.close()
-        
-
-def get_precon_value(set, precon):
-    connection = connectDB("tcgplayerdb")
+    with pooled_connection("scryfall") as conn:
+        cur = conn.cursor()
+        try:
+            # Build WHERE clause for batch query
+            #print(f"{len(card_info_list)} cards to process")
+            # Query by (name, collector_number, set_name) only, ignore foil in SQL
+            format_strings = ','.join(['(%s,%s,%s)'] * len(card_info_list))
+            params = []
+            for name, collector_number, set_name, foil in card_info_list:
+                params.extend([name, collector_number, set_name])
+            query = f"""
+                SELECT name, collector_number, set_name, tcgplayer_id_normal, tcgplayer_id_foil FROM scryfall_to_tcgplayer
+                WHERE (name, collector_number, set_name) IN ({format_strings})
+            """
+            cur.execute(query, params)
+            results = cur.fetchall()
+            # Build a lookup for quick access
+            result_dict = {(n, c, s): (normal, foil) for n, c, s, normal, foil in results}
+            lookup = {}
+            for name, collector_number, set_name, foil in card_info_list:
+                ids = result_dict.get((name, collector_number, set_name))
+                if ids:
+                    tcg_id = ids[1] if foil else ids[0]
+                    if tcg_id is not None:
+                        lookup[(name, collector_number, set_name, foil)] = tcg_id
+            return lookup
+        finally:
+            cur.close()
+
+
+def ensure_precon_values(connection: connection):
+    """
+    Create public.precon_values, one row per precon and day.
+    """
     cursor = connection.cursor()
-
-    # Ensure the precon_values table exists
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS public.precon_values (
             id SERIAL PRIMARY KEY,
@@ -367,49 +788,212 @@ def get_precon_value(set, precon):
             date DATE NOT NULL
         )
     ''')
+    cursor.execute("SELECT to_regclass('public.precon_values_set_precon_date_key')")
+    if cursor.fetchone()[0] is None:
+        # Tables from before the key may hold several rows per day, keep the newest
+        cursor.execute("""
+            DELETE FROM public.precon_values p
+            USING public.precon_values newer
+            WHERE newer.set_name = p.set_name AND newer.precon_name = p.precon_name
+                AND newer.date = p.date AND newer.id > p.id
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX precon_values_set_precon_date_key
+            ON public.precon_values (set_name, precon_name, date)
+        """)
     connection.commit()
+    cursor.close()
 
-    query = """
-        SELECT value FROM public.precon_values 
-        WHERE set_name = %s AND precon_name = %s AND date = CURRENT_DATE
-    """
-    cursor.execute(query, (set, precon))
-    result = cursor.fetchone()
 
-    if result and result[0] is not None:
-        value = float(result[0])
-        logging.info(f"Precon value for {set} - {precon} found: {value}")
-    else:
-        value = None
-        logging.info(f"No precon value found for {set} - {precon}")
+def get_precon_value(set, precon):
+    with pooled_connection("tcgplayerdb") as connection:
+        cursor = connection.cursor()
 
-    cursor.close()
-    connection.close()
-    
-    return value
+        ensure_precon_values(connection)
+
+        query = """
+            SELECT value FROM public.precon_values 
+            WHERE set_name = %s AND precon_name = %s AND date = CURRENT_DATE
+        """
+        cursor.execute(query, (set, precon))
+        result = cursor.fetchone()
+
+        if result and result[0] is not None:
+            value = float(result[0])
+            logging.info(f"Precon value for {set} - {precon} found: {value}")
+        else:
+            value = None
+            logging.info(f"No precon value found for {set} - {precon}")
+
+        cursor.close()
+
+        return value
 
 def add_precon_value(set_name, precon_name, value):
-    connection = connectDB("tcgplayerdb")
-    cursor = connection.cursor()
+    with pooled_connection("tcgplayerdb") as connection:
+        cursor = connection.cursor()
 
-    # Ensure the precon_values table exists
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS public.precon_values (
-            id SERIAL PRIMARY KEY,
+        ensure_precon_values(connection)
+
+        insert_query = '''
+            INSERT INTO public.precon_values (set_name, precon_name, value, date)
+            VALUES (%s, %s, %s, CURRENT_DATE)
+            ON CONFLICT (set_name, precon_name, date) DO UPDATE SET value = EXCLUDED.value
+        '''
+        cursor.execute(insert_query, (set_name, precon_name, value))
+        connection.commit()
+
+        cursor.close()
+
+def add_precon_values(values):
+    """
+    Store today's value of many precons in one statement. Rerunning on the same day replaces them.
+
+    Args:
+        values (list): (set_name, precon_name, value) tuples.
+    """
+    if not values:
+        return
+    with pooled_connection("tcgplayerdb") as connection:
+        ensure_precon_values(connection)
+        cursor = connection.cursor()
+        psycopg2.extras.execute_values(
+            cursor,
+            """
+            INSERT INTO public.precon_values (set_name, precon_name, value, date) VALUES %s
+            ON CONFLICT (set_name, precon_name, date) DO UPDATE SET value = EXCLUDED.value
+            """,
+            # One row per precon, a second one in the same statement would make the upsert fail
+            list({(set_name, precon_name): (set_name, precon_name, float(value))
+                  for set_name, precon_name, value in values}.values()),
+            template="(%s, %s, %s, CURRENT_DATE)",
+        )
+        connection.commit()
+        cursor.close()
+        logging.info(f"Stored values for {len(values)} precons")
+
+
+def ensure_precon_card_values(connection: connection):
+    """
+    Create public.precon_card_values, what each card contributed to a precon's value on a day.
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.precon_card_values (
+            date DATE NOT NULL,
             set_name TEXT NOT NULL,
             precon_name TEXT NOT NULL,
-            value NUMERIC,
-            date DATE NOT NULL
+            set_code TEXT NOT NULL,
+            collector_number TEXT NOT NULL,
+            name TEXT NOT NULL,
+            treatment TEXT NOT NULL,
+            finish TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price NUMERIC(10,2),
+            value NUMERIC(12,2) NOT NULL,
+            PRIMARY KEY (date, set_name, precon_name, set_code, collector_number, name, treatment, finish)
         )
-    ''')
+    """)
     connection.commit()
+    cursor.close()
 
-    insert_query = '''
-        INSERT INTO public.precon_values (set_name, precon_name, value, date)
-        VALUES (%s, %s, %s, CURRENT_DATE)
-    '''
-    cursor.execute(insert_query, (set_name, precon_name, value))
-    connection.commit()
 
-    cursor.close()
-    connection.close()
\ No newline at end of file
+def add_precon_card_values(rows):
+    """
+    Store today's per-card contributions in one statement. Rerunning on the same day replaces them.
+
+    Args:
+        rows (list): (set_name, precon_name, set_code, collector_number, name, treatment,
+            finish, quantity, price, value) tuples, price None when unknown.
+    """
+    if not rows:
+        return
+    with pooled_connection("tcgplayerdb") as connection:
+        ensure_precon_card_values(connection)
+        cursor = connection.cursor()
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO public.precon_card_values
+                (date, set_name, precon_name, set_code, collector_number, name, treatment, finish, quantity, price, value)
+            VALUES %s
+            ON CONFLICT (date, set_name, precon_name, set_code, collector_number, name, treatment, finish) DO UPDATE SET
+                quantity = EXCLUDED.quantity,
+                price = EXCLUDED.price,
+                value = EXCLUDED.value
+        """, rows, template="(CURRENT_DATE, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", page_size=1000)
+        connection.commit()
+        cursor.close()
+        logging.info(f"Stored {len(rows)} precon card values")
+
+
+def _latest_precon_dates(cursor):
+    cursor.execute("SELECT DISTINCT date FROM public.precon_card_values ORDER BY date DESC LIMIT 2")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_precon_value_changes():
+    """
+    Each precon's value on the two most recent revaluation days.
+
+    Returns:
+        list: (set_name, precon_name, previous value or None, current value, date) tuples.
+    """
+    with pooled_connection("tcgplayerdb") as connection:
+        ensure_precon_card_values(connection)
+        cursor = connection.cursor()
+        dates = _latest_precon_dates(cursor)
+        if not dates:
+            cursor.close()
+            return []
+        current, previous = dates[0], dates[-1] if len(dates) > 1 else None
+        cursor.execute("""
+            SELECT set_name, precon_name,
+                SUM(value) FILTER (WHERE date = %(previous)s) AS previous_value,
+                SUM(value) FILTER (WHERE date = %(current)s) AS current_value
+            FROM public.precon_card_values
+            WHERE date IN (%(current)s, %(previous)s)
+            GROUP BY set_name, precon_name
+            HAVING COUNT(*) FILTER (WHERE date = %(current)s) > 0
+            ORDER BY set_name, precon_name
+        """, {"current": current, "previous": previous})
+        rows = [(set_name, precon_name, float(prev) if prev is not None else None, float(cur), current)
+                for set_name, precon_name, prev, cur in cursor.fetchall()]
+        cursor.close()
+        return rows
+
+
+def get_precon_movers(limit=25):
+    """
+    The cards whose contribution to a precon changed the most between the two most recent
+    revaluation days.
+
+    Returns:
+        list: (set_name, precon_name, name, set_code, collector_number, finish,
+            previous price, current price, value change) tuples, largest change first.
+    """
+    with pooled_connection("tcgplayerdb") as connection:
+        ensure_precon_card_values(connection)
+        cursor = connection.cursor()
+        dates = _latest_precon_dates(cursor)
+        if len(dates) < 2:
+            cursor.close()
+            return []
+        cursor.execute("""
+            SELECT cur.set_name, cur.precon_name, cur.name, cur.set_code, cur.collector_number, cur.finish,
+                prev.price, cur.price, cur.value - COALESCE(prev.value, 0) AS change
+            FROM public.precon_card_values cur
+            LEFT JOIN public.precon_card_values prev
+                ON prev.date = %s
+                AND (prev.set_name, prev.precon_name, prev.set_code, prev.collector_number, prev.name, prev.treatment, prev.finish)
+                    = (cur.set_name, cur.precon_name, cur.set_code, cur.collector_number, cur.name, cur.treatment, cur.finish)
+            WHERE cur.date = %s
+            ORDER BY ABS(cur.value - COALESCE(prev.value, 0)) DESC
+            LIMIT %s
+        """, (dates[1], dates[0], limit))
+        rows = [
+            (set_name, precon_name, name, set_code, collector_number, finish,
+             float(prev) if prev is not None else None, float(cur) if cur is not None else None, float(change))
+            for set_name, precon_name, name, set_code, collector_number, finish, prev, cur, change in cursor.fetchall()
+        ]
+        cursor.close()
+        return rows
+
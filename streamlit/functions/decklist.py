@@ -0,0 +1,167 @@
+"""Decklist compiler for the precon lists in data/precons.
+
+Each line of a precon .txt file looks like
+
+    1 Betor, Ancestor's Voice <borderless> [TDC] (F)
+    7 Forest <254> [THB]
+
+where <...> is either a frame treatment or a collector number, [SET] is the
+set code and (F) marks a foil. compile_decklist parses a file once into a
+DataFrame of normalized card keys and keeps it until the file's mtime
+changes. Valuing decks is then a join of that frame against a price table
+keyed the same way, which lets every precon be priced in one pass.
+"""
+
+import os
+import re
+import threading
+
+import pandas as pd
+
+PRECONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "precons")
+TREATMENTS = ("borderless", "extended", "retro", "showcase")
+# Columns that identify a printing and its finish, shared by decks and price tables
+KEY_COLUMNS = ["set_code", "collector_number", "name", "treatment", "finish"]
+DECK_COLUMNS = ["quantity"] + KEY_COLUMNS
+
+LINE_PATTERN = re.compile(
+    r"^(?P<quantity>\d+)\s+(?P<name>.+?)\s*(?:<(?P<tag>[^>]+)>)?\s*\[(?P<set>[^\]]+)\]\s*(?P<foil>\(F\))?\s*$"
+)
+
+_compiled = {}  # path -> (mtime_ns, DataFrame)
+_compiled_lock = threading.Lock()
+
+
+def parse_line(line):
+    """
+    Parse one decklist line into a card key.
+
+    Returns:
+        dict: quantity, set_code (lowercase), collector_number ('' if not given),
+        name, treatment ('' for the regular frame) and finish ('foil' or 'nonfoil'),
+        or None for blank lines.
+
+    Raises:
+        ValueError: The line is not in decklist format.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    match = LINE_PATTERN.match(line)
+    if match is None:
+        raise ValueError(f"Unrecognized decklist line: {line!r}")
+    tag = match.group("tag") or ""
+    return {
+        "quantity": int(match.group("quantity")),
+        "set_code": match.group("set").strip().lower(),
+        "collector_number": "" if tag in TREATMENTS else tag.strip(),
+        "name": match.group("name").strip(),
+        "treatment": tag if tag in TREATMENTS else "",
+        "finish": "foil" if match.group("foil") else "nonfoil",
+    }
+
+
+def parse_decklist(lines):
+    """
+    Parse decklist lines into a DataFrame with DECK_COLUMNS.
+    """
+    rows = [card for card in (parse_line(line) for line in lines) if card is not None]
+    return pd.DataFrame(rows, columns=DECK_COLUMNS)
+
+
+def compile_decklist(path):
+    """
+    Parsed contents of a decklist file, re-parsed only when the file changes.
+
+    Returns:
+        DataFrame: One row per decklist line with DECK_COLUMNS. Treat it as read-only.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    with _compiled_lock:
+        cached = _compiled.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        deck = parse_decklist(f)
+    with _compiled_lock:
+        _compiled[path] = (mtime, deck)
+    return deck
+
+
+def precon_path(set_name, precon_name, precons_dir=PRECONS_DIR):
+    return os.path.join(precons_dir, set_name, f"{precon_name}.txt")
+
+
+def list_precons(precons_dir=PRECONS_DIR):
+    """
+    Returns:
+        dict: set folder name -> sorted precon names (without .txt).
+    """
+    precons = {}
+    for set_name in sorted(os.listdir(precons_dir)):
+        folder = os.path.join(precons_dir, set_name)
+        if os.path.isdir(folder):
+            precons[set_name] = sorted(f[:-4] for f in os.listdir(folder) if f.endswith(".txt"))
+    return precons
+
+
+def compile_precons(precons_dir=PRECONS_DIR, sets=None):
+    """
+    Every precon under `precons_dir` in one frame, with set_name and precon_name columns.
+
+    Args:
+        sets (iterable): Only include these set folders.
+    """
+    decks = []
+    for set_name, precons in list_precons(precons_dir).items():
+        if sets is not None and set_name not in sets:
+            continue
+        for precon_name in precons:
+            deck = compile_decklist(precon_path(set_name, precon_name, precons_dir))
+            decks.append(deck.assign(set_name=set_name, precon_name=precon_name))
+    if not decks:
+        return pd.DataFrame(columns=["set_name", "precon_name"] + DECK_COLUMNS)
+    return pd.concat(decks, ignore_index=True)
+
+
+def unique_keys(decks):
+    """
+    The distinct card keys across one or more compiled decks, to be priced once each.
+    """
+    return decks[KEY_COLUMNS].drop_duplicates(ignore_index=True)
+
+
+def card_values(decks, prices):
+    """
+    Join decks against a price table.
+
+    Args:
+        decks (DataFrame): Output of compile_decklist or compile_precons.
+        prices (DataFrame): KEY_COLUMNS plus a 'price' column.
+
+    Returns:
+        DataFrame: `decks` with 'price' (NaN if unknown) and 'value' (quantity * price, 0 if unknown).
+    """
+    priced = decks.merge(prices[KEY_COLUMNS + ["price"]], on=KEY_COLUMNS, how="left")
+    priced["price"] = pd.to_numeric(priced["price"], errors="coerce")
+    priced["value"] = priced["quantity"] * priced["price"].fillna(0.0)
+    return priced
+
+
+def value_decks(decks, prices, by=("set_name", "precon_name")):
+    """
+    Value decks by joining them against a price table.
+
+    Args:
+        decks (DataFrame): Output of compile_decklist or compile_precons.
+        prices (DataFrame): KEY_COLUMNS plus a 'price' column. Missing or NaN prices count as 0.
+        by (tuple): Columns to total by; use () for a single deck.
+
+    Returns:
+        DataFrame: `by` columns plus 'value', or a float when `by` is empty.
+    """
+    priced = card_values(decks, prices)
+    if not by:
+        return float(priced["value"].sum())
+    return priced.groupby(list(by), as_index=False)["value"].sum()
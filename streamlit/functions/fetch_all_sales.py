@@ -10,6 +10,15 @@ import datetime
 import logging
 from playwright.async_api import async_playwright, Page
 from functions import db
+from functions.resource_blocker import INTERACTIVE_ALLOWED_TYPES, ResourceBlocker
+
+def sales_blocker():
+    """
+    Resource blocker for the sales page. The sales modal and its "Load More Sales"
+    button are clicked, so stylesheets are kept.
+    """
+    return ResourceBlocker("sales", allowed_types=INTERACTIVE_ALLOWED_TYPES)
+
 
 async def scrape_sales_table(page: Page):
     """
@@ -134,6 +143,7 @@ async def scrape_table_update_db(url):
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)
         page: Page = await browser.new_page()
+        blocker = await sales_blocker().attach_async(page)
         await page.goto(url)
 
         # Find the span next to the strong tag with specific text
@@ -146,6 +156,7 @@ async def scrape_table_update_db(url):
         #await scrape_graph(page)
         sales_data = await scrape_sales_table(page)
         add_to_db(sales_data, url, card_number)
+        blocker.log_summary()
         logging.info("Finished scraping and updating database.")
         time.sleep(5)
         # await browser.close()
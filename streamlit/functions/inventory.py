@@ -0,0 +1,113 @@
+"""Load TCGplayer inventory exports for the Repricer and Manage Inventory pages.
+
+Only the export's own columns are read, each with an explicit dtype. Product
+Line, Set Name, Rarity and Condition are repeated on every row, so they are
+read as categoricals. The dropdown choices for those columns, cascading
+product line -> set -> rarity, are computed once per loaded inventory by
+option_lists and cached, instead of calling unique() on every rerun.
+"""
+
+import logging
+import weakref
+
+import numpy as np
+import pandas as pd
+
+ALL = "All"
+# Columns of a TCGplayer inventory export and how they are read. Every export
+# column is kept, because the edited inventory is uploaded back to TCGplayer.
+COLUMNS = {
+    "TCGplayer Id": "Int64",
+    "Product Line": "category",
+    "Set Name": "category",
+    "Product Name": str,
+    "Title": str,
+    "Number": str,
+    "Rarity": "category",
+    "Condition": "category",
+    "TCG Market Price": "float64",
+    "TCG Direct Low": "float64",
+    "TCG Low Price With Shipping": "float64",
+    "TCG Low Price": "float64",
+    "Total Quantity": "float64",
+    "Add to Quantity": "float64",
+    "TCG Marketplace Price": "float64",
+    "Photo URL": str,
+}
+# Read as floats in case of blanks, narrowed to int32 when every row has a value
+COUNT_COLUMNS = ["Total Quantity", "Add to Quantity"]
+
+_options_cache = {}  # id(df) -> (weakref to df, rows, options)
+
+
+def load_inventory(source):
+    """
+    Read a TCGplayer inventory export.
+
+    Args:
+        source: A path or file-like object, e.g. a Streamlit upload.
+
+    Returns:
+        DataFrame: The export's columns with the dtypes in COLUMNS.
+    """
+    df = pd.read_csv(source, usecols=lambda column: column in COLUMNS, dtype=COLUMNS)
+    for column in COUNT_COLUMNS:
+        if column in df and not df[column].isna().any():
+            df[column] = df[column].astype(np.int32)
+    logging.info(f"Loaded inventory: {len(df)} rows, {df.memory_usage(deep=True).sum() / (1 << 20):.1f} MB")
+    return df
+
+
+def _sorted_values(values):
+    return sorted(str(value) for value in values if not pd.isna(value))
+
+
+def option_lists(df):
+    """
+    Dropdown choices for the category columns, without the leading "All".
+
+    Returns:
+        dict: 'lines' and 'conditions' lists, 'sets' keyed by product line and
+        'rarities' keyed by (product line, set name), where "All" in a key
+        means any value.
+    """
+    combos = df[["Product Line", "Set Name", "Rarity"]].drop_duplicates().astype(object)
+    sets = {ALL: set()}
+    rarities = {(ALL, ALL): set()}
+    for line, set_name, rarity in combos.itertuples(index=False):
+        for line_key in (ALL, line):
+            if pd.isna(line_key):
+                continue
+            sets.setdefault(str(line_key), set()).add(set_name)
+            for set_key in (ALL, set_name):
+                if not pd.isna(set_key):
+                    rarities.setdefault((str(line_key), str(set_key)), set()).add(rarity)
+    return {
+        "lines": _sorted_values(combos["Product Line"].unique()),
+        "conditions": _sorted_values(df["Condition"].unique()),
+        "sets": {key: _sorted_values(values) for key, values in sets.items()},
+        "rarities": {key: _sorted_values(values) for key, values in rarities.items()},
+    }
+
+
+def cached_options(df):
+    """
+    option_lists for `df`, computed once per loaded inventory. Saving new prices
+    in place keeps the cached lists, since only prices change.
+    """
+    entry = _options_cache.get(id(df))
+    if entry is None or entry[0]() is not df or entry[1] != len(df):
+        # Drop lists of inventories that no longer exist
+        for key in [key for key, (ref, _, _) in _options_cache.items() if ref() is None]:
+            _options_cache.pop(key, None)
+        entry = (weakref.ref(df), len(df), option_lists(df))
+        _options_cache[id(df)] = entry
+    return entry[2]
+
+
+def set_options(options, product_line):
+    return options["sets"].get(product_line, [])
+
+
+def rarity_options(options, product_line, set_name):
+    return options["rarities"].get((product_line, set_name), [])
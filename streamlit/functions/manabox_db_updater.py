@@ -1,9 +1,8 @@
 from playwright.sync_api import sync_playwright
-from functions import db
+from functions import db, scryfall_client
 import logging
 import sys
 import os
-import requests
 from psycopg2 import sql
 
 def scrape_tcgplayer_id(url):
@@ -105,12 +104,14 @@ def get_scryfall_card_info(name, set_symbol, collector_number):
     """
     
     # Scryfall API expects set code, not full set name
-    api_url = f"https://api.scryfall.com/cards/{set_symbol.lower()}/{collector_number}"
-    response = requests.get(api_url)
-    if response.status_code != 200:
-        logging.warning(f"Scryfall API request failed: {response.status_code} {response.text}")
+    try:
+        card_json = scryfall_client.get_client().card_by_number(set_symbol, collector_number).result()
+    except Exception as e:
+        logging.warning(f"Scryfall API request failed: {e}")
+        return None
+    if card_json is None:
+        logging.warning(f"Scryfall has no card {set_symbol} {collector_number}")
         return None
-    card_json = response.json()
     scryfall_id = card_json.get('id')
     if not scryfall_id:
         logging.warning("No Scryfall ID found in API response.")
@@ -148,18 +149,24 @@ def get_tcgplayerid_from_scryfall(set_code, collector_number, lang='en'):
         collector_number (str): The card's collector number (e.g., '60').
         lang (str): Language code (default 'en').
     """
-    import requests
     import json
     columns = [
         'object', 'id', 'oracle_id', 'multiverse_ids', 'mtgo_id', 'mtgo_foil_id', 'tcgplayer_id', 'cardmarket_id', 'name', 'lang', 'released_at', 'uri', 'scryfall_uri', 'layout', 'highres_image', 'image_status', 'image_uris', 'mana_cost', 'cmc', 'type_line', 'oracle_text', 'power', 'toughness', 'colors', 'color_identity', 'keywords', 'legalities', 'games', 'reserved', 'game_changer', 'foil', 'nonfoil', 'finishes', 'oversized', 'promo', 'reprint', 'variation', 'set_id', 'set', 'set_name', 'set_type', 'set_uri', 'set_search_uri', 'scryfall_set_uri', 'rulings_uri', 'prints_search_uri', 'collector_number', 'digital', 'rarity', 'flavor_text', 'card_back_id', 'artist', 'artist_ids', 'illustration_id', 'border_color', 'frame', 'full_art', 'textless', 'booster', 'story_spotlight', 'edhrec_rank', 'penny_rank', 'prices', 'related_uris', 'purchase_uris', 'tcgplayer_card_id'
     ]
-    url = f"https://api.scryfall.com/cards/{set_code}/{collector_number}?lang={lang}"
-    print(f"scryfall url: {url}")
-    resp = requests.get(url)
-    if resp.status_code != 200:
-        logging.warning(f"Scryfall API request failed: {resp.status_code} {resp.text}")
+    client = scryfall_client.get_client()
+    if lang == 'en':
+        # Batched through /cards/collection, which returns the English printing
+        try:
+            card = client.card_by_number(set_code, collector_number).result()
+        except Exception as e:
+            logging.warning(f"Scryfall API request failed: {e}")
+            return False
+    else:
+        resp = client.request("GET", f"/cards/{set_code}/{collector_number}/{lang}")
+        card = resp.json() if resp.status_code == 200 else None
+    if card is None:
+        logging.warning(f"Scryfall has no card {set_code} {collector_number} ({lang})")
         return False
-    card = resp.json()
     values = []
     for col in columns:
         val = card.get(col)
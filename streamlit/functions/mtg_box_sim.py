@@ -1,6 +1,17 @@
 import random
 import json
 import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functions import card_cache
+
+PACKS_PER_BOX = 36
+DEFAULT_BOOSTER = 'draft'
+CHUNK_BOXES = 2000  # Boxes drawn per batch, bounds memory for large runs
+PERCENTILES = (5, 25, 50, 75, 95)
+BATCH_BOXES = 5000  # Boxes per worker task in simulate_parallel
+MIN_BOXES_FOR_EARLY_STOP = 1000
+Z_95 = 1.96
 
 # Function to simulate a single booster pack opening
 def open_booster_pack(cards):
@@ -73,18 +84,339 @@ def simulate_multiple_boxes(cards, num_boxes=10):
     print(f"\nAverage EV across {num_boxes} boxes: ${average_ev:.2f}")
     return average_ev
 
-def simulate(set, boxes):
-    # Get the current working directory
+def booster_config_path(name):
     cwd = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(cwd, "..", 'data', 'boosters', f'{name}.json')
+
+
+def booster_types():
+    """
+    Names of the generic booster configs in data/boosters, e.g. ['collector', 'draft', 'play'].
+    """
+    folder = os.path.dirname(booster_config_path(DEFAULT_BOOSTER))
+    return sorted(name[:-5] for name in os.listdir(folder) if name.endswith('.json') and '_' not in name)
+
+
+def load_booster_config(booster=DEFAULT_BOOSTER, set=None):
+    """
+    Load a booster slot definition from data/boosters.
+
+    A set specific file ({set}_{booster}.json) takes precedence over the generic
+    {booster}.json, so a set with an unusual sheet only needs its own file.
+
+    Returns:
+        tuple: (config dict, path it was loaded from)
+    """
+    candidates = ([f"{set}_{booster}"] if set else []) + [booster]
+    for name in candidates:
+        path = booster_config_path(name)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f), path
+    raise FileNotFoundError(f"No booster config for {booster} (looked for {', '.join(candidates)})")
+
+
+def slot_mask(columns, slot):
+    """
+    Boolean mask of the cards eligible for a slot definition.
+    """
+    mask = np.ones(len(columns['rarity']), dtype=bool)
+    if slot.get('rarities'):
+        mask &= np.isin(columns['rarity'], slot['rarities'])
+    if slot.get('foil_only'):
+        mask &= columns['foil']
+    wanted = set(slot.get('frame_effects') or [])
+    excluded = set(slot.get('exclude_frame_effects') or [])
+    if wanted or excluded:
+        frames = [set(f.split(',')) if f else set() for f in columns['frame_effects']]
+        if wanted:
+            mask &= np.array([bool(f & wanted) for f in frames], dtype=bool)
+        if excluded:
+            mask &= np.array([not f & excluded for f in frames], dtype=bool)
+    return mask
+
+
+def slot_weights(columns, mask, slot):
+    """
+    Per card weights for the eligible cards of a slot.
+
+    "weights" is either "pull_probability" (the card's estimated_pull_probability,
+    the default), "uniform", or {"rarity": {rarity: share}} where each rarity's
+    share is split evenly across the eligible cards of that rarity.
+    """
+    weights = slot.get('weights', 'pull_probability')
+    count = int(mask.sum())
+    if weights == 'uniform':
+        return np.ones(count)
+    if isinstance(weights, dict) and 'rarity' in weights:
+        rarities = columns['rarity'][mask]
+        names, inverse, counts = np.unique(rarities, return_inverse=True, return_counts=True)
+        shares = np.array([weights['rarity'].get(str(name), 0) for name in names], dtype=float)
+        return (shares / counts)[inverse]
+    return np.nan_to_num(np.asarray(columns['estimated_pull_probability'][mask], dtype=float))
+
+
+def compile_slot(columns, slot):
+    """
+    Build the sampling table for one pack slot.
+
+    Args:
+        columns (dict): Card columns for the whole set, see card_cache.columns_from_cards.
+        slot (dict): Slot definition from a booster config.
+
+    Returns:
+        tuple: (count, cumulative weights, prices, foil prices, foil rate), or None if no card is eligible.
+    """
+    mask = slot_mask(columns, slot)
+    weights = slot_weights(columns, mask, slot)
+    if weights.sum() <= 0:
+        if slot.get('fallback') != 'any' or len(mask) == 0:
+            return None
+        # Nothing eligible, choose uniformly from all cards
+        mask = np.ones(len(mask), dtype=bool)
+        weights = np.ones(len(mask))
+    prices = np.nan_to_num(np.asarray(columns['usd'][mask], dtype=float))
+    foil_prices = np.nan_to_num(np.asarray(columns['usd_foil'][mask], dtype=float))
+    # Fall back to the nonfoil price for cards without a foil listing
+    foil_prices = np.where(foil_prices > 0, foil_prices, prices)
+    return slot.get('count', 1), np.cumsum(weights), prices, foil_prices, float(slot.get('foil_rate', 0))
+
+
+def compile_set(cards, config=None):
+    """
+    Compile a set's cards against a booster config into the sampling tables used by the simulator.
+
+    Args:
+        cards: Card columns from card_cache, or a list of Scryfall card dicts.
+        config (dict): Booster config, defaults to data/boosters/draft.json.
+
+    Returns:
+        dict: name, packs_per_box, slot_names and slots (see compile_slot).
+    """
+    if config is None:
+        config, _ = load_booster_config()
+    columns = card_cache.columns_from_cards(cards) if isinstance(cards, list) else cards
+    slots = [(slot.get('name', f"slot {i + 1}"), compile_slot(columns, slot)) for i, slot in enumerate(config['slots'])]
+    slots = [(name, table) for name, table in slots if table is not None]
+    return {
+        "name": config.get('name', DEFAULT_BOOSTER),
+        "packs_per_box": config.get('packs_per_box', PACKS_PER_BOX),
+        "slot_names": [name for name, _ in slots],
+        "slots": [table for _, table in slots],
+    }
+
+
+def slot_moments(table):
+    """
+    Exact mean and variance of the value of one card drawn from a compiled slot.
+    """
+    _, cumulative, prices, foil_prices, foil_rate = table
+    probabilities = np.diff(cumulative, prepend=0) / cumulative[-1]
+    mean = probabilities @ ((1 - foil_rate) * prices + foil_rate * foil_prices)
+    second_moment = probabilities @ ((1 - foil_rate) * prices ** 2 + foil_rate * foil_prices ** 2)
+    return float(mean), float(max(second_moment - mean ** 2, 0))
+
+
+def analytic_ev(compiled):
+    """
+    Exact per-pack and per-box EV and variance of a compiled booster.
+
+    Slots and packs are independent draws, so means and variances add up:
+    a slot contributes count * mean and count * variance to each pack.
+
+    Returns:
+        dict: pack_ev, pack_std, box_ev, box_std and per-slot pack EV contributions.
+    """
+    pack_ev = 0.0
+    pack_var = 0.0
+    slots = {}
+    for name, table in zip(compiled["slot_names"], compiled["slots"]):
+        mean, variance = slot_moments(table)
+        count = table[0]
+        slots[name] = count * mean
+        pack_ev += count * mean
+        pack_var += count * variance
+    packs = compiled["packs_per_box"]
+    return {
+        "pack_ev": pack_ev,
+        "pack_std": float(np.sqrt(pack_var)),
+        "box_ev": packs * pack_ev,
+        "box_std": float(np.sqrt(packs * pack_var)),
+        "slots": slots,
+    }
+
+
+def expected_value(set, booster=DEFAULT_BOOSTER):
+    """
+    Exact EV and spread for a set's booster, see analytic_ev. No sampling involved.
+    """
+    return analytic_ev(load_compiled_set(set, booster))
+
 
+def draw_pack_values(slots, num_packs, rng):
+    """
+    Draw `num_packs` packs at once and return the value of each pack.
+    """
+    values = np.zeros(num_packs)
+    for count, cumulative, prices, foil_prices, foil_rate in slots:
+        draws = rng.random((num_packs, count)) * cumulative[-1]
+        picks = np.minimum(np.searchsorted(cumulative, draws, side='right'), len(prices) - 1)
+        pulled = prices[picks]
+        if foil_rate > 0:
+            pulled = np.where(rng.random(picks.shape) < foil_rate, foil_prices[picks], pulled)
+        values += pulled.sum(axis=1)
+    return values
+
+
+def simulate_box_evs(slots, num_boxes, num_packs=PACKS_PER_BOX, rng=None, chunk_boxes=CHUNK_BOXES):
+    """
+    Simulate `num_boxes` booster boxes from compiled slot tables.
+
+    Returns:
+        np.ndarray: The EV of each simulated box.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    box_evs = np.empty(num_boxes)
+    for start in range(0, num_boxes, chunk_boxes):
+        boxes = min(chunk_boxes, num_boxes - start)
+        pack_values = draw_pack_values(slots, boxes * num_packs, rng)
+        box_evs[start:start + boxes] = pack_values.reshape(boxes, num_packs).sum(axis=1)
+    return box_evs
+
+
+def summarize_box_evs(box_evs, bins=30):
+    """
+    Summarize simulated box EVs.
+
+    Returns:
+        dict: mean, std, percentiles {p: value} and histogram (counts, bin edges).
+    """
+    if len(box_evs) == 0:
+        return {"boxes": 0, "mean": 0, "std": 0, "percentiles": {}, "histogram": ([], [])}
+    counts, edges = np.histogram(box_evs, bins=bins)
+    return {
+        "boxes": len(box_evs),
+        "mean": float(box_evs.mean()),
+        "std": float(box_evs.std()),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(box_evs, PERCENTILES).tolist())),
+        "histogram": (counts.tolist(), edges.tolist()),
+    }
+
+
+_compiled_sets = {}
+
+
+def set_file_path(set):
+    # Get the current working directory
+    cwd = os.path.dirname(os.path.abspath(__file__))
     # Construct the full path to the JSON file
-    file_path = os.path.join(cwd, "..", 'data', 'cards_by_set', f'{set}_cards.json')
+    return os.path.join(cwd, "..", 'data', 'cards_by_set', f'{set}_cards.json')
+
+
+def load_compiled_set(set, booster=DEFAULT_BOOSTER):
+    """
+    Load and compile a set's cards for a booster type, reusing the compiled
+    tables until the card file or the booster config changes.
+    """
+    file_path = set_file_path(set)
+    config, config_path = load_booster_config(booster, set)
+    key = (os.path.getmtime(file_path), config_path, os.path.getmtime(config_path))
+    cached = _compiled_sets.get((set, booster))
+    if cached and cached[0] == key:
+        return cached[1]
+    compiled = compile_set(card_cache.load_card_columns(file_path), config)
+    _compiled_sets[(set, booster)] = (key, compiled)
+    return compiled
+
+
+def simulate_distribution(set, boxes, booster=DEFAULT_BOOSTER, seed=None):
+    """
+    Simulate booster boxes for a set and summarize the EV distribution.
 
-    # Load the cards from the JSON file
-    with open(file_path, 'r', encoding='utf-8') as f:
-        cards = json.load(f)
+    Args:
+        set (str): Set code, e.g. 'dft'.
+        boxes (int): Number of boxes to open.
+        booster (str): Booster config name in data/boosters, e.g. 'draft', 'play', 'collector'.
+        seed (int): Optional seed for reproducible runs.
 
-    # Choose how many boxes to simulate
-    num_boxes_to_simulate = boxes
+    Returns:
+        dict: See summarize_box_evs.
+    """
+    compiled = load_compiled_set(set, booster)
+    box_evs = simulate_box_evs(compiled["slots"], boxes, compiled["packs_per_box"], np.random.default_rng(seed))
+    return summarize_box_evs(box_evs)
 
-    return simulate_multiple_boxes(cards, num_boxes=num_boxes_to_simulate)
+
+def _simulate_batch(set, booster, boxes, seed_sequence):
+    # Runs in a worker process, which compiles the set once and reuses it for later batches
+    compiled = load_compiled_set(set, booster)
+    return simulate_box_evs(compiled["slots"], boxes, compiled["packs_per_box"], np.random.default_rng(seed_sequence))
+
+
+def confidence_half_width(box_evs):
+    """
+    Half width of the 95% confidence interval on the mean box EV.
+    """
+    if len(box_evs) < 2:
+        return float('inf')
+    return Z_95 * float(np.std(box_evs, ddof=1)) / np.sqrt(len(box_evs))
+
+
+def simulate_parallel(set, boxes, booster=DEFAULT_BOOSTER, workers=None, seed=None, tolerance=None, batch_boxes=BATCH_BOXES):
+    """
+    Simulate booster boxes across a process pool.
+
+    Boxes are split into batches of `batch_boxes`, each with its own RNG stream
+    spawned from one SeedSequence, and batches are merged in order. The same
+    seed therefore gives the same result whatever the number of workers.
+
+    Args:
+        set (str): Set code, e.g. 'dft'.
+        boxes (int): Maximum number of boxes to open.
+        booster (str): Booster config name in data/boosters.
+        workers (int): Worker processes, defaults to the CPU count. 1 runs in process.
+        seed (int): Optional seed for reproducible runs.
+        tolerance (float): Stop once the 95% confidence interval on mean box EV is
+            within +/- this many dollars.
+
+    Returns:
+        dict: See summarize_box_evs, plus ci_half_width and stopped_early.
+    """
+    load_compiled_set(set, booster)  # Fail fast on a missing set before starting workers
+    batch_sizes = [min(batch_boxes, boxes - start) for start in range(0, boxes, batch_boxes)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    results = []
+    stopped_early = False
+
+    def done(box_evs):
+        results.append(box_evs)
+        if tolerance is None:
+            return False
+        merged = np.concatenate(results)
+        return len(merged) >= MIN_BOXES_FOR_EARLY_STOP and confidence_half_width(merged) <= tolerance
+
+    if workers == 1 or len(batch_sizes) == 1:
+        for size, seed_sequence in zip(batch_sizes, seeds):
+            if done(_simulate_batch(set, booster, size, seed_sequence)):
+                stopped_early = len(results) < len(batch_sizes)
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_simulate_batch, set, booster, size, seed_sequence)
+                       for size, seed_sequence in zip(batch_sizes, seeds)]
+            for future in futures:
+                if done(future.result()):
+                    stopped_early = len(results) < len(batch_sizes)
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    box_evs = np.concatenate(results) if results else np.empty(0)
+    summary = summarize_box_evs(box_evs)
+    summary["ci_half_width"] = confidence_half_width(box_evs)
+    summary["stopped_early"] = stopped_early
+    return summary
+
+
+def simulate(set, boxes):
+    return simulate_distribution(set, boxes)["mean"]
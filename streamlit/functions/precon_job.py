@@ -0,0 +1,47 @@
+"""Batch revaluation of every precon in data/precons.
+
+Meant to run once a day from cron, so the EVTools page can read today's values
+and the day-over-day movers from precon_values / precon_card_values instead of
+pricing decks when someone opens it:
+
+    python -m functions.precon_job --refresh-mirror
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from functions import commander_ev, scryfall_bulk
+
+
+def run(sets=None, refresh_mirror=False):
+    """
+    Revalue the precons and store the results.
+
+    Args:
+        sets (list): Only revalue these set folders.
+        refresh_mirror (bool): Update the local Scryfall bulk mirror first.
+
+    Returns:
+        DataFrame: set_name, precon_name, value.
+    """
+    start = time.perf_counter()
+    if refresh_mirror:
+        scryfall_bulk.refresh()
+    if scryfall_bulk.get_index() is None:
+        logging.warning("No local Scryfall mirror, every card will be priced through the API")
+    values = commander_ev.revalue_precons(sets)
+    logging.info(f"Revalued {len(values)} precons in {time.perf_counter() - start:.1f}s")
+    return values
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    parser = argparse.ArgumentParser(description="Revalue every precon and store per-card contributions")
+    parser.add_argument("--sets", nargs="+", help="Set folders to revalue, default all")
+    parser.add_argument("--refresh-mirror", action="store_true", help="Refresh the Scryfall bulk mirror first")
+    args = parser.parse_args()
+    for row in run(args.sets, args.refresh_mirror).itertuples(index=False):
+        print(f"{row.set_name:<6}{row.precon_name:<30}${row.value:>9.2f}")
@@ -0,0 +1,180 @@
+"""Reprice a TCGplayer inventory export without the Streamlit app.
+
+Reads the export in chunks, applies a rule list with repricing_engine and
+writes a CSV in the same format with the new TCG Marketplace Price, ready to
+upload back to TCGplayer. Rules come from a JSON file or a user's saved rules
+in the users table:
+
+    python -m functions.reprice_batch export.csv upload.csv --rules rules.json
+    python -m functions.reprice_batch export.csv upload.csv --user alice --template Nightly
+
+All columns are read and written as text, so values such as collector numbers
+with leading zeros pass through unchanged. When the rules use a market-data
+action, listings and sales for each chunk's TCGplayer Ids are fetched from the
+prices tables in one query per chunk.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+import pandas as pd
+
+try:
+    from functions import db, repricing_engine
+except ImportError:
+    # Run directly as a script from the functions directory
+    import db
+    import repricing_engine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CHUNK_ROWS = 50000
+
+
+def load_rules_file(path, template=None):
+    """
+    Rules from a JSON file holding a rule list, {"rules": [...]}, or a list of
+    templates ({"name": ..., "rules": [...]}) when `template` is given.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if template is not None:
+        return _template_rules(data.get("templates", data) if isinstance(data, dict) else data, template)
+    return data["rules"] if isinstance(data, dict) else data
+
+
+def load_user_rules(username, template=None):
+    """
+    A user's saved rules from the users table, or the rules of one of their templates.
+    """
+    with db.pooled_connection("tcgplayerdb") as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT rules, templates FROM users WHERE username = %s", (username,))
+        row = cur.fetchone()
+        cur.close()
+    if row is None:
+        raise ValueError(f"No user named {username!r}")
+    rules, templates = row[0] or [], row[1] or []
+    return _template_rules(templates, template) if template is not None else rules
+
+
+def _template_rules(templates, name):
+    for template in templates:
+        if template.get("name") == name:
+            return template["rules"]
+    raise ValueError(f"No rule template named {name!r}")
+
+
+def format_price(value):
+    return f"{value:.2f}"
+
+
+def fetch_market_data(chunk):
+    with db.pooled_connection("tcgplayerdb") as conn:
+        rows = db.get_market_data(conn, list(repricing_engine.product_ids(chunk)))
+    return repricing_engine.market_table(rows)
+
+
+def reprice_chunk(chunk, rules, changed_only=False, market=None):
+    """
+    Apply `rules` to one chunk of an export read as text.
+
+    Args:
+        market (DataFrame): repricing_engine.market_table covering the chunk's TCGplayer Ids.
+
+    Returns:
+        tuple: (chunk with the new TCG Marketplace Price, rows repriced per rule index)
+    """
+    inventory = repricing_engine.compile_inventory(chunk, market)
+    plan = repricing_engine.compile_rules(rules, inventory)
+    winner = repricing_engine.match_rules(plan, inventory)
+    new_price = repricing_engine.apply_actions(plan, inventory, winner)
+    changed = (winner >= 0) & ~pd.isna(new_price) & (new_price != inventory["price"])
+    out = chunk.copy()
+    column = out.columns.get_loc(repricing_engine.PRICE_COLUMN)
+    out.iloc[changed.nonzero()[0], column] = [format_price(value) for value in new_price[changed]]
+    if changed_only:
+        out = out[changed]
+    counts = pd.Series(winner[changed]).value_counts().to_dict()
+    return out, counts
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1 << 20)
+
+
+def reprice_file(input_path, output_path, rules, chunk_rows=CHUNK_ROWS, changed_only=False):
+    """
+    Stream an inventory export through the rules into an upload CSV.
+
+    Returns:
+        dict: rows, repriced, seconds, rows_per_second, peak_memory_mb and per_rule counts.
+    """
+    start = time.perf_counter()
+    rows = repriced = 0
+    per_rule = {}
+    needs_market = repricing_engine.uses_market_data(rules)
+    reader = pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+    with open(output_path, "w", encoding="utf-8", newline="") as out:
+        for index, chunk in enumerate(reader):
+            market = fetch_market_data(chunk) if needs_market else None
+            priced, counts = reprice_chunk(chunk, rules, changed_only, market)
+            priced.to_csv(out, index=False, header=index == 0)
+            rows += len(chunk)
+            for rule, count in counts.items():
+                per_rule[rule] = per_rule.get(rule, 0) + count
+                repriced += count
+            logging.info(f"Processed {rows} rows, {repriced} repriced")
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "repriced": repriced,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else float("inf"),
+        "peak_memory_mb": peak_memory_mb(),
+        "per_rule": {rules[rule].get("name", f"Rule {rule + 1}"): count for rule, count in sorted(per_rule.items())},
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reprice a TCGplayer inventory export into an upload CSV")
+    parser.add_argument("input", help="TCGplayer inventory export CSV")
+    parser.add_argument("output", help="Upload CSV to write")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--rules", help="JSON file with the rules to apply")
+    source.add_argument("--user", help="Apply this user's saved rules from the users table")
+    parser.add_argument("--template", help="Apply the rules of this saved template instead of all saved rules")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows read per chunk")
+    parser.add_argument("--changed-only", action="store_true", help="Only write rows whose price changed")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.rules:
+        rules = load_rules_file(args.rules, args.template)
+    else:
+        rules = load_user_rules(args.user, args.template)
+    logging.info(f"Applying {len(rules)} rules to {args.input}")
+    stats = reprice_file(args.input, args.output, rules, args.chunk_rows, args.changed_only)
+    for name, count in stats["per_rule"].items():
+        print(f"{name:<40}{count:>10}")
+    memory = f"{stats['peak_memory_mb']:.0f} MB" if stats["peak_memory_mb"] is not None else "n/a"
+    print(f"Repriced {stats['repriced']} of {stats['rows']} rows in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_second']:.0f} rows/sec), peak memory {memory}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    main()
@@ -0,0 +1,413 @@
+"""Vectorized evaluation of Repricer rules.
+
+A rule is the dict built on the Repricer page:
+
+    {"name": ..., "card_type": "Magic", "set_name": "All", "rarity": "All", "condition": "All",
+     "min_price": 0.0, "max_price": 1000.0, "min_qty": 0, "max_qty": 1000,
+     "action_type": "Set to Market + X%", "action_value": 5.0}
+
+Instead of filtering the inventory once per rule, the inventory's Product Line,
+Set Name, Rarity and Condition columns are converted to categorical codes and
+the rule list is compiled into arrays of codes and bounds. Matching every rule
+against every row is then a few numpy comparisons over a (rules x rows) block.
+When several rules match a row the last one in the list wins, the same as
+applying the rules one after another.
+
+The market-data actions price from current listings and recent sales instead
+of the export's TCG Market Price. Their inputs are fetched for the whole
+inventory at once (db.get_market_data, built into a table by market_table) and
+joined to the rows by TCGplayer Id when the inventory is compiled. Rows without
+market data keep their current price.
+"""
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+ALL = "All"
+ACTION_TYPES = [
+    "Set to Market + X%", "Set to Market + $X", "Set to Fixed Value", "Set to Market Price",
+    "Undercut Lowest Listing by $X", "Follow 7-Day Median Sale", "Velocity-Weighted Price",
+]
+# Actions that need the market table. For "Velocity-Weighted Price" the value is
+# the sales per day at which the price fully follows the median sale, slower
+# cards are priced proportionally closer to the lowest listing.
+MARKET_ACTIONS = ACTION_TYPES[4:]
+MARKET_FIELDS = ["lowest_listing", "median_sale", "velocity"]
+# Rule field -> inventory column, matched by equality unless the rule says "All"
+CATEGORY_FIELDS = {
+    "card_type": "Product Line",
+    "set_name": "Set Name",
+    "rarity": "Rarity",
+    "condition": "Condition",
+}
+# (min field, max field) -> inventory column, matched inclusively
+RANGE_FIELDS = {
+    ("min_price", "max_price"): "TCG Marketplace Price",
+    ("min_qty", "max_qty"): "Total Quantity",
+}
+PRICE_COLUMN = "TCG Marketplace Price"
+MARKET_COLUMN = "TCG Market Price"
+ID_COLUMN = "TCGplayer Id"
+MIN_PRICE = 0.01
+NO_RULE = "None"
+CHUNK_ROWS = 1 << 16  # Rows matched per block, bounds the (rules x rows) temporaries
+MAX_CACHED_MASKS = 256  # Masks of rules no longer in any view are dropped past this
+
+_ANY_CODE = -2  # Rule says "All"
+_ABSENT_CODE = -3  # Rule value does not occur in the inventory, never matches
+
+
+def default_label(rule):
+    return f"{rule['action_type']} ({rule['action_value']})"
+
+
+def named_label(rule):
+    return f"{rule['name']} ({rule['action_type']} {rule['action_value']})"
+
+
+def uses_market_data(rules):
+    return any(rule.get("action_type") in MARKET_ACTIONS for rule in rules)
+
+
+def product_ids(df):
+    """
+    The distinct TCGplayer Ids in an inventory export, as a sorted tuple.
+    """
+    if ID_COLUMN not in df:
+        return ()
+    ids = pd.to_numeric(df[ID_COLUMN], errors="coerce").dropna().unique()
+    return tuple(sorted(int(product_id) for product_id in ids))
+
+
+def market_table(rows):
+    """
+    Lookup table from db.get_market_data rows, indexed by TCGplayer Id.
+    """
+    table = pd.DataFrame(rows, columns=["product_id"] + MARKET_FIELDS)
+    table[MARKET_FIELDS] = table[MARKET_FIELDS].astype(float)
+    return table.astype({"product_id": np.int64}).set_index("product_id")
+
+
+def market_arrays(df, market):
+    """
+    The market table's columns aligned with the rows of `df`, NaN where a row has no data.
+    """
+    rows = len(df)
+    if market is None or market.empty or ID_COLUMN not in df:
+        return {field: np.full(rows, np.nan) for field in MARKET_FIELDS}
+    ids = pd.to_numeric(df[ID_COLUMN], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    positions = market.index.get_indexer(ids)
+    found = positions >= 0
+    arrays = {}
+    for field in MARKET_FIELDS:
+        values = np.full(rows, np.nan)
+        values[found] = market[field].to_numpy(dtype=float)[positions[found]]
+        arrays[field] = values
+    return arrays
+
+
+def compile_inventory(df, market=None):
+    """
+    Extract the arrays rule matching needs from an inventory export.
+
+    Args:
+        market (DataFrame): Optional market_table for the market-data actions.
+
+    Returns:
+        dict: 'categories' maps each category column to (codes, categories),
+        'ranges' maps each range column to a float array, plus 'price', 'market'
+        and the MARKET_FIELDS arrays under 'market_data'.
+    """
+    categories = {}
+    for column in CATEGORY_FIELDS.values():
+        categorical = pd.Categorical(df[column])
+        categories[column] = (np.asarray(categorical.codes, dtype=np.int32), categorical.categories)
+    ranges = {column: pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+              for column in RANGE_FIELDS.values()}
+    return {
+        "rows": len(df),
+        "categories": categories,
+        "ranges": ranges,
+        "price": pd.to_numeric(df[PRICE_COLUMN], errors="coerce").to_numpy(dtype=float),
+        "market": pd.to_numeric(df[MARKET_COLUMN], errors="coerce").to_numpy(dtype=float),
+        "market_data": market_arrays(df, market),
+    }
+
+
+def _rule_code(value, positions):
+    if value is None or value == ALL:
+        return _ANY_CODE
+    return positions.get(value, _ABSENT_CODE)
+
+
+def compile_rules(rules, inventory):
+    """
+    Compile a rule list into arrays aligned with the rule order.
+
+    Args:
+        rules (list): Rule dicts. Missing category fields mean "All", missing bounds are open.
+        inventory (dict): Output of compile_inventory.
+
+    Raises:
+        ValueError: A rule has an unknown action_type.
+    """
+    plan = {"count": len(rules), "codes": {}, "bounds": {}}
+    for field, column in CATEGORY_FIELDS.items():
+        positions = {value: i for i, value in enumerate(inventory["categories"][column][1])}
+        plan["codes"][column] = np.array([_rule_code(rule.get(field, ALL), positions) for rule in rules], dtype=np.int32)
+    for (low, high), column in RANGE_FIELDS.items():
+        plan["bounds"][column] = (
+            np.array([float(rule.get(low, -np.inf)) for rule in rules], dtype=float),
+            np.array([float(rule.get(high, np.inf)) for rule in rules], dtype=float),
+        )
+    actions = []
+    for rule in rules:
+        if rule.get("action_type") not in ACTION_TYPES:
+            raise ValueError(f"Unknown repricing action {rule.get('action_type')!r} in rule {rule.get('name')!r}")
+        actions.append(ACTION_TYPES.index(rule["action_type"]))
+    plan["actions"] = np.array(actions, dtype=np.int8)
+    plan["values"] = np.array([float(rule.get("action_value", 0.0)) for rule in rules], dtype=float)
+    return plan
+
+
+def match_block(plan, inventory, start, stop, rules=None):
+    """
+    Boolean (rules x rows) matrix of which rules match rows start:stop.
+
+    Args:
+        rules: Optional array of rule indexes to evaluate instead of all of them.
+    """
+    selected = slice(None) if rules is None else rules
+    matched = np.ones((plan["count"] if rules is None else len(rules), stop - start), dtype=bool)
+    for column, rule_codes in plan["codes"].items():
+        rule_codes = rule_codes[selected][:, None]
+        row_codes = inventory["categories"][column][0][None, start:stop]
+        matched &= (rule_codes == _ANY_CODE) | (rule_codes == row_codes)
+    for column, (lows, highs) in plan["bounds"].items():
+        values = inventory["ranges"][column][None, start:stop]
+        matched &= (values >= lows[selected][:, None]) & (values <= highs[selected][:, None])
+    return matched
+
+
+def last_match(matched):
+    """
+    Index of the last True row of each column of a (rules x rows) matrix, -1 where none.
+    """
+    if matched.shape[0] == 0:
+        return np.full(matched.shape[1], -1, dtype=np.int32)
+    winner = matched.shape[0] - 1 - np.argmax(matched[::-1], axis=0)
+    return np.where(matched.any(axis=0), winner, -1).astype(np.int32)
+
+
+def match_rules(plan, inventory, chunk_rows=CHUNK_ROWS):
+    """
+    The index of the rule that applies to each inventory row, or -1.
+    """
+    winner = np.full(inventory["rows"], -1, dtype=np.int32)
+    for start in range(0, inventory["rows"], chunk_rows):
+        stop = min(start + chunk_rows, inventory["rows"])
+        winner[start:stop] = last_match(match_block(plan, inventory, start, stop))
+    return winner
+
+
+def apply_actions(plan, inventory, winner):
+    """
+    New price of every row given the winning rule indexes from match_rules.
+    Rows no rule applies to, and rows a market-data action has no data for,
+    keep their current price.
+    """
+    new_price = inventory["price"].copy()
+    hit = winner >= 0
+    if not hit.any():
+        return new_price
+    actions = plan["actions"][winner[hit]]
+    values = plan["values"][winner[hit]]
+    market = inventory["market"][hit]
+    lowest = inventory["market_data"]["lowest_listing"][hit]
+    median = inventory["market_data"]["median_sale"][hit]
+    velocity = inventory["market_data"]["velocity"][hit]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Share of the way from the lowest listing to the median sale
+        weight = np.where(values > 0, np.clip(velocity / values, 0, 1), (velocity > 0).astype(float))
+    weighted = np.where(np.isnan(median), lowest,
+                        np.where(np.isnan(lowest), median, lowest + weight * (median - lowest)))
+    priced = np.select(
+        [actions == 0, actions == 1, actions == 2, actions == 3, actions == 4, actions == 5],
+        [np.round(market * (1 + values / 100), 2), np.round(market + values, 2), values, np.round(market, 2),
+         np.maximum(np.round(lowest - values, 2), MIN_PRICE), np.round(median, 2)],
+        default=np.round(weighted, 2),
+    )
+    no_data = (actions >= 4) & np.isnan(priced)
+    new_price[hit] = np.where(no_data, inventory["price"][hit], priced)
+    return new_price
+
+
+def predicate_key(rule):
+    """
+    The part of a rule that decides which rows it matches, as a hashable tuple.
+    """
+    return (
+        tuple(rule.get(field, ALL) for field in CATEGORY_FIELDS)
+        + tuple((float(rule.get(low, -np.inf)), float(rule.get(high, np.inf))) for low, high in RANGE_FIELDS)
+    )
+
+
+def action_key(rule):
+    return (rule.get("action_type"), float(rule.get("action_value", 0.0)))
+
+
+def _common_affixes(old, new):
+    prefix = 0
+    while prefix < min(len(old), len(new)) and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < min(len(old), len(new)) - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+class RuleMatchIndex:
+    """
+    Caches the rows each rule matches, keyed by predicate_key, plus the last
+    result for each view (e.g. the current rules and a template preview), so a
+    changed rule list only recomputes what the change can affect:
+
+    - same predicates in the same order, different actions: only the rows won
+      by rules whose action changed are repriced;
+    - rules added, removed or reordered: with the unchanged rules at the start
+      and end of the list kept, only rows matched by the changed middle section
+      and not overridden by a later unchanged rule are re-matched.
+    """
+
+    def __init__(self, df, market=None):
+        self._source = weakref.ref(df)
+        self.inventory = compile_inventory(df, market)
+        self.has_market = market is not None
+        self._masks = {}  # predicate key -> bool array over rows
+        self._views = {}  # view -> (rules, predicate keys, action keys, winner, new prices)
+        self.stats = {"masks_computed": 0, "rows_rematched": 0, "rows_repriced": 0}
+
+    def matches(self, df):
+        """
+        Whether this index was built from `df`. Edits made to `df` in place are not
+        detected, rebuild the index after changing its rows or prices.
+        """
+        return self._source() is df and len(df) == self.inventory["rows"]
+
+    def attach_market(self, market):
+        """
+        Use a market_table for the market-data actions. Matches stay cached, the
+        prices of every view are recomputed on their next evaluate.
+        """
+        self.inventory["market_data"] = market_arrays(self._source(), market)
+        self.has_market = True
+        self._views = {}
+
+    def mask(self, rule):
+        key = predicate_key(rule)
+        mask = self._masks.get(key)
+        if mask is None:
+            plan = compile_rules([rule], self.inventory)
+            mask = np.zeros(self.inventory["rows"], dtype=bool)
+            for start in range(0, self.inventory["rows"], CHUNK_ROWS):
+                stop = min(start + CHUNK_ROWS, self.inventory["rows"])
+                mask[start:stop] = match_block(plan, self.inventory, start, stop)[0]
+            self._masks[key] = mask
+            self.stats["masks_computed"] += 1
+        return mask
+
+    def evaluate(self, rules, view="default"):
+        """
+        Winning rule index per row (-1 for none) and the new price of every row.
+        """
+        plan = compile_rules(rules, self.inventory)
+        keys = [predicate_key(rule) for rule in rules]
+        actions = [action_key(rule) for rule in rules]
+        rows = self.inventory["rows"]
+        previous = self._views.get(view)
+
+        if previous is None:
+            winner = np.full(rows, -1, dtype=np.int32)
+            dirty = np.ones(rows, dtype=bool)
+            middle = len(rules)
+            repriced = dirty
+        else:
+            old_rules, old_keys, old_actions, old_winner, old_prices = previous
+            prefix, suffix = _common_affixes(old_keys, keys)
+            old_middle_end, middle = len(old_keys) - suffix, len(keys) - suffix
+            # Shift winners in the unchanged tail to their new positions
+            winner = np.where(old_winner >= old_middle_end, old_winner + (len(keys) - len(old_keys)), old_winner)
+            dirty = np.zeros(rows, dtype=bool)
+            # Masks of old rules may never have been computed, e.g. when no row was dirty
+            for rule in old_rules[prefix:old_middle_end]:
+                dirty |= self.mask(rule)
+            for rule in rules[prefix:middle]:
+                dirty |= self.mask(rule)
+            for rule in rules[middle:]:
+                dirty &= ~self.mask(rule)
+            # Rules keeping their predicates but not their action
+            old_index = list(range(prefix)) + list(range(old_middle_end, len(old_keys)))
+            new_index = list(range(prefix)) + list(range(middle, len(keys)))
+            changed = [new for old, new in zip(old_index, new_index) if old_actions[old] != actions[new]]
+            repriced = dirty | np.isin(winner, changed)
+
+        if dirty.any():
+            candidates = np.flatnonzero(dirty)
+            stacked = np.stack([self.mask(rule)[candidates] for rule in rules[:middle]]) if middle else np.zeros((0, len(candidates)), dtype=bool)
+            winner[candidates] = last_match(stacked)
+            self.stats["rows_rematched"] += len(candidates)
+
+        if previous is None:
+            new_price = apply_actions(plan, self.inventory, winner)
+        else:
+            new_price = old_prices.copy()
+            if repriced.any():
+                subset = np.flatnonzero(repriced)
+                new_price[subset] = apply_actions(plan, _take(self.inventory, subset), winner[subset])
+        self.stats["rows_repriced"] += int(repriced.sum())
+        self._views[view] = (list(rules), keys, actions, winner, new_price)
+        if len(self._masks) > MAX_CACHED_MASKS:
+            in_use = {key for _, view_keys, _, _, _ in self._views.values() for key in view_keys}
+            self._masks = {key: mask for key, mask in self._masks.items() if key in in_use}
+        return winner, new_price
+
+
+def _take(inventory, rows):
+    return {
+        "rows": len(rows),
+        "price": inventory["price"][rows],
+        "market": inventory["market"][rows],
+        "market_data": {field: values[rows] for field, values in inventory["market_data"].items()},
+    }
+
+
+def preview(df, rules, label=default_label, index=None, view="default", market=None):
+    """
+    Apply a rule list to an inventory export.
+
+    Args:
+        df (DataFrame): TCGplayer inventory export.
+        rules (list): Rule dicts, later rules take precedence.
+        label (callable): rule -> text for the 'Affected Rule' column.
+        index (RuleMatchIndex): Optional cache built from `df` for incremental previews.
+        view (str): Which of the index's previews this is, e.g. "current" or "template".
+        market (DataFrame): market_table for the market-data actions when no index is given.
+
+    Returns:
+        DataFrame: A copy of `df` with 'Affected Rule' ("None" when no rule applies) and 'New Price'.
+    """
+    if index is not None:
+        winner, new_price = index.evaluate(rules, view)
+    else:
+        inventory = compile_inventory(df, market)
+        plan = compile_rules(rules, inventory)
+        winner = match_rules(plan, inventory)
+        new_price = apply_actions(plan, inventory, winner)
+    labels = np.array([label(rule) for rule in rules] + [NO_RULE], dtype=object)
+    result = df.copy()
+    # Index -1 picks the trailing NO_RULE label
+    result["Affected Rule"] = labels[winner]
+    result["New Price"] = new_price
+    return result
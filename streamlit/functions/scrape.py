@@ -110,7 +110,9 @@ def scrape_tcgplayer():
 
     # Send all collected data to Google Sheets at once
     if databaseEntries:
-        db.writeDB(db.connectDB(), databaseEntries)
+        connection = db.connectDB("tcgplayerdb")
+        db.bulk_write_db(connection, databaseEntries)
+        db.refresh_latest_prices(connection, datetime.now().date())
 
     # Close the WebDriver
     driver.quit()
@@ -1,6 +1,14 @@
 from playwright.sync_api import sync_playwright
 import logging
 
+try:
+    from functions.resource_blocker import ResourceBlocker
+    from functions.browser_pool import parse_add_to_cart_id
+except ImportError:
+    # Run directly as a script from the functions directory
+    from resource_blocker import ResourceBlocker
+    from browser_pool import parse_add_to_cart_id
+
 def scrape_add_to_cart_id(url):
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True, args=["--disable-blink-features=AutomationControlled"])
@@ -8,6 +16,7 @@ def scrape_add_to_cart_id(url):
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
         )
         context.add_init_script("Object.defineProperty(navigator, 'webdriver', { get: () => undefined })")
+        blocker = ResourceBlocker("add_to_cart").attach(context)
         page = context.new_page()
         try:
             
@@ -27,25 +36,13 @@ def scrape_add_to_cart_id(url):
                 browser.close()
                 return None
 
-            # Try section first
+            # Try section first, fall back to the button
             section = page.query_selector("section[data-testid^='AddToCart_']")
-            if section:
-                data_testid = section.get_attribute("data-testid")
-                if data_testid:
-                    parts = data_testid.split('_')
-                    if len(parts) >= 3 and parts[1] == 'FS':
-                        return parts[2].split('-')[0]
-                    elif len(parts) >= 2:
-                        return parts[1].split('-')[0]
-            # Fallback to button
             button = page.query_selector("button[data-testid^='add-to-cart__submit--']")
-            if button:
-                data_testid = button.get_attribute("data-testid")
-                if data_testid:
-                    # Example: add-to-cart__submit--5505819-1519259b
-                    parts = data_testid.split('--')
-                    if len(parts) == 2:
-                        return parts[1].split('-')[0]
+            return parse_add_to_cart_id(
+                section.get_attribute("data-testid") if section else None,
+                button.get_attribute("data-testid") if button else None
+            )
 
         except Exception as e:
             logging.warning(f"Error scraping AddToCart ID: {e}")
@@ -53,6 +50,7 @@ def scrape_add_to_cart_id(url):
             with open("error_page.html", "w", encoding="utf-8") as f:
                 f.write(page.content())
         finally:
+            blocker.log_summary()
             browser.close()
         return None
 
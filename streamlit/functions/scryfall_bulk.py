@@ -0,0 +1,298 @@
+"""Local mirror of Scryfall's bulk card data for price lookups.
+
+Scryfall publishes a daily dump of every card. Querying a local index of it
+instead of calling api.scryfall.com once per decklist line (with the 100ms
+politeness delay between calls) turns precon valuation from tens of seconds
+into milliseconds. The dump is parsed as a stream, so the multi-hundred-MB file
+never has to be held in memory, and written into a small sqlite index keyed by
+(set, collector_number) and by card name.
+
+Refresh the mirror with:
+    python -m functions.scryfall_bulk refresh
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import requests
+
+BULK_DATA_URL = "https://api.scryfall.com/bulk-data"
+BULK_TYPE = "default_cards"
+BULK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "scryfall", "bulk")
+INDEX_PATH = os.path.join(BULK_DIR, "cards.sqlite")
+INSERT_BATCH = 5000
+READ_CHUNK = 1 << 20
+
+# Finish name used in decklists -> price column
+FINISH_COLUMNS = {"nonfoil": "usd", "foil": "usd_foil", "etched": "usd_etched"}
+
+
+def iter_json_array(fileobj, chunk_size=READ_CHUNK):
+    """
+    Yield the elements of a top level JSON array one at a time without loading
+    the whole document.
+
+    Args:
+        fileobj: Text file object positioned at the start of the array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace, the opening bracket and separators between elements
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and not started:
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # A value that runs to the end of the buffer (e.g. a number) may continue in the next chunk
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                if buffer[pos:].strip():
+                    raise
+                return
+            complete = False
+        if not complete:
+            # Drop what was already consumed, then read the next chunk
+            chunk = fileobj.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def _price(card, key):
+    value = (card.get("prices") or {}).get(key)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _treatment(card):
+    """
+    The decklist treatment tag a printing matches: extended, borderless, retro, showcase or ''.
+    """
+    frame_effects = card.get("frame_effects") or []
+    if "extendedart" in frame_effects:
+        return "extended"
+    if card.get("border_color") == "borderless":
+        return "borderless"
+    if "showcase" in frame_effects:
+        return "showcase"
+    if card.get("frame") == "1997":
+        return "retro"
+    return ""
+
+
+def _row(card):
+    name = card.get("name") or ""
+    return (
+        card.get("id"),
+        (card.get("set") or "").lower(),
+        str(card.get("collector_number") or ""),
+        name.lower(),
+        name.split(" // ")[0].lower(),
+        _treatment(card),
+        ",".join(card.get("finishes") or []),
+        _price(card, "usd"),
+        _price(card, "usd_foil"),
+        _price(card, "usd_etched"),
+        card.get("tcgplayer_id"),
+        card.get("released_at"),
+    )
+
+
+def build_index(json_path, index_path=INDEX_PATH):
+    """
+    Stream a Scryfall bulk JSON file into a fresh sqlite index and swap it in.
+
+    Returns:
+        int: Number of cards indexed.
+    """
+    start = time.perf_counter()
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("""
+        CREATE TABLE cards (
+            id TEXT PRIMARY KEY,
+            set_code TEXT NOT NULL,
+            collector_number TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            face_key TEXT NOT NULL,
+            treatment TEXT NOT NULL,
+            finishes TEXT,
+            usd REAL,
+            usd_foil REAL,
+            usd_etched REAL,
+            tcgplayer_id INTEGER,
+            released_at TEXT
+        )
+    """)
+    count = 0
+    batch = []
+    with open(json_path, "r", encoding="utf-8") as f:
+        for card in iter_json_array(f):
+            batch.append(_row(card))
+            if len(batch) >= INSERT_BATCH:
+                conn.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                count += len(batch)
+                batch = []
+    if batch:
+        conn.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        count += len(batch)
+    conn.execute("CREATE INDEX cards_set_number_idx ON cards (set_code, collector_number)")
+    conn.execute("CREATE INDEX cards_name_idx ON cards (name_key, set_code)")
+    conn.execute("CREATE INDEX cards_face_idx ON cards (face_key, set_code)")
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_path)
+    logging.info(f"Indexed {count} Scryfall cards in {time.perf_counter() - start:.1f}s")
+    return count
+
+
+def download_bulk(bulk_type=BULK_TYPE, dest_dir=BULK_DIR):
+    """
+    Download the latest Scryfall bulk file of `bulk_type` if it is newer than the local copy.
+
+    Returns:
+        tuple: (path to the JSON file, whether a new file was downloaded)
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    meta = requests.get(BULK_DATA_URL, timeout=30).json()
+    entry = next(item for item in meta["data"] if item["type"] == bulk_type)
+    json_path = os.path.join(dest_dir, f"{bulk_type}.json")
+    stamp_path = os.path.join(dest_dir, f"{bulk_type}.updated_at")
+    if os.path.exists(json_path) and os.path.exists(stamp_path):
+        with open(stamp_path, "r") as f:
+            if f.read().strip() == entry["updated_at"]:
+                logging.info(f"Scryfall {bulk_type} is up to date ({entry['updated_at']})")
+                return json_path, False
+    tmp_path = f"{json_path}.tmp"
+    with requests.get(entry["download_uri"], stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(tmp_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=READ_CHUNK):
+                f.write(chunk)
+    os.replace(tmp_path, json_path)
+    with open(stamp_path, "w") as f:
+        f.write(entry["updated_at"])
+    logging.info(f"Downloaded Scryfall {bulk_type} ({entry['updated_at']})")
+    return json_path, True
+
+
+def refresh(force=False):
+    """
+    Download the latest bulk file and rebuild the index when it changed.
+    """
+    json_path, downloaded = download_bulk()
+    if downloaded or force or not os.path.exists(INDEX_PATH):
+        build_index(json_path)
+    reset_index()
+
+
+class ScryfallIndex:
+    """
+    Read-only lookups against the sqlite index built by build_index.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def price(self, set_code, collector_number, finish="nonfoil"):
+        """
+        Price of an exact printing, or None if it is not in the index or has no price for that finish.
+        """
+        column = FINISH_COLUMNS.get(finish, "usd")
+        rows = self._query(
+            f"SELECT {column} FROM cards WHERE set_code = ? AND collector_number = ? LIMIT 1",
+            (set_code.lower(), str(collector_number)))
+        return rows[0][0] if rows else None
+
+    def price_by_name(self, name, set_code, treatment="", finish="nonfoil"):
+        """
+        Price of a card by name within a set. With no treatment the regular frame is
+        preferred, otherwise the printing with the matching frame treatment.
+        """
+        column = FINISH_COLUMNS.get(finish, "usd")
+        key = name.strip().lower()
+        rows = self._query(f"""
+            SELECT {column} FROM cards
+            WHERE (name_key = ? OR face_key = ?) AND set_code = ? AND {column} IS NOT NULL
+                AND (? = '' OR treatment = ?)
+            ORDER BY treatment != '', CAST(collector_number AS INTEGER), collector_number
+            LIMIT 1
+        """, (key, key, set_code.lower(), treatment or "", treatment or ""))
+        return rows[0][0] if rows else None
+
+    def tcgplayer_id(self, set_code, collector_number):
+        rows = self._query(
+            "SELECT tcgplayer_id FROM cards WHERE set_code = ? AND collector_number = ? LIMIT 1",
+            (set_code.lower(), str(collector_number)))
+        return rows[0][0] if rows else None
+
+    def close(self):
+        self._conn.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Return the shared ScryfallIndex, or None if the mirror has not been built yet.
+    """
+    global _index
+    with _index_lock:
+        if _index is None and os.path.exists(INDEX_PATH):
+            _index = ScryfallIndex()
+        return _index
+
+
+def reset_index():
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+        _index = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    parser = argparse.ArgumentParser(description="Maintain the local Scryfall bulk data mirror")
+    parser.add_argument("command", choices=["refresh", "build"], help="refresh downloads and reindexes when Scryfall has a newer file, build reindexes a local file")
+    parser.add_argument("--json", help="Bulk JSON file for build")
+    parser.add_argument("--force", action="store_true", help="Rebuild the index even if the bulk file did not change")
+    args = parser.parse_args()
+    if args.command == "refresh":
+        refresh(force=args.force)
+    else:
+        build_index(args.json or os.path.join(BULK_DIR, f"{BULK_TYPE}.json"))
@@ -0,0 +1,208 @@
+"""Shared Scryfall API client.
+
+Single card lookups are queued and sent to /cards/collection in batches of up
+to 75 identifiers, so importing a 300-card Manabox export costs 4 requests
+instead of 300. All requests go through one keep-alive session and a token
+bucket sized to Scryfall's published limit (10 requests per second), and 429 /
+503 responses are retried after the server's Retry-After.
+
+Callers get concurrent.futures.Future objects back. Lookups are cached for
+CACHE_TTL seconds, so submitting the same card twice only fetches it once:
+
+    client = scryfall_client.get_client()
+    futures = [client.card_by_number(s, n) for s, n in printings]   # queued
+    cards = [f.result() for f in futures]                             # batched
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+API_URL = "https://api.scryfall.com"
+MAX_BATCH = 75  # Scryfall's limit for /cards/collection
+BATCH_WINDOW = 0.05  # Seconds to wait for more identifiers before sending a partial batch
+REQUESTS_PER_SECOND = 10
+MAX_RETRIES = 5
+CACHE_TTL = 3600
+CACHE_SIZE = 20000
+HEADERS = {"User-Agent": "TCGScraper/1.0", "Accept": "application/json"}
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def identifier_key(identifier):
+    """
+    Normalize a /cards/collection identifier into a hashable cache key.
+    """
+    return tuple(sorted((k, str(v).lower()) for k, v in identifier.items()))
+
+
+def card_matches(card, identifier):
+    """
+    Whether a card returned by /cards/collection answers an identifier.
+    """
+    if "id" in identifier:
+        return card.get("id") == identifier["id"]
+    if "set" in identifier and card.get("set", "").lower() != str(identifier["set"]).lower():
+        return False
+    if "collector_number" in identifier:
+        return str(card.get("collector_number", "")).lower() == str(identifier["collector_number"]).lower()
+    if "name" in identifier:
+        name = str(identifier["name"]).lower()
+        card_name = card.get("name", "").lower()
+        return card_name == name or card_name.split(" // ")[0] == name
+    return False
+
+
+class ScryfallClient:
+
+    def __init__(self, session=None, bucket=None):
+        self.session = session or requests.Session()
+        self.session.headers.update(HEADERS)
+        self.bucket = bucket or TokenBucket()
+        self.requests_sent = 0
+        self._pending = []  # (identifier, future)
+        self._cache = {}  # identifier key -> (time, future)
+        self._cond = threading.Condition()
+        self._dispatcher = None
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a rate limited request, retrying 429 and 503 responses after Retry-After.
+        """
+        url = path if path.startswith("http") else f"{API_URL}{path}"
+        kwargs.setdefault("timeout", 30)
+        for attempt in range(MAX_RETRIES + 1):
+            self.bucket.acquire()
+            response = self.session.request(method, url, **kwargs)
+            self.requests_sent += 1
+            if response.status_code not in (429, 503) or attempt == MAX_RETRIES:
+                return response
+            try:
+                delay = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                delay = 2 ** attempt
+            logging.warning(f"Scryfall returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+        return response
+
+    def submit(self, identifier):
+        """
+        Queue a /cards/collection identifier, e.g. {"set": "snc", "collector_number": "60"},
+        {"id": scryfall_id} or {"name": "Sol Ring", "set": "tdc"}.
+
+        Returns:
+            Future: Resolves to the card dict, or None if Scryfall has no match.
+        """
+        key = identifier_key(identifier)
+        with self._cond:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < CACHE_TTL:
+                return cached[1]
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            future = Future()
+            self._cache[key] = (time.monotonic(), future)
+            self._pending.append((identifier, future))
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch, name="scryfall-batcher", daemon=True)
+                self._dispatcher.start()
+            self._cond.notify()
+        return future
+
+    def card_by_number(self, set_code, collector_number):
+        return self.submit({"set": set_code.lower(), "collector_number": str(collector_number)})
+
+    def card_by_id(self, scryfall_id):
+        return self.submit({"id": scryfall_id})
+
+    def card_by_name(self, name, set_code=None):
+        identifier = {"name": name}
+        if set_code:
+            identifier["set"] = set_code.lower()
+        return self.submit(identifier)
+
+    def search_first(self, query):
+        """
+        First card matching a full text search, for queries /cards/collection can't express
+        (frame treatments, finishes). Not batched, but shares the session and rate limit.
+        """
+        response = self.request("GET", "/cards/search", params={"q": query})
+        if response.status_code != 200:
+            logging.warning(f"Scryfall search failed ({response.status_code}) for {query}")
+            return None
+        data = response.json().get("data") or []
+        return data[0] if data else None
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    if not self._cond.wait(timeout=60):
+                        # Idle, let the thread exit; submit starts a new one
+                        self._dispatcher = None
+                        return
+                deadline = time.monotonic() + BATCH_WINDOW
+                while len(self._pending) < MAX_BATCH and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                batch = self._pending[:MAX_BATCH]
+                del self._pending[:MAX_BATCH]
+            self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        try:
+            response = self.request("POST", "/cards/collection",
+                                    json={"identifiers": [identifier for identifier, _ in batch]})
+            response.raise_for_status()
+            cards = response.json().get("data") or []
+        except Exception as e:
+            logging.warning(f"Scryfall collection request for {len(batch)} cards failed: {e}")
+            with self._cond:
+                for identifier, future in batch:
+                    self._cache.pop(identifier_key(identifier), None)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for identifier, future in batch:
+            future.set_result(next((card for card in cards if card_matches(card, identifier)), None))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide ScryfallClient.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ScryfallClient()
+        return _client
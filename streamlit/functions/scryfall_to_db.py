@@ -1,9 +1,28 @@
-import psycopg2
+"""Import the Scryfall card files in data/cards_by_set into scryfall_to_tcgplayer.
+
+The import is incremental. Each card's imported fields are hashed, and only
+cards that are new or whose hash changed since the last import are copied into
+a staging table and merged. The table is never dropped, so the scraped
+tcgplayer_id_normal / tcgplayer_id_foil columns survive reimports. The JSON
+files are read as a stream instead of being loaded whole.
+"""
+
+import csv
+import hashlib
 import json
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import logging
-import psycopg2.extras
 import os
+import tempfile
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+try:
+    from functions.scryfall_bulk import iter_json_array
+except ImportError:
+    # Run directly as a script from the functions directory
+    from scryfall_bulk import iter_json_array
 
 # Database connection parameters
 user = 'rmangana'
@@ -12,112 +31,171 @@ host = '52.73.212.127'
 port = 5432
 scryfall_db = 'scryfall'
 
-# Logging configuration
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
-logging.info('Starting Scryfall DB import script.')
-
-# Step 1: Connect to default 'postgres' database to check/create 'scryfall' database
-conn = psycopg2.connect(
-    dbname='postgres',
-    user=user,
-    password=password,
-    host=host,
-    port=port
-)
-conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-cur = conn.cursor()
-cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (scryfall_db,))
-exists = cur.fetchone()
-if not exists:
-    cur.execute(f'CREATE DATABASE {scryfall_db}')
-cur.close()
-conn.close()
-
-# Step 2: Connect to 'scryfall' database
-conn = psycopg2.connect(
-    dbname=scryfall_db,
-    user=user,
-    password=password,
-    host=host,
-    port=port
-)
-cur = conn.cursor()
-
-# Drop the scryfall table if it exists to ensure schema matches
-logging.info('Dropping and recreating scryfall_to_tcgplayer table.')
-cur.execute("DROP TABLE IF EXISTS scryfall_to_tcgplayer;")
-# Create table with all fields from the sample card
-cur.execute("""
-CREATE TABLE IF NOT EXISTS scryfall_to_tcgplayer (
-    id TEXT PRIMARY KEY,
-    tcgplayer_id INT,
-    name TEXT,
-    released_at DATE,
-    set TEXT,
-    set_name TEXT,
-    collector_number TEXT,
-    rarity TEXT,
-    frame TEXT,
-    full_art BOOLEAN,
-    prices JSONB,
-    tcgplayer_id_normal INT,
-    tcgplayer_id_foil INT
-);
-""")
-conn.commit()
-logging.info('Table created.')
-
-# Directory containing all set JSON files
-data_dir = os.path.join(os.path.dirname(__file__), '../data/cards_by_set')
-json_files = [f for f in os.listdir(data_dir) if f.endswith('.json')]
-
-columns = [
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cards_by_set')
+# Columns filled from the Scryfall JSON. tcgplayer_id_normal / tcgplayer_id_foil are
+# scraped from TCGplayer and never touched by the import.
+COLUMNS = [
     "id", "tcgplayer_id", "name", "released_at", "set", "set_name", "collector_number",
-    "rarity", "frame", "full_art", "prices", "tcgplayer_id_normal", "tcgplayer_id_foil"
+    "rarity", "frame", "full_art", "prices"
 ]
-json_keys = ["prices"]
-column_str = ", ".join(columns)
-placeholder_str = ", ".join(["%s"] * len(columns))
-
-all_values = []
-for json_file in json_files:
-    file_path = os.path.join(data_dir, json_file)
-    logging.info(f'Loading card data from {file_path}.')
-    with open(file_path, 'r', encoding='utf-8') as f:
-        cards = json.load(f)
-    logging.info(f'Loaded {len(cards)} card(s) from {json_file}.')
-    for card in cards:
-        values = [
-            json.dumps(card.get(col, {} if col in json_keys else None)) if col in json_keys else card.get(col)
-            for col in columns
-        ]
-        all_values.append(values)
-
-sql = f"""
-INSERT INTO scryfall_to_tcgplayer ({column_str})
-VALUES ({placeholder_str})
-ON CONFLICT (id) DO UPDATE SET
-    tcgplayer_id = EXCLUDED.tcgplayer_id,
-    name = EXCLUDED.name,
-    released_at = EXCLUDED.released_at,
-    set = EXCLUDED.set,
-    set_name = EXCLUDED.set_name,
-    collector_number = EXCLUDED.collector_number,
-    rarity = EXCLUDED.rarity,
-    frame = EXCLUDED.frame,
-    full_art = EXCLUDED.full_art,
-    prices = EXCLUDED.prices,
-    tcgplayer_id_normal = EXCLUDED.tcgplayer_id_normal,
-    tcgplayer_id_foil = EXCLUDED.tcgplayer_id_foil
-"""
+JSON_COLUMNS = {"prices"}
+SPOOL_SIZE = 64 << 20  # Changed rows are buffered in memory up to this size, then on disk
+
+
+def connect(dbname=scryfall_db):
+    return psycopg2.connect(
+        dbname=dbname,
+        user=user,
+        password=password,
+        host=host,
+        port=port
+    )
+
+
+def ensure_database():
+    conn = connect('postgres')
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (scryfall_db,))
+    if not cur.fetchone():
+        cur.execute(f'CREATE DATABASE {scryfall_db}')
+    cur.close()
+    conn.close()
+
+
+def ensure_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scryfall_to_tcgplayer (
+            id TEXT PRIMARY KEY,
+            tcgplayer_id INT,
+            name TEXT,
+            released_at DATE,
+            set TEXT,
+            set_name TEXT,
+            collector_number TEXT,
+            rarity TEXT,
+            frame TEXT,
+            full_art BOOLEAN,
+            prices JSONB,
+            tcgplayer_id_normal INT,
+            tcgplayer_id_foil INT,
+            content_hash TEXT
+        )
+    """)
+    # Tables created before the import was incremental
+    cur.execute("ALTER TABLE scryfall_to_tcgplayer ADD COLUMN IF NOT EXISTS content_hash TEXT")
+    conn.commit()
+    cur.close()
+
+
+def card_row(card):
+    """
+    Values for COLUMNS from a Scryfall card dict, JSON columns serialized.
+    """
+    return [
+        json.dumps(card.get(col) or {}, sort_keys=True) if col in JSON_COLUMNS else card.get(col)
+        for col in COLUMNS
+    ]
+
+
+def content_hash(row):
+    return hashlib.sha1(json.dumps(row, default=str).encode('utf-8')).hexdigest()
+
+
+def iter_cards(data_dir=DATA_DIR):
+    """
+    Stream every card from the JSON files in `data_dir`.
+    """
+    for json_file in sorted(f for f in os.listdir(data_dir) if f.endswith('.json')):
+        file_path = os.path.join(data_dir, json_file)
+        logging.info(f'Reading card data from {file_path}.')
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield from iter_json_array(f)
+
+
+def existing_hashes(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT id, content_hash FROM scryfall_to_tcgplayer")
+    hashes = dict(cur.fetchall())
+    cur.close()
+    return hashes
+
+
+def import_cards(conn, data_dir=DATA_DIR):
+    """
+    Upsert the cards in `data_dir` whose content changed since the last import.
+
+    Returns:
+        tuple: (cards read, cards inserted or updated)
+    """
+    start = time.perf_counter()
+    known = existing_hashes(conn)
+    seen = set()
+    changed = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', newline='', encoding='utf-8') as buffer:
+        writer = csv.writer(buffer)
+        for card in iter_cards(data_dir):
+            card_id = card.get('id')
+            if not card_id or card_id in seen:
+                continue
+            seen.add(card_id)
+            row = card_row(card)
+            digest = content_hash(row)
+            if known.get(card_id) == digest:
+                continue
+            writer.writerow(['\\N' if value is None else value for value in row] + [digest])
+            changed += 1
+        logging.info(f'Read {len(seen)} cards, {changed} new or changed.')
+        if not changed:
+            return len(seen), 0
+
+        buffer.seek(0)
+        column_str = ", ".join(COLUMNS + ["content_hash"])
+        updates = ",\n                ".join(f"{col} = s.{col}" for col in COLUMNS[1:] + ["content_hash"])
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                CREATE TEMP TABLE scryfall_staging
+                (LIKE scryfall_to_tcgplayer INCLUDING DEFAULTS) ON COMMIT DROP
+            """)
+            cur.copy_expert(
+                f"COPY scryfall_staging ({column_str}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+            cur.execute(f"""
+                MERGE INTO scryfall_to_tcgplayer AS t
+                USING scryfall_staging AS s ON t.id = s.id
+                WHEN MATCHED AND t.content_hash IS DISTINCT FROM s.content_hash THEN UPDATE SET
+                {updates}
+                WHEN NOT MATCHED THEN
+                    INSERT ({column_str})
+                    VALUES ({", ".join(f"s.{col}" for col in COLUMNS + ["content_hash"])})
+            """)
+            merged = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    logging.info(f'Merged {merged} cards in {time.perf_counter() - start:.1f}s.')
+    return len(seen), merged
+
+
+def main():
+    logging.info('Starting Scryfall DB import script.')
+    ensure_database()
+    conn = connect()
+    try:
+        ensure_table(conn)
+        import_cards(conn)
+    finally:
+        conn.close()
+    logging.info("Scryfall cards are up to date in the 'scryfall' database.")
+
 
-batch_size = 500
-for i in range(0, len(all_values), batch_size):
-    batch = all_values[i:i+batch_size]
-    psycopg2.extras.execute_batch(cur, sql, batch)
-    logging.info(f'Inserted batch {i//batch_size+1} ({len(batch)} cards)')
-conn.commit()
-# Close the cursor and connection
-cur.close()
-conn.close()
-logging.info("All cards inserted successfully into the 'scryfall' database.")
+if __name__ == "__main__":
+    # Logging configuration
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    main()
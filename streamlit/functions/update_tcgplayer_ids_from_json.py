@@ -1,34 +1,24 @@
 import psycopg2
-import os
-import logging
-import subprocess
-import json
 
-def run_playwright_script(url):
-    script_path = os.path.join(os.path.dirname(__file__), 'scrape_playwright.py')
-    result = subprocess.run(
-        ["python", script_path, url],
-        capture_output=True,
-        text=True,
-        env=os.environ.copy(),
-        cwd=os.path.dirname(script_path)
-    )
-    logging.info(f"Subprocess stdout: {result.stdout.strip()}")
-    logging.info(f"Subprocess stderr: {result.stderr.strip()}")
-    if result.returncode != 0:
-        logging.warning(f"Subprocess failed with return code {result.returncode}")
-        return None
-    output = result.stdout.strip()
-    if output and output.isdigit():
-        return output
-    return None
+try:
+    from functions import browser_pool, card_cache
+except ImportError:
+    # Run directly as a script from the functions directory
+    import browser_pool
+    import card_cache
+
+# Cards resolved per browser pool batch, two product URLs each
+BATCH_SIZE = 25
+
+def product_urls(tcgplayer_id):
+    base = f"https://www.tcgplayer.com/product/{int(tcgplayer_id)}?Language=English&page=1"
+    return f"{base}&Printing=Normal&Condition=Near+Mint", f"{base}&Printing=Foil&Condition=Near+Mint"
 
 def update_tcgplayer_ids_from_json(json_path, dbname='scryfall'):
     """
     For each card in the JSON with a tcgplayer_id, scrape TCGplayer and update the scryfall_to_tcgplayer table.
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        cards = json.load(f)
+    cards = card_cache.records(card_cache.load_card_columns(json_path))
     conn = psycopg2.connect(
         dbname=dbname,
         user='rmangana',
@@ -37,14 +27,16 @@ def update_tcgplayer_ids_from_json(json_path, dbname='scryfall'):
         port=5432
     )
     cur = conn.cursor()
-    for card in cards:
-        tcgplayer_id = card.get('tcgplayer_id')
-        if not tcgplayer_id:
-            continue
-        url_normal = f"https://www.tcgplayer.com/product/{int(tcgplayer_id)}?Language=English&page=1&Printing=Normal&Condition=Near+Mint"
-        add_to_cart_id_normal = run_playwright_script(url_normal)
-        url_foil = f"https://www.tcgplayer.com/product/{int(tcgplayer_id)}?Language=English&page=1&Printing=Foil&Condition=Near+Mint"
-        add_to_cart_id_foil = run_playwright_script(url_foil)
+    cards = [card for card in cards if card.get('tcgplayer_id')]
+    resolved = {}
+    for idx, card in enumerate(cards):
+        if idx % BATCH_SIZE == 0:
+            # Resolve the next batch of product pages in one go on the warm browser pool
+            batch_urls = [url for c in cards[idx:idx + BATCH_SIZE] for url in product_urls(c['tcgplayer_id'])]
+            resolved = browser_pool.resolve_add_to_cart_ids(batch_urls)
+        url_normal, url_foil = product_urls(card['tcgplayer_id'])
+        add_to_cart_id_normal = resolved.get(url_normal)
+        add_to_cart_id_foil = resolved.get(url_foil)
         scryfall_id = card.get('id')
         try:
             if add_to_cart_id_normal:
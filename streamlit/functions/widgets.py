@@ -2,112 +2,87 @@ import streamlit as st
 import json
 import psycopg2
 import bcrypt
+from functions import db
 from streamlit_cookies_controller import CookieController
 
 cookie_controller = CookieController()
 
+_users_table_ready = False
+
 def ensure_users_table():
-    
-    conn = psycopg2.connect(
-        dbname='tcgplayerdb',
-        user='rmangana',
-        password='password',
-        host='52.73.212.127',
-        port=5432
-    )
-    cur = conn.cursor()
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            rules JSONB,
-            templates JSONB,
-            return_address TEXT
-        );
-    ''')
-    conn.commit()
-    cur.close()
-    conn.close()
+    global _users_table_ready
+    # Only needs to run once per process, not on every rerun
+    if _users_table_ready:
+        return
+    with db.pooled_connection('tcgplayerdb') as conn:
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                rules JSONB,
+                templates JSONB,
+                return_address TEXT
+            );
+        ''')
+        conn.commit()
+        cur.close()
+    _users_table_ready = True
 
 
 def create_user_db(username, password):
     ensure_users_table()
     
-    conn = psycopg2.connect(
-        dbname='tcgplayerdb',
-        user='rmangana',
-        password='password',
-        host='52.73.212.127',
-        port=5432
-    )
-    cur = conn.cursor()
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    try:
-        cur.execute('INSERT INTO users (username, password_hash, rules, templates) VALUES (%s, %s, %s, %s)', (username, password_hash, json.dumps([]), json.dumps([])))
-        conn.commit()
-        return True
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        return False
-    finally:
-        cur.close()
-        conn.close()
+    with db.pooled_connection('tcgplayerdb') as conn:
+        cur = conn.cursor()
+        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        try:
+            cur.execute('INSERT INTO users (username, password_hash, rules, templates) VALUES (%s, %s, %s, %s)', (username, password_hash, json.dumps([]), json.dumps([])))
+            conn.commit()
+            return True
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            return False
+        finally:
+            cur.close()
+
 
 def check_user_db(username, password):
     ensure_users_table()
     
-    conn = psycopg2.connect(
-        dbname='tcgplayerdb',
-        user='rmangana',
-        password='password',
-        host='52.73.212.127',
-        port=5432
-    )
-    cur = conn.cursor()
-    cur.execute('SELECT password_hash FROM users WHERE username = %s', (username,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db.pooled_connection('tcgplayerdb') as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT password_hash FROM users WHERE username = %s', (username,))
+        row = cur.fetchone()
+        cur.close()
     if row:
         return bcrypt.checkpw(password.encode('utf-8'), row[0].encode('utf-8'))
     return False
 
+
 def get_user_data_db(username):
     ensure_users_table()
     
-    conn = psycopg2.connect(
-        dbname='tcgplayerdb',
-        user='rmangana',
-        password='password',
-        host='52.73.212.127',
-        port=5432
-    )
-    cur = conn.cursor()
-    cur.execute('SELECT rules, templates, return_address FROM users WHERE username = %s', (username,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db.pooled_connection('tcgplayerdb') as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT rules, templates, return_address FROM users WHERE username = %s', (username,))
+        row = cur.fetchone()
+        cur.close()
     if row:
         return (row[0] or [], row[1] or [], row[2] or "")
     return [], [], ""
 
+
 def save_user_data_db(username, rules, templates, return_address):
     ensure_users_table()
     
-    conn = psycopg2.connect(
-        dbname='tcgplayerdb',
-        user='rmangana',
-        password='password',
-        host='52.73.212.127',
-        port=5432
-    )
-    cur = conn.cursor()
-    cur.execute('UPDATE users SET rules = %s, templates = %s, return_address = %s WHERE username = %s',
-                (json.dumps(rules), json.dumps(templates), return_address, username))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db.pooled_connection('tcgplayerdb') as conn:
+        cur = conn.cursor()
+        cur.execute('UPDATE users SET rules = %s, templates = %s, return_address = %s WHERE username = %s',
+                    (json.dumps(rules), json.dumps(templates), return_address, username))
+        conn.commit()
+        cur.close()
 
 def login():
     # On app start, check for cookie and auto-login
@@ -1,4 +1,4 @@
-from functions import ecs, widgets
+from functions import db, ecs, widgets
 import streamlit as st
 
 widgets.show_pages_sidebar()
@@ -41,6 +41,13 @@ with st.expander("ECS"):
     with col3:
         pass
 
+with st.expander("Database Connection Pools"):
+    stats = db.pool_stats()
+    if stats:
+        st.dataframe(list(stats.values()), use_container_width=True)
+    else:
+        st.info("No connection pools have been opened by this app process yet.")
+
 with st.expander("Price Check"):
     st.divider()
 
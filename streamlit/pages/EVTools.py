@@ -1,6 +1,5 @@
-from functions import mtg_box_sim, commander_ev, widgets
+from functions import mtg_box_sim, commander_ev, db, decklist, widgets
 import streamlit as st
-import os
 import pandas as pd
 import sys
 import logging
@@ -39,21 +38,43 @@ with tab1:
     # Inputs and button
     with col1:
         set = st.text_input("Set Name", placeholder="dft", value="dft")
+        booster_options = mtg_box_sim.booster_types()
+        booster = st.selectbox("Booster", booster_options, index=booster_options.index(mtg_box_sim.DEFAULT_BOOSTER))
 
     with col2:
-        boxes_to_open = st.number_input("Boxes to open", min_value=1, step=1)
+        boxes_to_open = st.number_input("Boxes to open", min_value=1, max_value=100000, value=10000, step=1000)
+        tolerance = st.number_input("Stop once EV is within ± $", min_value=0.0, value=0.5, step=0.1,
+                                    help="Stops opening boxes once the 95% confidence interval on the mean is this tight. 0 opens every box.")
 
     with col3:
         if st.button("Simulate!", use_container_width=True):
-            ev = mtg_box_sim.simulate(f"{set}", int(boxes_to_open))
+            result = mtg_box_sim.simulate_parallel(f"{set}", int(boxes_to_open), booster=booster, tolerance=tolerance or None)
+            st.session_state.last_simulation = result
             # Add to history
             st.session_state.ev_history.append({
                 "Set": set,
-                "Boxes Opened": int(boxes_to_open),
-                "EV": round(ev, 2)
+                "Booster": booster,
+                "Boxes Opened": result["boxes"],
+                "EV": round(result["mean"], 2),
+                "± 95%": round(result["ci_half_width"], 2),
+                "P5": round(result["percentiles"].get(5, 0), 2),
+                "Median": round(result["percentiles"].get(50, 0), 2),
+                "P95": round(result["percentiles"].get(95, 0), 2),
             })
         if st.button("clear", use_container_width=True):
             st.session_state.ev_history = []
+            st.session_state.pop("last_simulation", None)
+
+    # Exact EV needs no sampling, so show it for whatever set and booster are selected
+    try:
+        exact = mtg_box_sim.expected_value(f"{set}", booster)
+        ev_col1, ev_col2, ev_col3 = st.columns(3)
+        ev_col1.metric("Exact EV per box", f"${exact['box_ev']:.2f}", help=f"± ${exact['box_std']:.2f} standard deviation")
+        ev_col2.metric("Exact EV per pack", f"${exact['pack_ev']:.2f}", help=f"± ${exact['pack_std']:.2f} standard deviation")
+        top_slot = max(exact["slots"], key=exact["slots"].get) if exact["slots"] else "-"
+        ev_col3.metric("Biggest slot", top_slot, f"${exact['slots'].get(top_slot, 0):.2f} per pack", delta_color="off")
+    except FileNotFoundError:
+        st.info(f"No card data for set '{set}' yet.")
 
     # Display table with 2 columns
     if st.session_state.ev_history:
@@ -68,21 +89,20 @@ with tab1:
         # Display with Streamlit
         st.dataframe(styled_data, use_container_width=True)
 
+    # Distribution of the most recent run
+    if st.session_state.get("last_simulation", {}).get("boxes", 0) > 1:
+        counts, edges = st.session_state.last_simulation["histogram"]
+        st.bar_chart(pd.DataFrame({"Boxes": counts}, index=[f"${edge:.0f}" for edge in edges[:-1]]))
+
     precon_ev = 0
 
+@st.cache_data(ttl=600)
+def load_precon_changes():
+    return db.get_precon_value_changes(), db.get_precon_movers()
+
+
 with tab2:  
-    precons_by_set = {}
-
-    sets = []
-    cwd = os.getcwd()
-    set_path = os.path.join(cwd, "TCGScraper",  "streamlit", "data", "precons")
-    for set in os.listdir(set_path):
-        sets = set
-        precons_by_set[set] = []
-        precon_path = os.path.join(set_path, set)
-        for precon in os.listdir(precon_path):
-            precons_by_set[set].append(precon)
-    # print(precons_by_set)
+    precons_by_set = decklist.list_precons()
 
     if 'precon_ev_history' not in st.session_state:
         st.session_state.precon_ev_history = []
@@ -103,8 +123,7 @@ with tab2:
         precon = st.selectbox(
             "Precon Name",
             # Use the dynamically populated precons list
-            [precon.replace(".txt", "")
-             for precon in precons_by_set[set_selectbox]],
+            precons_by_set[set_selectbox],
             key="precon_selectbox",
             # Reset EV to 0 when a new precon is selected
             on_change=lambda: st.session_state.update({"precon_ev": 0})
@@ -125,6 +144,32 @@ with tab2:
         st.session_state.precon_ev = commander_ev.calculate_ev(
             set_selectbox, precon)
         st.rerun()
+
+    if st.button("Revalue all precons", use_container_width=True, help="Price every precon in data/precons in one pass and store today's values. Normally done daily by functions.precon_job."):
+        with st.spinner("Pricing every precon..."):
+            commander_ev.revalue_precons()
+        load_precon_changes.clear()
+
+    # Written by the batch job, so this is only a read
+    changes, movers = load_precon_changes()
+    if changes:
+        st.subheader(f"Precon values ({changes[0][4]})")
+        changes_df = pd.DataFrame(changes, columns=["Set", "Precon", "Previous", "Current", "Date"]).drop(columns="Date")
+        changes_df["Change"] = changes_df["Current"] - changes_df["Previous"]
+        st.dataframe(
+            changes_df.sort_values("Current", ascending=False),
+            use_container_width=True,
+            hide_index=True,
+            column_config={name: st.column_config.NumberColumn(name, format="$%.2f") for name in ("Previous", "Current", "Change")},
+        )
+    if movers:
+        st.subheader("Biggest movers since the last revaluation")
+        st.dataframe(
+            pd.DataFrame(movers, columns=["Set", "Precon", "Card", "Set Code", "Number", "Finish", "Previous", "Current", "Change"]),
+            use_container_width=True,
+            hide_index=True,
+            column_config={name: st.column_config.NumberColumn(name, format="$%.2f") for name in ("Previous", "Current", "Change")},
+        )
     
         
 widgets.footer()
\ No newline at end of file
@@ -1,43 +1,10 @@
 import streamlit as st
-from functions import widgets, manabox_db_updater, db
+from functions import widgets, manabox_db_updater, db, browser_pool, scryfall_client
 import pandas as pd
 import time
 import psycopg2
 import requests
 import logging
-import subprocess
-import os
-
-def run_playwright_script(url):
-    """
-    Run the Playwright script as a separate process and retrieve the AddToCart ID.
-
-    Args:
-        url (str): The URL of the TCGPlayer product page.
-
-    Returns:
-        str: The AddToCart ID if found, else None.
-    """
-    script_path = os.path.join(os.path.dirname(__file__), '../functions/scrape_playwright.py')
-    result = subprocess.run(
-        ["python", script_path, url],
-        capture_output=True,
-        text=True,
-        env=os.environ.copy(),  # Pass the current environment variables
-        cwd=os.path.dirname(script_path)  # Set the working directory to the script's location
-    )
-    logging.info(f"Subprocess stdout: {result.stdout.strip()}")
-    logging.info(f"Subprocess stderr: {result.stderr.strip()}")
-    if result.returncode != 0:
-        logging.warning(f"Subprocess failed with return code {result.returncode}")
-        return None
-    output = result.stdout.strip()
-    # Only return output if it looks like an ID (digits), else return None
-    if output and output.isdigit():
-        return output
-    return None
-
-
 
 st.title("🧩 ManaBox Converter")
 st.markdown("""
@@ -94,6 +61,30 @@ if manabox_csv is not None:
             'rare': 'R',
             'mythic': 'M',
         }
+        # Look up the product ids of cards missing from the db first, so their
+        # AddToCart IDs can be resolved in one batch on the browser pool
+        missing = []
+        for idx, card in enumerate(uploaded_df.itertuples()):
+            set_symbol = card[1] if len(card) > 1 else ''
+            set_name = card[2] if len(card) > 2 else ''
+            collector_number = str(card[3]) if len(card) > 3 else ''
+            printing = (card[4] if len(card) > 4 else '').capitalize()
+            lookup_key = (card[0], collector_number, set_name, printing == 'Foil')
+            if ('T' in set_symbol and len(set_symbol) == 4) or lookup_key in db_lookup:
+                continue
+            missing.append((idx, set_symbol, collector_number, printing))
+        # Queue every Scryfall lookup up front so they go out as /cards/collection batches
+        scryfall = scryfall_client.get_client()
+        for _, set_symbol, collector_number, _ in missing:
+            scryfall.card_by_number(set_symbol, collector_number)
+        product_urls = {}
+        for idx, set_symbol, collector_number, printing in missing:
+            tcgplayer_id = manabox_db_updater.get_tcgplayerid_from_scryfall(set_symbol, collector_number)
+            print(f"DEBUG: tcgplayer_id returned: {(tcgplayer_id)}")
+            if tcgplayer_id is not None:
+                product_urls[idx] = f"https://www.tcgplayer.com/product/{tcgplayer_id}?Language=English&page=1&Printing={printing}&Condition=Near+Mint"
+        resolved = browser_pool.resolve_add_to_cart_ids(list(product_urls.values()))
+
         scraped_count = 0  # Counter for scraped cards
         # for each card not found in the db_lookup use scryfall api to update the database
         for idx, card in enumerate(uploaded_df.itertuples()):
@@ -137,13 +128,11 @@ if manabox_csv is not None:
                 tcgplayer_card_id = None
             elif lookup_key not in db_lookup:
                 logging.info(f"No TCGplayer ID for card: {card_name} ({set_symbol}), scraping Scryfall...")
-                tcgplayer_id = manabox_db_updater.get_tcgplayerid_from_scryfall(set_symbol, collector_number)
-                print(f"DEBUG: tcgplayer_id returned: {(tcgplayer_id)}")
-                if tcgplayer_id is not None:
+                url = product_urls.get(idx)
+                if url is not None:
                     scraped_count +=1
-                    url = f"https://www.tcgplayer.com/product/{tcgplayer_id}?Language=English&page=1&Printing={printing}&Condition=Near+Mint"
                     logging.info(f"TCGPlayer URL for {card_name} ({set_symbol}): {url}")
-                    tcgplayer_card_id = run_playwright_script(url)
+                    tcgplayer_card_id = resolved.get(url)
                     logging.info(f"DEBUG: tcgplayer_card_id returned: {repr(tcgplayer_card_id)}")
                     manabox_db_updater.add_tcgplayer_card_id_to_db(scryfall_id, tcgplayer_card_id, is_foil)
             else:                
@@ -1,7 +1,6 @@
-from functions import widgets
+from functions import widgets, inventory
 import streamlit as st
 import os 
-import pandas as pd
 from functions import widgets
 widgets.show_pages_sidebar()
 
@@ -37,14 +36,15 @@ def sidebar(df):
         search_text = st.text_input(
             "Filter cards", "", placeholder="Type part of a card name or number..."
         )
+        options = inventory.cached_options(df)
         product_line = st.selectbox(
-            "Product Line", options=["All"] + df["Product Line"].unique().tolist(), index=0
+            "Product Line", options=["All"] + options["lines"], index=0
         )
         set_name = st.selectbox(
-            "Set Name", options=["All"] + df[df["Product Line"] == product_line]["Set Name"].unique().tolist() if product_line != "All" else ["All"], index=0
+            "Set Name", options=["All"] + inventory.set_options(options, product_line) if product_line != "All" else ["All"], index=0
         )
         rarity_filter = st.selectbox(
-            "Rarity", options=["All"] + df[(df["Product Line"] == product_line) & (df["Set Name"] == set_name)]["Rarity"].unique().tolist() if set_name != "All" else ["All"], index=0
+            "Rarity", options=["All"] + inventory.rarity_options(options, product_line, set_name) if set_name != "All" else ["All"], index=0
         )
 
         st.markdown("---")
@@ -146,8 +146,7 @@ def load_data():
     # Only load once, when not already in session_state
     if "repricer_csv" not in st.session_state:
         try:
-            st.session_state.repricer_csv = pd.read_csv(
-                csv_path)  # Adjust path if needed
+            st.session_state.repricer_csv = inventory.load_inventory(csv_path)
             st.toast("Test CSV loaded from repo.")
         except FileNotFoundError:
             st.toast("CSV file not found. Check the path.")
@@ -202,7 +201,7 @@ def inventory_summary_tab(df):
         st.write(f"**Total Quantity of Cards:** {total_quantity}")
 
         # Rarity Counts
-        rarity_counts = df["Rarity"].value_counts()
+        rarity_counts = df["Rarity"].value_counts(observed=True)
         st.write("**Rarity Counts:**")
         # Transpose the DataFrame to show rarity names on top and autosize
         st.dataframe(rarity_counts.to_frame().T, use_container_width=True)
@@ -247,7 +246,7 @@ def inventory_summary_tab(df):
 
             # Rarity Counts in filtered data
             filtered_rarity_counts = st.session_state.filtered_df["Rarity"].value_counts(
-            )
+                observed=True)
             st.write("**Rarity Counts (Filtered):**")
             # Transpose the DataFrame for filtered rarity counts and autosize
             st.dataframe(filtered_rarity_counts.to_frame().T, use_container_width=True)
@@ -312,11 +311,15 @@ def main():
     uploaded_file = st.file_uploader("Upload CSV", type=["csv"], key="inventory_csv_uploader")
     # If user removes the file (presses X), clear session state and show only uploader
     if uploaded_file:
-        st.session_state.repricer_csv = pd.read_csv(uploaded_file)
-        st.toast("CSV uploaded.")
+        # Read each upload once, reruns reuse the loaded inventory
+        if st.session_state.get("inventory_upload_id") != uploaded_file.file_id:
+            st.session_state.repricer_csv = inventory.load_inventory(uploaded_file)
+            st.session_state.inventory_upload_id = uploaded_file.file_id
+            st.toast("CSV uploaded.")
     elif "repricer_csv" in st.session_state:
         # If file is removed, clear all related session state
         del st.session_state.repricer_csv
+        st.session_state.pop("inventory_upload_id", None)
         if "filtered_df" in st.session_state:
             del st.session_state.filtered_df
         st.info("Please upload a CSV file to begin managing your inventory.")
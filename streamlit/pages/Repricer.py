@@ -1,7 +1,7 @@
 import os
 import streamlit as st
 import pandas as pd
-from functions import widgets
+from functions import db, widgets, repricing_engine, inventory
 import logging
 from st_aggrid import AgGrid, GridOptionsBuilder
 from functions import widgets
@@ -17,8 +17,7 @@ def load_data():
     # Only load once, when not already in session_state
     if "repricer_csv" not in st.session_state:
         try:
-            st.session_state.repricer_csv = pd.read_csv(
-                csv_path)  # Adjust path if needed
+            st.session_state.repricer_csv = inventory.load_inventory(csv_path)
             st.toast("Test CSV loaded from repo.")
         except FileNotFoundError:
             st.toast("CSV file not found. Check the path.")
@@ -80,6 +79,37 @@ def analyze_repricing(df, threshold=10):
     return suggested_repricing
 
 
+@st.cache_data(ttl=600, show_spinner="Loading listings and sales...")
+def load_market_data(product_ids):
+    """
+    Latest listings and 7-day sales for every TCGplayer Id in the inventory, in one query.
+    """
+    with db.pooled_connection("tcgplayerdb") as connection:
+        rows = db.get_market_data(connection, list(product_ids))
+    return repricing_engine.market_table(rows)
+
+
+def rule_index(df, rules=()):
+    """
+    The rule match cache for the loaded inventory. Saving new prices edits the
+    inventory in place, so those paths drop the cache. Market data is fetched
+    the first time `rules` use a market-data action.
+    """
+    index = st.session_state.get("repricer_rule_index")
+    if index is None or not index.matches(df):
+        index = repricing_engine.RuleMatchIndex(df)
+        st.session_state.repricer_rule_index = index
+    if not index.has_market and repricing_engine.uses_market_data(rules):
+        try:
+            market = load_market_data(repricing_engine.product_ids(df))
+        except Exception as e:
+            logging.error(f"Error loading market data: {e}")
+            st.warning("Market data is unavailable, rules using it keep the current prices.")
+            market = repricing_engine.market_table([])
+        index.attach_market(market)
+    return index
+
+
 def sidebar(df):
     st.markdown("### 🔍 Inventory Management")
     with st.expander("Filter Options", expanded=True):
@@ -111,14 +141,15 @@ def sidebar(df):
         search_text = st.text_input(
             "Filter cards", "", placeholder="Type part of a card name or number..."
         )
+        options = inventory.cached_options(df)
         product_line = st.selectbox(
-            "Product Line", options=["All"] + df["Product Line"].unique().tolist(), index=0
+            "Product Line", options=["All"] + options["lines"], index=0
         )
         set_name = st.selectbox(
-            "Set Name", options=["All"] + df[df["Product Line"] == product_line]["Set Name"].unique().tolist() if product_line != "All" else ["All"], index=0
+            "Set Name", options=["All"] + inventory.set_options(options, product_line) if product_line != "All" else ["All"], index=0
         )
         rarity_filter = st.selectbox(
-            "Rarity", options=["All"] + df[(df["Product Line"] == product_line) & (df["Set Name"] == set_name)]["Rarity"].unique().tolist() if set_name != "All" else ["All"], index=0
+            "Rarity", options=["All"] + inventory.rarity_options(options, product_line, set_name) if set_name != "All" else ["All"], index=0
         )
 
         st.markdown("---")
@@ -270,9 +301,10 @@ def repricing_tabs(df, selected_columns):
 def repricing_rules(df, selected_columns):
     # --- Load inventory (replace with your actual loading logic) ---
     if "repricer_csv" not in st.session_state:
-        st.session_state.repricer_csv = pd.read_csv("streamlit/pages/TestInventory.csv")
+        st.session_state.repricer_csv = inventory.load_inventory("streamlit/pages/TestInventory.csv")
 
-    df = st.session_state.repricer_csv.copy()
+    df = st.session_state.repricer_csv
+    options = inventory.cached_options(df)
 
     # --- Session state for rules ---
     if "repricer_rules" not in st.session_state:
@@ -291,17 +323,11 @@ def repricing_rules(df, selected_columns):
                 st.warning("Rule name is required.")
             elif rule_name.strip() in all_rule_names or rule_name.strip() in all_saved_names:
                 st.warning("Rule name must be unique.")
-            card_type_options = ["All"] + sorted([str(x) for x in df["Product Line"].dropna().unique()])
+            card_type_options = ["All"] + options["lines"]
             card_type = st.selectbox("Card Type", card_type_options, key="add_rule_card_type")
-            if card_type == "All":
-                set_options = ["All"] + sorted([str(x) for x in df["Set Name"].dropna().unique()])
-            else:
-                set_options = ["All"] + sorted([str(x) for x in df[df["Product Line"] == card_type]["Set Name"].dropna().unique()])
+            set_options = ["All"] + inventory.set_options(options, card_type)
             set_name = st.selectbox("Set", set_options, key="add_rule_set_name")
-            if set_name == "All":
-                rarity_options = ["All"] + sorted([str(x) for x in df[(df["Product Line"] == card_type) | (card_type == "All")]["Rarity"].dropna().unique()])
-            else:
-                rarity_options = ["All"] + sorted([str(x) for x in df[(df["Set Name"] == set_name) & ((df["Product Line"] == card_type) | (card_type == "All"))]["Rarity"].dropna().unique()])
+            rarity_options = ["All"] + inventory.rarity_options(options, card_type, set_name)
             rarity = st.selectbox("Rarity", rarity_options, key="add_rule_rarity")
         with col2:
             min_price = st.number_input("Min Price", value=0.0, key="add_rule_min_price")
@@ -309,11 +335,10 @@ def repricing_rules(df, selected_columns):
             min_qty = st.number_input("Min Quantity", value=0, key="add_rule_min_qty")
             max_qty = st.number_input("Max Quantity", value=1000, key="add_rule_max_qty")
         with col3:
-            condition = st.selectbox("Condition", ["All"] + sorted(df["Condition"].unique()), key="add_rule_condition")
-            action_type = st.selectbox("Action", [
-                "Set to Market + X%", "Set to Market + $X", "Set to Fixed Value", "Set to Market Price"
-            ], key="add_rule_action_type")
-            action_value = st.number_input("Value (for % or $ or fixed)", value=0.0, key="add_rule_action_value")
+            condition = st.selectbox("Condition", ["All"] + options["conditions"], key="add_rule_condition")
+            action_type = st.selectbox("Action", repricing_engine.ACTION_TYPES, key="add_rule_action_type")
+            action_value = st.number_input("Value (for % or $ or fixed)", value=0.0, key="add_rule_action_value",
+                                           help="For Velocity-Weighted Price, the sales per day at which the price follows the 7-day median sale")
         save_col, cancel_col = st.columns(2)
         with save_col:
             if st.button("Save Rule", key="add_rule_save_btn", disabled=name_exists):
@@ -348,30 +373,9 @@ def repricing_rules(df, selected_columns):
     with st.popover("Preview Rule Effects", use_container_width=True):
         
         if "repricer_csv" in st.session_state:
-            preview_df = st.session_state.repricer_csv.copy()
-            preview_df["Affected Rule"] = "None"
-            preview_df["New Price"] = preview_df["TCG Marketplace Price"]
-            for rule in st.session_state.repricer_rules:
-                affected_rows = preview_df[
-                    (preview_df["Product Line"] == rule["card_type"] if rule["card_type"] != "All" else True) &
-                    (preview_df["Set Name"] == rule["set_name"] if rule["set_name"] != "All" else True) &
-                    (preview_df["Rarity"] == rule["rarity"] if rule["rarity"] != "All" else True) &
-                    (preview_df["TCG Marketplace Price"] >= rule["min_price"]) &
-                    (preview_df["TCG Marketplace Price"] <= rule["max_price"]) &
-                    (preview_df["Total Quantity"] >= rule["min_qty"]) &
-                    (preview_df["Total Quantity"] <= rule["max_qty"]) &
-                    (preview_df["Condition"] == rule["condition"] if rule["condition"] != "All" else True)
-                ]
-                preview_df.loc[affected_rows.index, "Affected Rule"] = f"{rule['action_type']} ({rule['action_value']})"
-                if rule["action_type"] == "Set to Market + X%":
-                    preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] * (1 + rule["action_value"] / 100)).round(2)
-                elif rule["action_type"] == "Set to Market + $X":
-                    preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] + rule["action_value"]).round(2)
-                elif rule["action_type"] == "Set to Fixed Value":
-                    preview_df.loc[affected_rows.index, "New Price"] = rule["action_value"]
-                elif rule["action_type"] == "Set to Market Price":
-                    preview_df.loc[affected_rows.index, "New Price"] = preview_df.loc[affected_rows.index, "TCG Market Price"].round(2)
-            preview_df["New Price"] = preview_df["New Price"].astype(float)
+            preview_df = repricing_engine.preview(st.session_state.repricer_csv, st.session_state.repricer_rules,
+                                                  index=rule_index(st.session_state.repricer_csv, st.session_state.repricer_rules),
+                                                  view="current")
             st.session_state.preview_df = preview_df  # <-- Store in session state
             display_df = preview_df
             if ignore_unaffected:
@@ -398,6 +402,7 @@ def repricing_rules(df, selected_columns):
             updated.set_index(key_cols, inplace=True)
             st.session_state.repricer_csv.update(updated)
             st.session_state.repricer_csv.reset_index(inplace=True)
+            st.session_state.pop("repricer_rule_index", None)
             # Also update filtered_df if it exists
             if "filtered_df" in st.session_state and st.session_state.filtered_df is not None:
                 st.session_state.filtered_df.set_index(key_cols, inplace=True)
@@ -448,25 +453,19 @@ def repricing_rules(df, selected_columns):
                             elif edit["name"].strip() in all_names:
                                 st.warning("Rule name must be unique.")
                         with col2e:
-                            card_type_options = ["All"] + sorted([str(x) for x in df["Product Line"].dropna().unique()])
+                            card_type_options = ["All"] + options["lines"]
                             edit["card_type"] = st.selectbox("Card Type", card_type_options, index=card_type_options.index(edit.get("card_type", "All")), key=f"edit_card_type_{rule_name}")
-                            if edit["card_type"] == "All":
-                                set_options = ["All"] + sorted([str(x) for x in df["Set Name"].dropna().unique()])
-                            else:
-                                set_options = ["All"] + sorted([str(x) for x in df[df["Product Line"] == edit["card_type"]]["Set Name"].dropna().unique()])
+                            set_options = ["All"] + inventory.set_options(options, edit["card_type"])
                             edit["set_name"] = st.selectbox("Set", set_options, index=set_options.index(edit.get("set_name", "All")), key=f"edit_set_{rule_name}")
-                            if edit["set_name"] == "All":
-                                rarity_options = ["All"] + sorted([str(x) for x in df[(df["Product Line"] == edit["card_type"]) | (edit["card_type"] == "All")]["Rarity"].dropna().unique()])
-                            else:
-                                rarity_options = ["All"] + sorted([str(x) for x in df[(df["Set Name"] == edit["set_name"]) & ((df["Product Line"] == edit["card_type"]) | (edit["card_type"] == "All"))]["Rarity"].dropna().unique()])
+                            rarity_options = ["All"] + inventory.rarity_options(options, edit["card_type"], edit["set_name"])
                             edit["rarity"] = st.selectbox("Rarity", rarity_options, index=rarity_options.index(edit.get("rarity", "All")), key=f"edit_rarity_{rule_name}")
                         with col3e:
                             edit["min_price"] = st.number_input("Min Price", value=float(edit.get("min_price", 0.0)), key=f"edit_min_price_{rule_name}")
                             edit["max_price"] = st.number_input("Max Price", value=float(edit.get("max_price", 1000.0)), key=f"edit_max_price_{rule_name}")
                             edit["min_qty"] = st.number_input("Min Quantity", value=int(edit.get("min_qty", 0)), key=f"edit_min_qty_{rule_name}")
                             edit["max_qty"] = st.number_input("Max Quantity", value=int(edit.get("max_qty", 1000)), key=f"edit_max_qty_{rule_name}")
-                            edit["condition"] = st.selectbox("Condition", ["All"] + sorted(df["Condition"].unique()), index=( ["All"] + sorted(df["Condition"].unique())).index(edit.get("condition", "All")), key=f"edit_condition_{rule_name}")
-                            action_types = ["Set to Market + X%", "Set to Market + $X", "Set to Fixed Value", "Set to Market Price"]
+                            edit["condition"] = st.selectbox("Condition", ["All"] + options["conditions"], index=(["All"] + options["conditions"]).index(edit.get("condition", "All")), key=f"edit_condition_{rule_name}")
+                            action_types = repricing_engine.ACTION_TYPES
                             edit["action_type"] = st.selectbox("Action", action_types, index=action_types.index(edit.get("action_type", action_types[0])), key=f"edit_action_type_{rule_name}")
                             edit["action_value"] = st.number_input("Value (for % or $ or fixed)", value=float(edit.get("action_value", 0.0)), key=f"edit_action_value_{rule_name}")
                         save_col, cancel_col = st.columns(2)
@@ -523,24 +522,18 @@ def repricing_rules(df, selected_columns):
                     st.markdown("**Edit Saved Rule**")
                     edit = st.session_state.edit_saved_rule_data
                     edit["name"] = st.text_input("Rule Name", value=edit.get("name", ""), key=f"edit_saved_name_{rule_name}")
-                    card_type_options = ["All"] + sorted([str(x) for x in df["Product Line"].dropna().unique()])
+                    card_type_options = ["All"] + options["lines"]
                     edit["card_type"] = st.selectbox("Card Type", card_type_options, index=card_type_options.index(edit.get("card_type", "All")), key=f"edit_saved_card_type_{rule_name}")
-                    if edit["card_type"] == "All":
-                        set_options = ["All"] + sorted([str(x) for x in df["Set Name"].dropna().unique()])
-                    else:
-                        set_options = ["All"] + sorted([str(x) for x in df[df["Product Line"] == edit["card_type"]]["Set Name"].dropna().unique()])
+                    set_options = ["All"] + inventory.set_options(options, edit["card_type"])
                     edit["set_name"] = st.selectbox("Set", set_options, index=set_options.index(edit.get("set_name", "All")), key=f"edit_saved_set_{rule_name}")
-                    if edit["set_name"] == "All":
-                        rarity_options = ["All"] + sorted([str(x) for x in df[(df["Product Line"] == edit["card_type"]) | (edit["card_type"] == "All")]["Rarity"].dropna().unique()])
-                    else:
-                        rarity_options = ["All"] + sorted([str(x) for x in df[(df["Set Name"] == edit["set_name"]) & ((df["Product Line"] == edit["card_type"]) | (edit["card_type"] == "All"))]["Rarity"].dropna().unique()])
+                    rarity_options = ["All"] + inventory.rarity_options(options, edit["card_type"], edit["set_name"])
                     edit["rarity"] = st.selectbox("Rarity", rarity_options, index=rarity_options.index(edit.get("rarity", "All")), key=f"edit_saved_rarity_{rule_name}")
                     edit["min_price"] = st.number_input("Min Price", value=float(edit.get("min_price", 0.0)), key=f"edit_saved_min_price_{rule_name}")
                     edit["max_price"] = st.number_input("Max Price", value=float(edit.get("max_price", 1000.0)), key=f"edit_saved_max_price_{rule_name}")
                     edit["min_qty"] = st.number_input("Min Quantity", value=int(edit.get("min_qty", 0)), key=f"edit_saved_min_qty_{rule_name}")
                     edit["max_qty"] = st.number_input("Max Quantity", value=int(edit.get("max_qty", 1000)), key=f"edit_saved_max_qty_{rule_name}")
-                    edit["condition"] = st.selectbox("Condition", ["All"] + sorted(df["Condition"].unique()), index=( ["All"] + sorted(df["Condition"].unique())).index(edit.get("condition", "All")), key=f"edit_saved_condition_{rule_name}")
-                    action_types = ["Set to Market + X%", "Set to Market + $X", "Set to Fixed Value", "Set to Market Price"]
+                    edit["condition"] = st.selectbox("Condition", ["All"] + options["conditions"], index=(["All"] + options["conditions"]).index(edit.get("condition", "All")), key=f"edit_saved_condition_{rule_name}")
+                    action_types = repricing_engine.ACTION_TYPES
                     edit["action_type"] = st.selectbox("Action", action_types, index=action_types.index(edit.get("action_type", action_types[0])), key=f"edit_saved_action_type_{rule_name}")
                     edit["action_value"] = st.number_input("Value (for % or $ or fixed)", value=float(edit.get("action_value", 0.0)), key=f"edit_saved_action_value_{rule_name}")
                     save_col, cancel_col = st.columns(2)
@@ -595,30 +588,8 @@ def repricing_templates(df, selected_columns):
             selected_rules = template["rules"]
             st.info(f"Previewing template: {selected_template}")
             # Preview logic (apply rules in order)
-            preview_df = st.session_state.repricer_csv.copy()
-            preview_df["Affected Rule"] = "None"
-            preview_df["New Price"] = preview_df["TCG Marketplace Price"]
-            for rule in selected_rules:
-                affected_rows = preview_df[
-                    (preview_df["Product Line"] == rule["card_type"] if rule["card_type"] != "All" else True) &
-                    (preview_df["Set Name"] == rule["set_name"] if rule["set_name"] != "All" else True) &
-                    (preview_df["Rarity"] == rule["rarity"] if rule["rarity"] != "All" else True) &
-                    (preview_df["TCG Marketplace Price"] >= rule["min_price"]) &
-                    (preview_df["TCG Marketplace Price"] <= rule["max_price"]) &
-                    (preview_df["Total Quantity"] >= rule["min_qty"]) &
-                    (preview_df["Total Quantity"] <= rule["max_qty"]) &
-                    (preview_df["Condition"] == rule["condition"] if rule["condition"] != "All" else True)
-                ]
-                preview_df.loc[affected_rows.index, "Affected Rule"] = f"{rule['name']} ({rule['action_type']} {rule['action_value']})"
-                if rule["action_type"] == "Set to Market + X%":
-                    preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] * (1 + rule["action_value"] / 100)).round(2)
-                elif rule["action_type"] == "Set to Market + $X":
-                    preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] + rule["action_value"]).round(2)
-                elif rule["action_type"] == "Set to Fixed Value":
-                    preview_df.loc[affected_rows.index, "New Price"] = rule["action_value"]
-                elif rule["action_type"] == "Set to Market Price":
-                    preview_df.loc[affected_rows.index, "New Price"] = preview_df.loc[affected_rows.index, "TCG Market Price"].round(2)
-            preview_df["New Price"] = preview_df["New Price"].astype(float)
+            preview_df = repricing_engine.preview(st.session_state.repricer_csv, selected_rules, label=repricing_engine.named_label,
+                                                  index=rule_index(st.session_state.repricer_csv, selected_rules), view="template")
             display_df = preview_df[preview_df["Affected Rule"] != "None"]
             required_cols = ["Product Line", "Set Name", "Product Name", "TCG Marketplace Price", "TCG Market Price", "New Price", "Affected Rule"]
             for col in required_cols:
@@ -636,6 +607,7 @@ def repricing_templates(df, selected_columns):
                 updated.set_index(key_cols, inplace=True)
                 st.session_state.repricer_csv.update(updated)
                 st.session_state.repricer_csv.reset_index(inplace=True)
+                st.session_state.pop("repricer_rule_index", None)
                 if "filtered_df" in st.session_state and st.session_state.filtered_df is not None:
                     st.session_state.filtered_df.set_index(key_cols, inplace=True)
                     st.session_state.filtered_df.update(updated)
@@ -659,30 +631,8 @@ def repricing_templates(df, selected_columns):
         st.info("Select at least one saved rule to preview changes.")
         return
     selected_rules = [r for r, name in zip(st.session_state.saved_rules, rule_names) if name in selected_rule_names]
-    preview_df = st.session_state.repricer_csv.copy()
-    preview_df["Affected Rule"] = "None"
-    preview_df["New Price"] = preview_df["TCG Marketplace Price"]
-    for rule in selected_rules:
-        affected_rows = preview_df[
-            (preview_df["Product Line"] == rule["card_type"] if rule["card_type"] != "All" else True) &
-            (preview_df["Set Name"] == rule["set_name"] if rule["set_name"] != "All" else True) &
-            (preview_df["Rarity"] == rule["rarity"] if rule["rarity"] != "All" else True) &
-            (preview_df["TCG Marketplace Price"] >= rule["min_price"]) &
-            (preview_df["TCG Marketplace Price"] <= rule["max_price"]) &
-            (preview_df["Total Quantity"] >= rule["min_qty"]) &
-            (preview_df["Total Quantity"] <= rule["max_qty"]) &
-            (preview_df["Condition"] == rule["condition"] if rule["condition"] != "All" else True)
-        ]
-        preview_df.loc[affected_rows.index, "Affected Rule"] = f"{rule['name']} ({rule['action_type']} {rule['action_value']})"
-        if rule["action_type"] == "Set to Market + X%":
-            preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] * (1 + rule["action_value"] / 100)).round(2)
-        elif rule["action_type"] == "Set to Market + $X":
-            preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] + rule["action_value"]).round(2)
-        elif rule["action_type"] == "Set to Fixed Value":
-            preview_df.loc[affected_rows.index, "New Price"] = rule["action_value"]
-        elif rule["action_type"] == "Set to Market Price":
-            preview_df.loc[affected_rows.index, "New Price"] = preview_df.loc[affected_rows.index, "TCG Market Price"].round(2)
-    preview_df["New Price"] = preview_df["New Price"].astype(float)
+    preview_df = repricing_engine.preview(st.session_state.repricer_csv, selected_rules, label=repricing_engine.named_label,
+                                          index=rule_index(st.session_state.repricer_csv, selected_rules), view="selection")
     display_df = preview_df[preview_df["Affected Rule"] != "None"]
     required_cols = ["Product Line", "Set Name", "Product Name", "TCG Marketplace Price", "TCG Market Price", "New Price", "Affected Rule"]
     for col in required_cols:
@@ -700,6 +650,7 @@ def repricing_templates(df, selected_columns):
         updated.set_index(key_cols, inplace=True)
         st.session_state.repricer_csv.update(updated)
         st.session_state.repricer_csv.reset_index(inplace=True)
+        st.session_state.pop("repricer_rule_index", None)
         if "filtered_df" in st.session_state and st.session_state.filtered_df is not None:
             st.session_state.filtered_df.set_index(key_cols, inplace=True)
             st.session_state.filtered_df.update(updated)
@@ -722,8 +673,10 @@ def main():
 
     # Allow user to upload a CSV file
     uploaded_file = st.file_uploader("Upload CSV", type=["csv"])
-    if uploaded_file:
-        st.session_state.repricer_csv = pd.read_csv(uploaded_file)
+    if uploaded_file and st.session_state.get("inventory_upload_id") != uploaded_file.file_id:
+        # Read each upload once, so prices saved since are not reloaded away
+        st.session_state.repricer_csv = inventory.load_inventory(uploaded_file)
+        st.session_state.inventory_upload_id = uploaded_file.file_id
         st.toast("CSV uploaded.")
 
     # Initialize session state variables
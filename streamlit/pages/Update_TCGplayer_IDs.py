@@ -1,12 +1,10 @@
 import streamlit as st
-import os
 import logging
-import subprocess
-import json
 import psycopg2
 import time
 import pandas as pd
-from functions import widgets
+from functions import widgets, browser_pool, card_cache
+from functions.update_tcgplayer_ids_from_json import product_urls, BATCH_SIZE
 
 widgets.show_pages_sidebar()
 # Check if user is logged in and is 'rmangana'
@@ -16,29 +14,31 @@ if not st.session_state.get('current_user') or st.session_state['current_user']
     st.stop()
     
 
-def run_playwright_script(url):
-    script_path = os.path.join(os.path.dirname(__file__), '../functions/scrape_playwright.py')
-    result = subprocess.run(
-        ["python", script_path, url],
-        capture_output=True,
-        text=True,
-        env=os.environ.copy(),
-        cwd=os.path.dirname(script_path)
-    )
-    logging.info(f"Subprocess stdout: {result.stdout.strip()}")
-    logging.info(f"Subprocess stderr: {result.stderr.strip()}")
-    if result.returncode != 0:
-        logging.warning(f"Subprocess failed with return code {result.returncode}")
-        return None
-    output = result.stdout.strip()
-    if output and output.isdigit():
-        return output
-    return None
+def resolve_batch(cards, should_resolve):
+    """
+    Resolve the AddToCart IDs for a batch of cards on the shared browser pool.
+
+    Args:
+        cards (list): Scryfall card dicts.
+        should_resolve (callable): (card, printing) -> bool, printing is 'normal' or 'foil'.
+
+    Returns:
+        dict: product url -> AddToCart ID or None
+    """
+    urls = []
+    for card in cards:
+        if not card.get('tcgplayer_id'):
+            continue
+        url_normal, url_foil = product_urls(card['tcgplayer_id'])
+        if should_resolve(card, 'normal'):
+            urls.append(url_normal)
+        if should_resolve(card, 'foil'):
+            urls.append(url_foil)
+    return browser_pool.resolve_add_to_cart_ids(urls)
 
 
-def update_tcgplayer_ids_from_json_streamlit(json_file, dbname='scryfall', selected_sets=None):
+def update_tcgplayer_ids_from_json_streamlit(cards, dbname='scryfall', selected_sets=None):
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s %(message)s')
-    cards = json.load(json_file)
     logging.debug(f"Loaded {len(cards)} cards from JSON.")
     conn = psycopg2.connect(
         dbname=dbname,
@@ -48,6 +48,11 @@ def update_tcgplayer_ids_from_json_streamlit(json_file, dbname='scryfall', selec
         port=5432
     )
     cur = conn.cursor()
+    # Only cards in the selected sets that have a product to scrape
+    cards = [
+        card for card in cards
+        if card.get('tcgplayer_id') and (not selected_sets or card.get('set') in selected_sets)
+    ]
     total = len(cards)
     progress = st.progress(0, text="Starting...")
     updated = 0
@@ -57,15 +62,15 @@ def update_tcgplayer_ids_from_json_streamlit(json_file, dbname='scryfall', selec
     updated_cards = []
     failed_cards = []
     console_output = st.empty()
+    resolved = {}
     for idx, card in enumerate(cards):
-        if selected_sets and card.get('set') not in selected_sets:
-            logging.debug(f"Skipping card {card.get('name', card.get('id'))} because it's not in the selected sets.")
-            continue
+        if idx % BATCH_SIZE == 0:
+            resolved = resolve_batch(
+                cards[idx:idx + BATCH_SIZE],
+                lambda c, printing: c.get('nonfoil', True) if printing == 'normal' else c.get('foil', True)
+            )
         tcgplayer_id = card.get('tcgplayer_id')
         logging.debug(f"Processing card {idx+1}/{total}: {card.get('name', card.get('id'))} (tcgplayer_id={tcgplayer_id})")
-        if not tcgplayer_id:
-            logging.debug(f"Skipping card {card.get('name', card.get('id'))} because tcgplayer_id is missing.")
-            continue
         # Always define these at the start of the loop so they are available everywhere in the loop
         should_scrape_normal = card.get('nonfoil', True)
         should_scrape_foil = card.get('foil', True)
@@ -73,14 +78,11 @@ def update_tcgplayer_ids_from_json_streamlit(json_file, dbname='scryfall', selec
         add_to_cart_id_foil = None
 
         # Only define and use should_scrape_normal/should_scrape_foil in this block
+        url_normal, url_foil = product_urls(tcgplayer_id)
         if should_scrape_normal:
-            url_normal = f"https://www.tcgplayer.com/product/{int(tcgplayer_id)}?Language=English&page=1&Printing=Normal&Condition=Near+Mint"
-            logging.info(f"Scraping TCGplayer URL: {url_normal}")
-            add_to_cart_id_normal = run_playwright_script(url_normal)
+            add_to_cart_id_normal = resolved.get(url_normal)
         if should_scrape_foil:
-            url_foil = f"https://www.tcgplayer.com/product/{int(tcgplayer_id)}?Language=English&page=1&Printing=Foil&Condition=Near+Mint"
-            logging.info(f"Scraping TCGplayer URL: {url_foil}")
-            add_to_cart_id_foil = run_playwright_script(url_foil)
+            add_to_cart_id_foil = resolved.get(url_foil)
         logging.debug(f"Normal AddToCart ID: {add_to_cart_id_normal}")
         logging.debug(f"Foil AddToCart ID: {add_to_cart_id_foil}")
         scryfall_id = card.get('id')
@@ -132,10 +134,9 @@ def update_tcgplayer_ids_from_json_streamlit(json_file, dbname='scryfall', selec
     st.success(f"Done! Updated {updated} cards. Normal: {updated_normal}, Foil: {updated_foil}, Failed: {failed}")
 
 
-def insert_cards_from_json_streamlit(json_file, dbname='scryfall', selected_sets=None):
+def insert_cards_from_json_streamlit(cards, dbname='scryfall', selected_sets=None):
 
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s %(message)s')
-    cards = json.load(json_file)
     filtered_cards = [c for c in cards if c.get('set') in selected_sets]
     st.info(f"Processing {len(filtered_cards)} cards from sets: {', '.join(selected_sets)}")
     conn = psycopg2.connect(
@@ -154,7 +155,24 @@ def insert_cards_from_json_streamlit(json_file, dbname='scryfall', selected_sets
     processed_cards = []
     start_time = time.time()
     estimated_time = None
+    resolved = {}
+    rows_by_id = {}
     for idx, card in enumerate(filtered_cards):
+        if idx % BATCH_SIZE == 0:
+            batch = filtered_cards[idx:idx + BATCH_SIZE]
+            cur.execute(
+                "SELECT id, tcgplayer_id_normal, tcgplayer_id_foil FROM scryfall_to_tcgplayer WHERE id = ANY(%s)",
+                ([c.get('id') for c in batch],)
+            )
+            rows_by_id = {row[0]: row[1:] for row in cur.fetchall()}
+            # Only cards already in the DB get scraped, and only for the missing printings
+            resolved = resolve_batch(
+                [c for c in batch if c.get('id') in rows_by_id],
+                lambda c, printing: (
+                    c.get('nonfoil', True) and rows_by_id[c['id']][0] is None if printing == 'normal'
+                    else c.get('foil', True) and rows_by_id[c['id']][1] is None
+                )
+            )
         should_scrape_normal = card.get('nonfoil', True)
         should_scrape_foil = card.get('foil', True)
         add_to_cart_id_normal = None
@@ -176,8 +194,7 @@ def insert_cards_from_json_streamlit(json_file, dbname='scryfall', selected_sets
         progress.progress((idx + 1) / len(filtered_cards), text=progress_text)
         scryfall_id = card.get('id')
         card_name = card.get('name', scryfall_id)
-        cur.execute("SELECT tcgplayer_id_normal, tcgplayer_id_foil FROM scryfall_to_tcgplayer WHERE id = %s", (scryfall_id,))
-        row = cur.fetchone()
+        row = rows_by_id.get(scryfall_id)
         if row:
             logging.debug(f"DB values for {scryfall_id}: normal={row[0]}, foil={row[1]}")
         else:
@@ -198,11 +215,8 @@ def insert_cards_from_json_streamlit(json_file, dbname='scryfall', selected_sets
                 updated_any = False
                 updated_types = []
                 if should_scrape_normal and row[0] is None and card.get('tcgplayer_id'):
-                    url_normal = f"https://www.tcgplayer.com/product/{int(card.get('tcgplayer_id'))}?Language=English&page=1&Printing=Normal&Condition=Near+Mint"
-                    try:
-                        add_to_cart_id_normal = run_playwright_script(url_normal)
-                    except Exception as e:
-                        normal_timeout = True
+                    url_normal, _ = product_urls(card.get('tcgplayer_id'))
+                    add_to_cart_id_normal = resolved.get(url_normal)
                     if add_to_cart_id_normal:
                         cur.execute(
                             """
@@ -225,11 +239,8 @@ def insert_cards_from_json_streamlit(json_file, dbname='scryfall', selected_sets
                 else:
                     status['Normal'] = 'No Normal Print'
                 if should_scrape_foil and row[1] is None and card.get('tcgplayer_id'):
-                    url_foil = f"https://www.tcgplayer.com/product/{int(card.get('tcgplayer_id'))}?Language=English&page=1&Printing=Foil&Condition=Near+Mint"
-                    try:
-                        add_to_cart_id_foil = run_playwright_script(url_foil)
-                    except Exception as e:
-                        foil_timeout = True
+                    _, url_foil = product_urls(card.get('tcgplayer_id'))
+                    add_to_cart_id_foil = resolved.get(url_foil)
                     if add_to_cart_id_foil:
                         cur.execute(
                             """
@@ -301,14 +312,9 @@ st.title("Update TCGplayer IDs from JSON")
 st.write("Upload a Scryfall-formatted JSON file. The app will let you pick which sets to update, then scrape TCGplayer and update the database, showing progress.")
 json_file = st.file_uploader("Upload JSON file", type=["json"])
 if json_file is not None:
-    # Always load the cards DataFrame and store in session state so it persists across reruns
-    if 'cards_data' not in st.session_state or st.session_state.get('cards_data_filename') != json_file.name:
-        cards = json.load(json_file)
-        st.session_state['cards_data'] = cards
-        st.session_state['cards_data_filename'] = json_file.name
-    else:
-        cards = st.session_state['cards_data']
-    all_sets = sorted(set(card.get('set', '') for card in cards if card.get('set')))
+    # The columnar cache memory-maps the upload after the first parse, so reruns stay cheap
+    cards = card_cache.load_uploaded_card_columns(json_file)
+    all_sets = sorted(str(s) for s in set(cards['set']) if s)
     with st.container():
         col_filter, col_select, col_buttons = st.columns([1, 2, 1])
         with col_filter:
@@ -336,13 +342,8 @@ if json_file is not None:
                     st.session_state['selected_sets'] = []
                     st.rerun()
         st.session_state['selected_sets'] = selected_sets
-        # Rewind file for re-read
-        json_file.seek(0)
         if st.button("Add Selected Sets to DB", help="Add all cards from the selected sets to the database."):
-            from io import StringIO
-            import json as _json
-            cards_data_io = StringIO(_json.dumps(st.session_state['cards_data']))
-            insert_cards_from_json_streamlit(cards_data_io, selected_sets=selected_sets)
+            insert_cards_from_json_streamlit(card_cache.records(cards, sets=selected_sets), selected_sets=selected_sets)
 
 # Move AgGrid display to the bottom and put it in an expander
 if 'processed_cards_df' in st.session_state:
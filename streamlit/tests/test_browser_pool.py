@@ -0,0 +1,44 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from functions.browser_pool import BrowserPool, parse_add_to_cart_id
+
+
+def test_parse_add_to_cart_id():
+    assert parse_add_to_cart_id("AddToCart_FS_5505819-1519259b") == "5505819"
+    assert parse_add_to_cart_id("AddToCart_5505819-1519259b") == "5505819"
+    assert parse_add_to_cart_id(None, "add-to-cart__submit--5505819-1519259b") == "5505819"
+    assert parse_add_to_cart_id(None, None) is None
+
+
+class CrashedContext:
+    async def new_page(self):
+        raise RuntimeError("Target page, context or browser has been closed")
+
+
+def test_context_returned_when_new_page_fails():
+    pool = BrowserPool.__new__(BrowserPool)
+
+    async def resolve():
+        pool._contexts = asyncio.Queue()
+        context = CrashedContext()
+        pool._contexts.put_nowait(context)
+        assert await pool._resolve_one("https://www.tcgplayer.com/product/1") is None
+        assert pool._contexts.get_nowait() is context
+
+    asyncio.run(resolve())
+
+
+def test_run_times_out():
+    pool = BrowserPool.__new__(BrowserPool)
+    pool._loop = asyncio.new_event_loop()
+    threading.Thread(target=pool._loop.run_forever, daemon=True).start()
+    try:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            pool._run(asyncio.sleep(5), timeout=0.05)
+        assert pool._run(asyncio.sleep(0, result="done"), timeout=1) == "done"
+    finally:
+        pool._loop.call_soon_threadsafe(pool._loop.stop)
@@ -0,0 +1,40 @@
+import json
+
+import numpy as np
+
+from functions import card_cache
+
+
+CARDS = [
+    {"id": "a", "name": "Alpha", "set": "dft", "collector_number": "1", "rarity": "rare", "foil": True,
+     "nonfoil": True, "prices": {"usd": "1.50", "usd_foil": None}, "tcgplayer_id": 123,
+     "estimated_pull_probability": 0.1, "frame_effects": ["showcase"], "oracle_text": "dropped"},
+    {"id": "b", "name": "Beta", "set": "fdn", "collector_number": "2", "rarity": "common", "foil": False,
+     "nonfoil": True, "prices": {"usd": None}},
+]
+
+
+def test_load_card_columns_caches_and_memory_maps(tmp_path, monkeypatch):
+    monkeypatch.setattr(card_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "cards.json"
+    source.write_text(json.dumps(CARDS))
+
+    columns = card_cache.load_card_columns(str(source))
+    assert isinstance(columns["usd"], np.memmap)
+    assert list(columns["name"]) == ["Alpha", "Beta"]
+    assert np.isnan(columns["usd"][1])
+    assert columns["tcgplayer_id"][1] == card_cache.MISSING_INT
+
+    # Second load reads the cache instead of the JSON
+    monkeypatch.setattr(card_cache.json, "load", lambda f: (_ for _ in ()).throw(AssertionError("parsed again")))
+    assert list(card_cache.load_card_columns(str(source))["set"]) == ["dft", "fdn"]
+
+
+def test_records_round_trip_and_filter():
+    columns = card_cache.columns_from_cards(CARDS)
+    [card] = card_cache.records(columns, sets=["dft"])
+    assert card["name"] == "Alpha"
+    assert card["prices"] == {"usd": "1.50", "usd_foil": None}
+    assert card["tcgplayer_id"] == 123
+    assert card["frame_effects"] == ["showcase"]
+    assert card_cache.records(columns)[1]["tcgplayer_id"] is None
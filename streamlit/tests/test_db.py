@@ -0,0 +1,193 @@
+import contextlib
+import sys
+import os
+import pytest
+import threading
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', 'functions')))
+from functions import db
+
+
+class Data:
+    def __init__(self, card, listing_quantity, lowest_price, market_price, rarity, card_number, set_name, link):
+        self.card = card
+        self.listing_quantity = listing_quantity
+        self.lowest_price = lowest_price
+        self.market_price = market_price
+        self.rarity = rarity
+        self.card_number = card_number
+        self.set_name = set_name
+        self.link = link
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def copy_expert(self, query, buffer):
+        self.conn.copied.append((query, buffer.read()))
+
+    def execute(self, query, params=None):
+        self.conn.executed.append((query, params))
+        self.rowcount = 2
+
+    def fetchone(self):
+        # to_regclass: None while the table or index does not exist
+        return (None if self.conn.new_table else "latest_prices",)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, new_table=False):
+        self.copied = []
+        self.executed = []
+        self.commits = 0
+        self.new_table = new_table
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def test_bulk_write_db_rejects_bad_rows():
+    conn = FakeConnection()
+    entries = [
+        Data("Pikachu ex", 12, "$1,234.50", "1200", "Ultra Rare,", "#238", "Surging Sparks", "https://x"),
+        Data("Eevee", "n/a", "1.00", "1.00", "Rare", "#1", "Set", "https://y"),
+        Data("Mew", 3, "", "4.00", "Rare", "#2", "Set", "https://z"),
+    ]
+    written, rejects = db.bulk_write_db(conn, entries)
+
+    assert written == 1
+    assert [entry.card for entry, _ in rejects] == ["Eevee", "Mew"]
+    assert conn.commits == 1
+    query, payload = conn.copied[0]
+    assert query.startswith("COPY public.prices")
+    assert payload.startswith("Pikachu ex,12,1234.50,1200.00,Ultra Rare,#238,Surging Sparks,https://x,")
+
+
+def test_bulk_write_db_nothing_valid():
+    conn = FakeConnection()
+    written, rejects = db.bulk_write_db(conn, [Data("", 1, "1", "1", "Rare", "#1", "Set", "")])
+    assert written == 0
+    assert len(rejects) == 1
+    assert conn.copied == []
+
+
+def test_refresh_latest_prices_only_moves_forward():
+    conn = FakeConnection()
+    since = datetime(2025, 5, 1).date()
+    assert db.refresh_latest_prices(conn, since) == 2
+
+    query, params = conn.executed[-1]
+    assert "ON CONFLICT (card, card_number)" in query
+    assert "WHERE public.latest_prices.date <= EXCLUDED.date" in query
+    assert "listing_quantity IS NOT NULL" in query
+    assert params == {"since": since}
+
+
+def test_refresh_latest_prices_backfills_new_table():
+    conn = FakeConnection(new_table=True)
+    db.refresh_latest_prices(conn, datetime(2025, 5, 1).date())
+    assert conn.executed[-1][1] == {"since": None}
+
+
+class FakePooledConnection:
+    closed = 0
+
+    def rollback(self):
+        pass
+
+
+class BrokenPooledConnection(FakePooledConnection):
+    def rollback(self):
+        raise db.psycopg2.InterfaceError("connection already closed")
+
+
+class FakeThreadedPool:
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.free = [FakePooledConnection() for _ in range(maxconn)]
+        self.closed = []
+
+    def getconn(self):
+        return self.free.pop()
+
+    def putconn(self, conn, close=False):
+        if close:
+            self.closed.append(conn)
+            conn = FakePooledConnection()
+        self.free.append(conn)
+
+
+def test_connection_pool_waits_for_free_connection(monkeypatch):
+    monkeypatch.setattr(db.psycopg2.pool, "ThreadedConnectionPool", FakeThreadedPool)
+    pool = db.ConnectionPool("tcgplayerdb", minconn=1, maxconn=1)
+    conn = pool.getconn()
+    with pytest.raises(db.psycopg2.pool.PoolError):
+        pool.getconn(timeout=0.05)
+
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+    assert pool.getconn(timeout=2) is conn
+    stats = pool.stats()
+    assert stats["checkouts"] == 2
+    assert stats["waits"] == 1
+    assert stats["in_use"] == 1
+
+
+def test_connection_pool_logs_slow_waits(monkeypatch, caplog):
+    monkeypatch.setattr(db.psycopg2.pool, "ThreadedConnectionPool", FakeThreadedPool)
+    monkeypatch.setattr(db, "POOL_SLOW_WAIT", 0.01)
+    pool = db.ConnectionPool("tcgplayerdb", minconn=1, maxconn=1)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+    with caplog.at_level("WARNING"):
+        pool.getconn(timeout=2)
+    assert "for a tcgplayerdb connection: tcgplayerdb: 1/1 in use, 2 checkouts, 1 waited" in caplog.text
+
+
+def test_connection_pool_closes_connection_that_fails_rollback(monkeypatch, caplog):
+    monkeypatch.setattr(db.psycopg2.pool, "ThreadedConnectionPool", FakeThreadedPool)
+    monkeypatch.setattr(FakeThreadedPool, "getconn", lambda self: BrokenPooledConnection())
+    pool = db.ConnectionPool("tcgplayerdb", minconn=1, maxconn=1)
+    conn = pool.getconn()
+    with caplog.at_level("WARNING"):
+        pool.putconn(conn)
+    assert pool._pool.closed == [conn]
+    assert "failed to roll back" in caplog.text
+    stats = pool.stats()
+    assert stats["discarded"] == 1
+    assert stats["in_use"] == 0
+    # The slot was released, the next caller does not wait
+    pool.getconn(timeout=0.05)
+
+
+def test_add_precon_values_upserts(monkeypatch):
+    calls = []
+    conn = FakeConnection()
+    monkeypatch.setattr(db, "pooled_connection", lambda dbname: contextlib.nullcontext(conn))
+    monkeypatch.setattr(db.psycopg2.extras, "execute_values",
+                        lambda cursor, query, rows, template=None: calls.append((query, rows)))
+    db.add_precon_values([("Set", "Deck", 10), ("Set", "Deck", 12), ("Set", "Other", 5)])
+
+    query, rows = calls[0]
+    assert "ON CONFLICT (set_name, precon_name, date) DO UPDATE" in query
+    assert rows == [("Set", "Deck", 12.0), ("Set", "Other", 5.0)]
+    # The unique key already exists, nothing to migrate
+    assert not any("CREATE UNIQUE INDEX" in q for q, _ in conn.executed)
+
+
+def test_ensure_precon_values_adds_unique_key():
+    conn = FakeConnection(new_table=True)
+    db.ensure_precon_values(conn)
+    queries = [q for q, _ in conn.executed]
+    assert any("DELETE FROM public.precon_values" in q for q in queries)
+    assert any("CREATE UNIQUE INDEX precon_values_set_precon_date_key" in q for q in queries)
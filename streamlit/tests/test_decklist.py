@@ -0,0 +1,61 @@
+import os
+
+import pandas as pd
+import pytest
+
+from functions import decklist
+
+
+def test_parse_line():
+    assert decklist.parse_line("1 Betor, Ancestor's Voice <borderless> [TDC] (F)") == {
+        "quantity": 1, "set_code": "tdc", "collector_number": "", "name": "Betor, Ancestor's Voice",
+        "treatment": "borderless", "finish": "foil",
+    }
+    card = decklist.parse_line("7 Forest <254> [THB]\n")
+    assert (card["quantity"], card["name"], card["collector_number"], card["finish"]) == (7, "Forest", "254", "nonfoil")
+    assert decklist.parse_line("   ") is None
+    with pytest.raises(ValueError):
+        decklist.parse_line("Sol Ring")
+
+
+def test_compile_decklist_caches_until_modified(tmp_path):
+    path = tmp_path / "Deck.txt"
+    path.write_text("1 Sol Ring [TDC]\n2 Island <251> [TDC]\n")
+    deck = decklist.compile_decklist(str(path))
+    assert list(deck["quantity"]) == [1, 2]
+    assert decklist.compile_decklist(str(path)) is deck
+
+    path.write_text("1 Sol Ring [TDC]\n")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    assert len(decklist.compile_decklist(str(path))) == 1
+
+
+def test_value_decks(tmp_path):
+    (tmp_path / "TDC").mkdir()
+    (tmp_path / "TDC" / "A.txt").write_text("1 Sol Ring [TDC]\n2 Island <251> [TDC]\n")
+    (tmp_path / "TDC" / "B.txt").write_text("1 Sol Ring [TDC] (F)\n1 Unpriced [TDC]\n")
+    decks = decklist.compile_precons(str(tmp_path))
+    keys = decklist.unique_keys(decks)
+    prices = keys.assign(price=[1.5, 0.25, 4.0, float("nan")])
+    values = decklist.value_decks(decks, prices)
+    assert values.to_dict("records") == [
+        {"set_name": "TDC", "precon_name": "A", "value": 2.0},
+        {"set_name": "TDC", "precon_name": "B", "value": 4.0},
+    ]
+    deck = decklist.compile_decklist(decklist.precon_path("TDC", "A", str(tmp_path)))
+    assert decklist.value_decks(deck, prices, by=()) == 2.0
+
+
+def test_bundled_precons_parse():
+    decks = decklist.compile_precons()
+    assert not decks.empty
+    assert decks["quantity"].gt(0).all()
+    assert isinstance(decks, pd.DataFrame)
+
+
+def test_card_values_keeps_unknown_prices():
+    deck = decklist.parse_decklist(["2 Sol Ring [TDC]", "1 Unpriced [TDC]"])
+    prices = decklist.unique_keys(deck).assign(price=[1.5, None])
+    cards = decklist.card_values(deck, prices)
+    assert list(cards["value"]) == [3.0, 0.0]
+    assert cards["price"].isna().tolist() == [False, True]
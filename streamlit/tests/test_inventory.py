@@ -0,0 +1,39 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from functions import inventory
+
+EXPORT = """TCGplayer Id,Product Line,Set Name,Product Name,Title,Number,Rarity,Condition,TCG Market Price,TCG Direct Low,TCG Low Price With Shipping,TCG Low Price,Total Quantity,Add to Quantity,TCG Marketplace Price,Photo URL,Unnamed: 16
+1,Magic: The Gathering,Foundations,Sol Ring,,001,Uncommon,Near Mint,1.50,,1.99,1.25,4,0,1.75,,
+2,Magic: The Gathering,Aetherdrift,Island,,0271,Common,Near Mint Foil,0.10,,0.50,0.05,12,0,0.15,,
+,Pokemon,Surging Sparks,Pikachu ex,,057,Double Rare,Near Mint,3.00,,3.50,2.80,1,0,3.10,,
+4,Magic: The Gathering,Foundations,Llanowar Elves,,227,Common,Lightly Played,0.20,,0.60,0.10,2,0,0.25,,
+"""
+
+
+def test_load_inventory_dtypes():
+    df = inventory.load_inventory(io.StringIO(EXPORT))
+    assert list(df.columns) == list(inventory.COLUMNS)
+    for column in ["Product Line", "Set Name", "Rarity", "Condition"]:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+    assert df["Number"].tolist() == ["001", "0271", "057", "227"]
+    assert df["Total Quantity"].dtype == np.int32
+    assert df["TCGplayer Id"].isna().tolist() == [False, False, True, False]
+
+
+def test_option_lists_cascade():
+    df = inventory.load_inventory(io.StringIO(EXPORT))
+    options = inventory.cached_options(df)
+    assert inventory.cached_options(df) is options
+    assert options["lines"] == ["Magic: The Gathering", "Pokemon"]
+    assert options["conditions"] == ["Lightly Played", "Near Mint", "Near Mint Foil"]
+    assert inventory.set_options(options, "All") == ["Aetherdrift", "Foundations", "Surging Sparks"]
+    assert inventory.set_options(options, "Pokemon") == ["Surging Sparks"]
+    assert inventory.rarity_options(options, "All", "All") == ["Common", "Double Rare", "Uncommon"]
+    assert inventory.rarity_options(options, "Magic: The Gathering", "All") == ["Common", "Uncommon"]
+    assert inventory.rarity_options(options, "All", "Foundations") == ["Common", "Uncommon"]
+    assert inventory.rarity_options(options, "Pokemon", "Foundations") == []
+    # A different frame gets its own lists
+    assert inventory.cached_options(df.head(2))["lines"] == ["Magic: The Gathering"]
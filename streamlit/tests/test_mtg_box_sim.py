@@ -0,0 +1,86 @@
+import random
+
+import numpy as np
+
+from functions import card_cache, mtg_box_sim
+
+
+def make_cards():
+    cards = []
+    for rarity, count, price in (("common", 20, 0.05), ("uncommon", 10, 0.25), ("rare", 6, 1.0), ("mythic", 2, 10.0)):
+        for i in range(count):
+            cards.append({
+                "rarity": rarity,
+                "foil": i % 2 == 0,
+                "estimated_pull_probability": 0.25 if rarity == "mythic" else 1.0,
+                "prices": {"usd": f"{price + i * 0.01:.2f}"},
+            })
+    return cards
+
+
+def test_vectorized_mean_matches_reference_simulator():
+    cards = make_cards()
+    slots = mtg_box_sim.compile_set(cards)["slots"]
+    box_evs = mtg_box_sim.simulate_box_evs(slots, 3000, rng=np.random.default_rng(1), chunk_boxes=700)
+
+    random.seed(1)
+    reference = [mtg_box_sim.simulate_booster_box(cards) for _ in range(300)]
+
+    assert len(box_evs) == 3000
+    assert abs(box_evs.mean() - np.mean(reference)) < 0.05 * np.mean(reference)
+
+
+def test_summary_is_reproducible_with_seed():
+    slots = mtg_box_sim.compile_set(make_cards())["slots"]
+    first = mtg_box_sim.summarize_box_evs(mtg_box_sim.simulate_box_evs(slots, 500, rng=np.random.default_rng(7)))
+    second = mtg_box_sim.summarize_box_evs(mtg_box_sim.simulate_box_evs(slots, 500, rng=np.random.default_rng(7)))
+
+    assert first == second
+    assert first["percentiles"][5] <= first["percentiles"][50] <= first["percentiles"][95]
+    assert sum(first["histogram"][0]) == 500
+
+
+def test_parallel_is_reproducible_and_stops_early(monkeypatch, tmp_path):
+    import json
+    path = tmp_path / "tst_cards.json"
+    path.write_text(json.dumps(make_cards()))
+    monkeypatch.setattr(mtg_box_sim, "set_file_path", lambda set: str(path))
+
+    serial = mtg_box_sim.simulate_parallel("tst", 4000, workers=1, seed=3, batch_boxes=1000)
+    parallel = mtg_box_sim.simulate_parallel("tst", 4000, workers=2, seed=3, batch_boxes=1000)
+    assert serial["mean"] == parallel["mean"]
+    assert serial["boxes"] == 4000
+
+    early = mtg_box_sim.simulate_parallel("tst", 100000, workers=1, seed=3, tolerance=1000, batch_boxes=1000)
+    assert early["stopped_early"]
+    assert early["boxes"] == 1000
+
+
+def test_booster_configs_compile():
+    cards = make_cards()
+    for booster in ("draft", "play", "collector"):
+        config, _ = mtg_box_sim.load_booster_config(booster)
+        compiled = mtg_box_sim.compile_set(cards, config)
+        assert compiled["slots"]
+        assert mtg_box_sim.simulate_box_evs(compiled["slots"], 10, compiled["packs_per_box"]).shape == (10,)
+
+
+def test_slot_rarity_weights_split_across_cards():
+    cards = make_cards()
+    slot = {"count": 1, "rarities": ["rare", "mythic"], "weights": {"rarity": {"rare": 7, "mythic": 1}}, "foil_rate": 1.0}
+    count, cumulative, prices, foil_prices, foil_rate = mtg_box_sim.compile_slot(card_cache.columns_from_cards(cards), slot)
+    assert count == 1 and foil_rate == 1.0
+    assert len(prices) == 8
+    assert abs(cumulative[-1] - 8) < 1e-9
+    assert abs(cumulative[5] - 7) < 1e-9
+
+
+def test_analytic_ev_matches_simulation():
+    compiled = mtg_box_sim.compile_set(make_cards())
+    exact = mtg_box_sim.analytic_ev(compiled)
+    box_evs = mtg_box_sim.simulate_box_evs(compiled["slots"], 20000, compiled["packs_per_box"], np.random.default_rng(11))
+
+    assert abs(exact["box_ev"] - exact["pack_ev"] * 36) < 1e-9
+    assert abs(sum(exact["slots"].values()) - exact["pack_ev"]) < 1e-9
+    assert abs(box_evs.mean() - exact["box_ev"]) < 4 * exact["box_std"] / np.sqrt(len(box_evs))
+    assert abs(box_evs.std() - exact["box_std"]) < 0.05 * exact["box_std"]
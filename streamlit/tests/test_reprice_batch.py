@@ -0,0 +1,53 @@
+import json
+
+import pandas as pd
+
+from functions import repricing_engine, reprice_batch
+
+
+def write_export(path):
+    pd.DataFrame({
+        "TCGplayer Id": ["1", "2", "3", "4"],
+        "Product Line": ["Magic", "Magic", "Pokemon", "Magic"],
+        "Set Name": ["Foundations", "Foundations", "Base Set", "Tarkir"],
+        "Product Name": ["Sol Ring", "Island", "Pikachu", "Forest"],
+        "Number": ["001", "250", "058", "0271"],
+        "Rarity": ["R", "L", "C", "L"],
+        "Condition": ["Near Mint"] * 4,
+        "TCG Market Price": ["2.00", "0.10", "1.00", ""],
+        "Total Quantity": ["3", "10", "1", "4"],
+        "TCG Marketplace Price": ["1.50", "0.25", "1.00", "0.30"],
+    }).to_csv(path, index=False)
+
+
+RULES = [
+    {"name": "magic plus 10%", "card_type": "Magic", "action_type": "Set to Market + X%", "action_value": 10.0},
+    {"name": "pokemon fixed", "card_type": "Pokemon", "action_type": "Set to Fixed Value", "action_value": 1.0},
+]
+
+
+def test_reprice_file_matches_preview(tmp_path):
+    source, output = tmp_path / "export.csv", tmp_path / "upload.csv"
+    write_export(source)
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(json.dumps({"rules": RULES}))
+
+    stats = reprice_batch.reprice_file(str(source), str(output), reprice_batch.load_rules_file(str(rules_path)), chunk_rows=3)
+    result = pd.read_csv(output, dtype=str, keep_default_na=False)
+    assert list(result["Number"]) == ["001", "250", "058", "0271"]
+    # Pikachu's fixed price equals its current price, Forest has no market price
+    assert list(result["TCG Marketplace Price"]) == ["2.20", "0.11", "1.00", "0.30"]
+    assert (stats["rows"], stats["repriced"]) == (4, 2)
+    assert stats["per_rule"] == {"magic plus 10%": 2}
+
+    expected = repricing_engine.preview(pd.read_csv(source), RULES)
+    assert list(expected["New Price"].head(2)) == [2.2, 0.11]
+
+    reprice_batch.reprice_file(str(source), str(output), RULES, changed_only=True)
+    assert list(pd.read_csv(output, dtype=str)["Product Name"]) == ["Sol Ring", "Island"]
+
+
+def test_load_rules_file_template(tmp_path):
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps([{"name": "Nightly", "rules": RULES[:1]}]))
+    assert reprice_batch.load_rules_file(str(path), "Nightly") == RULES[:1]
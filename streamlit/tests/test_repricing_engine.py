@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import repricing_engine
+
+
+def make_inventory(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Product Line": rng.choice(["Magic", "Pokemon", "Lorcana"], rows),
+        "Set Name": rng.choice(["Foundations", "Aetherdrift", "Tarkir", None], rows),
+        "Product Name": [f"Card {i}" for i in range(rows)],
+        "Rarity": rng.choice(["C", "U", "R", "M"], rows),
+        "Condition": rng.choice(["Near Mint", "Lightly Played", "Near Mint Foil"], rows),
+        "Total Quantity": rng.integers(0, 20, rows),
+        "TCG Market Price": rng.gamma(1.0, 5.0, rows).round(2),
+        "TCG Marketplace Price": rng.gamma(1.0, 5.0, rows).round(2),
+    })
+    df.loc[rng.choice(rows, 20), "TCG Marketplace Price"] = np.nan
+    return df
+
+
+def make_rules(count=12, seed=1):
+    rng = np.random.default_rng(seed)
+    rules = []
+    for i in range(count):
+        low = float(rng.uniform(0, 10))
+        rules.append({
+            "name": f"rule {i}",
+            "card_type": str(rng.choice(["All", "Magic", "Pokemon"])),
+            "set_name": str(rng.choice(["All", "Foundations", "Tarkir", "Not In Inventory"])),
+            "rarity": str(rng.choice(["All", "R", "M"])),
+            "condition": str(rng.choice(["All", "Near Mint"])),
+            "min_price": low, "max_price": low + float(rng.uniform(1, 30)),
+            "min_qty": 0, "max_qty": int(rng.integers(5, 20)),
+            "action_type": repricing_engine.ACTION_TYPES[i % 4],
+            "action_value": float(rng.uniform(-5, 15)),
+        })
+    return rules
+
+
+def reference_preview(df, rules, label):
+    # The per-rule loop the Repricer page used before the engine
+    preview_df = df.copy()
+    preview_df["Affected Rule"] = "None"
+    preview_df["New Price"] = preview_df["TCG Marketplace Price"]
+    for rule in rules:
+        affected_rows = preview_df[
+            (preview_df["Product Line"] == rule["card_type"] if rule["card_type"] != "All" else True) &
+            (preview_df["Set Name"] == rule["set_name"] if rule["set_name"] != "All" else True) &
+            (preview_df["Rarity"] == rule["rarity"] if rule["rarity"] != "All" else True) &
+            (preview_df["TCG Marketplace Price"] >= rule["min_price"]) &
+            (preview_df["TCG Marketplace Price"] <= rule["max_price"]) &
+            (preview_df["Total Quantity"] >= rule["min_qty"]) &
+            (preview_df["Total Quantity"] <= rule["max_qty"]) &
+            (preview_df["Condition"] == rule["condition"] if rule["condition"] != "All" else True)
+        ]
+        preview_df.loc[affected_rows.index, "Affected Rule"] = label(rule)
+        if rule["action_type"] == "Set to Market + X%":
+            preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] * (1 + rule["action_value"] / 100)).round(2)
+        elif rule["action_type"] == "Set to Market + $X":
+            preview_df.loc[affected_rows.index, "New Price"] = (preview_df.loc[affected_rows.index, "TCG Market Price"] + rule["action_value"]).round(2)
+        elif rule["action_type"] == "Set to Fixed Value":
+            preview_df.loc[affected_rows.index, "New Price"] = rule["action_value"]
+        elif rule["action_type"] == "Set to Market Price":
+            preview_df.loc[affected_rows.index, "New Price"] = preview_df.loc[affected_rows.index, "TCG Market Price"].round(2)
+    preview_df["New Price"] = preview_df["New Price"].astype(float)
+    return preview_df
+
+
+@pytest.mark.parametrize("label", [repricing_engine.default_label, repricing_engine.named_label])
+def test_preview_matches_rule_by_rule_loop(label):
+    df = make_inventory()
+    rules = make_rules()
+    expected = reference_preview(df, rules, label)
+    result = repricing_engine.preview(df, rules, label=label)
+    assert (result["Affected Rule"] == expected["Affected Rule"]).all()
+    pd.testing.assert_series_equal(result["New Price"], expected["New Price"])
+    # Small blocks give the same answer
+    inventory = repricing_engine.compile_inventory(df)
+    plan = repricing_engine.compile_rules(rules, inventory)
+    np.testing.assert_array_equal(repricing_engine.match_rules(plan, inventory, chunk_rows=7),
+                                  repricing_engine.match_rules(plan, inventory))
+
+
+def test_no_rules_and_unknown_action():
+    df = make_inventory(50)
+    result = repricing_engine.preview(df, [])
+    assert (result["Affected Rule"] == "None").all()
+    pd.testing.assert_series_equal(result["New Price"], df["TCG Marketplace Price"].astype(float), check_names=False)
+    with pytest.raises(ValueError):
+        repricing_engine.preview(df, [{"name": "bad", "action_type": "Halve", "action_value": 0}])
+
+
+def test_rule_match_index_matches_full_evaluation():
+    df = make_inventory()
+    rules = make_rules(8)
+    index = repricing_engine.RuleMatchIndex(df)
+
+    def check(rules, view="current"):
+        result = repricing_engine.preview(df, rules, index=index, view=view)
+        expected = repricing_engine.preview(df, rules)
+        assert (result["Affected Rule"] == expected["Affected Rule"]).all()
+        pd.testing.assert_series_equal(result["New Price"], expected["New Price"])
+
+    check(rules)
+    assert index.stats["masks_computed"] == 8
+
+    # Only an action changed: nothing is re-matched, no new masks
+    edited = [dict(rule) for rule in rules]
+    edited[3]["action_value"] += 10
+    rematched = index.stats["rows_rematched"]
+    check(edited)
+    assert index.stats["masks_computed"] == 8
+    assert index.stats["rows_rematched"] == rematched
+
+    # Append, remove from the middle, reorder, and a second view sharing the masks
+    added = edited + make_rules(1, seed=7)
+    check(added)
+    assert index.stats["masks_computed"] == 9
+    check(added[:2] + added[3:])
+    check(list(reversed(added)))
+    check(added[:4], view="template")
+    check([])
+    assert index.matches(df)
+    assert not index.matches(df.head(10))
+
+
+def test_market_data_actions():
+    df = pd.DataFrame({
+        "TCGplayer Id": [10, 11, 12, 13, None],
+        "Product Line": ["Magic"] * 5,
+        "Set Name": ["Foundations"] * 5,
+        "Rarity": ["R"] * 5,
+        "Condition": ["Near Mint"] * 5,
+        "Total Quantity": [1] * 5,
+        "TCG Market Price": [5.0] * 5,
+        "TCG Marketplace Price": [6.0] * 5,
+    })
+    market = repricing_engine.market_table([
+        (10, 4.00, 5.00, 2.0),
+        (11, 3.00, None, 0.0),
+        (12, None, 8.00, 0.5),
+        (99, 1.00, 1.00, 1.0),
+    ])
+
+    def priced(action_type, value):
+        rule = {"name": "m", "action_type": action_type, "action_value": value}
+        return repricing_engine.preview(df, [rule], market=market)["New Price"].tolist()
+
+    # Row 13 and the row without an id have no market data and keep their price
+    assert priced("Undercut Lowest Listing by $X", 0.25) == [3.75, 2.75, 6.0, 6.0, 6.0]
+    assert priced("Undercut Lowest Listing by $X", 10) == [0.01, 0.01, 6.0, 6.0, 6.0]
+    assert priced("Follow 7-Day Median Sale", 0) == [5.0, 6.0, 8.0, 6.0, 6.0]
+    # Full weight at 4 sales/day: 2/day is halfway from the lowest listing to the median sale
+    assert priced("Velocity-Weighted Price", 4) == [4.5, 3.0, 8.0, 6.0, 6.0]
+    # Without market data every market action leaves prices alone
+    no_market = repricing_engine.preview(df, [{"name": "m", "action_type": "Follow 7-Day Median Sale", "action_value": 0}])
+    assert no_market["New Price"].tolist() == [6.0] * 5
+    assert repricing_engine.product_ids(df) == (10, 11, 12, 13)
+
+
+def test_rule_match_index_attaches_market_data():
+    df = make_inventory(500)
+    df["TCGplayer Id"] = np.arange(len(df))
+    rng = np.random.default_rng(3)
+    market = repricing_engine.market_table(
+        [(i, float(rng.uniform(0.1, 20)), float(rng.uniform(0.1, 20)), float(rng.uniform(0, 3))) for i in range(0, 500, 2)])
+    rules = make_rules(6)
+    for i, action_type in enumerate(repricing_engine.MARKET_ACTIONS):
+        rules[i]["action_type"] = action_type
+    index = repricing_engine.RuleMatchIndex(df)
+    without = repricing_engine.preview(df, rules, index=index)
+    assert not index.has_market
+    index.attach_market(market)
+    result = repricing_engine.preview(df, rules, index=index)
+    expected = repricing_engine.preview(df, rules, market=market)
+    pd.testing.assert_series_equal(result["New Price"], expected["New Price"])
+    assert (result["Affected Rule"] == without["Affected Rule"]).all()
+    assert index.stats["masks_computed"] == 6
+
+
+def test_rule_match_index_empty_inventory():
+    df = make_inventory(10).head(0)
+    rules = make_rules(3)
+    index = repricing_engine.RuleMatchIndex(df)
+    repricing_engine.preview(df, rules, index=index)
+    edited = [dict(rule) for rule in rules]
+    edited[1]["min_price"] += 1
+    result = repricing_engine.preview(df, edited, index=index)
+    assert result.empty
@@ -0,0 +1,31 @@
+from functions.resource_blocker import ResourceBlocker
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resource_type = resource_type
+
+
+def test_should_block_types_and_domains():
+    blocker = ResourceBlocker("test", enabled=True)
+    assert blocker.should_block(FakeRequest("https://www.tcgplayer.com/search", "document")) is None
+    assert blocker.should_block(FakeRequest("https://mp-search-api.tcgplayer.com/v1", "xhr")) is None
+    assert blocker.should_block(FakeRequest("https://tcgplayer-cdn.tcgplayer.com/a.png", "image")) == "type"
+    assert blocker.should_block(FakeRequest("https://www.googletagmanager.com/gtm.js", "script")) == "domain"
+    assert blocker.should_block(FakeRequest("https://eviltcgplayer.com/x.js", "script")) == "domain"
+
+
+def test_allowlist_and_disabled():
+    blocker = ResourceBlocker("test", allowed_types={"document", "stylesheet"}, enabled=True)
+    assert blocker.should_block(FakeRequest("https://www.tcgplayer.com/a.css", "stylesheet")) is None
+    assert ResourceBlocker("test", enabled=False).should_block(FakeRequest("https://x.com/a.png", "image")) is None
+
+
+def test_sales_scraper_keeps_stylesheets():
+    from functions.fetch_all_sales import sales_blocker
+    blocker = sales_blocker()
+    blocker.enabled = True
+    assert blocker.should_block(FakeRequest("https://www.tcgplayer.com/app.css", "stylesheet")) is None
+    assert blocker.should_block(FakeRequest("https://tcgplayer-cdn.tcgplayer.com/a.png", "image")) == "type"
+    assert ResourceBlocker("search", enabled=True).should_block(FakeRequest("https://www.tcgplayer.com/app.css", "stylesheet")) == "type"
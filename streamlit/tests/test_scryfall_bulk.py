@@ -0,0 +1,37 @@
+import io
+import json
+
+from functions import scryfall_bulk
+
+
+CARDS = [
+    {"id": "1", "name": "Sol Ring", "set": "tdc", "collector_number": "101", "frame": "2015",
+     "prices": {"usd": "1.25", "usd_foil": "4.00"}, "tcgplayer_id": 555},
+    {"id": "2", "name": "Sol Ring", "set": "tdc", "collector_number": "350", "frame": "2015",
+     "frame_effects": ["extendedart"], "prices": {"usd": "3.00", "usd_foil": None}},
+    {"id": "3", "name": "Delver of Secrets // Insectile Aberration", "set": "isd", "collector_number": "51",
+     "frame": "2003", "prices": {"usd": "0.50"}},
+]
+
+
+def test_iter_json_array_streams_across_chunks():
+    text = json.dumps(CARDS, indent=2)
+    assert list(scryfall_bulk.iter_json_array(io.StringIO(text), chunk_size=16)) == CARDS
+    assert list(scryfall_bulk.iter_json_array(io.StringIO("[]"))) == []
+
+
+def test_index_lookups(tmp_path):
+    source = tmp_path / "default_cards.json"
+    source.write_text(json.dumps(CARDS))
+    index_path = str(tmp_path / "cards.sqlite")
+    assert scryfall_bulk.build_index(str(source), index_path) == 3
+
+    index = scryfall_bulk.ScryfallIndex(index_path)
+    assert index.price("TDC", "101") == 1.25
+    assert index.price("tdc", "101", "foil") == 4.0
+    assert index.price_by_name("Sol Ring", "tdc") == 1.25
+    assert index.price_by_name("sol ring", "tdc", "extended") == 3.0
+    assert index.price_by_name("Sol Ring", "tdc", "extended", "foil") is None
+    assert index.price_by_name("Delver of Secrets", "isd") == 0.5
+    assert index.tcgplayer_id("tdc", "101") == 555
+    index.close()
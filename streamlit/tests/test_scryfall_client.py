@@ -0,0 +1,64 @@
+from functions import scryfall_client
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeSession:
+
+    def __init__(self, responses=None):
+        self.headers = {}
+        self.calls = []
+        self.responses = list(responses or [])
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if self.responses:
+            return self.responses.pop(0)
+        identifiers = kwargs["json"]["identifiers"]
+        cards = [
+            {"id": f"{i['set']}-{i['collector_number']}", "set": i["set"], "collector_number": i["collector_number"],
+             "name": "Card", "tcgplayer_id": int(i["collector_number"])}
+            for i in identifiers if i.get("collector_number") != "404"
+        ]
+        return FakeResponse(200, {"data": cards})
+
+
+def make_client(session):
+    return scryfall_client.ScryfallClient(session=session, bucket=scryfall_client.TokenBucket(rate=1000))
+
+
+def test_lookups_are_batched_and_cached():
+    session = FakeSession()
+    client = make_client(session)
+    futures = [client.card_by_number("TDC", str(n)) for n in range(1, 101)]
+    missing = client.card_by_number("tdc", "404")
+    assert [f.result(timeout=5)["tcgplayer_id"] for f in futures] == list(range(1, 101))
+    assert missing.result(timeout=5) is None
+    # 101 identifiers fit in two /cards/collection requests
+    assert len(session.calls) == 2
+    assert all(len(kwargs["json"]["identifiers"]) <= scryfall_client.MAX_BATCH for _, _, kwargs in session.calls)
+    assert client.card_by_number("tdc", "7") is futures[6]
+
+
+def test_retries_after_rate_limit(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(scryfall_client.time, "sleep", sleeps.append)
+    session = FakeSession([FakeResponse(429, headers={"Retry-After": "0.5"}), FakeResponse(200, {"data": []})])
+    client = make_client(session)
+    response = client.request("GET", "/cards/search", params={"q": "sol ring"})
+    assert response.status_code == 200
+    assert sleeps == [0.5]
+    assert len(session.calls) == 2
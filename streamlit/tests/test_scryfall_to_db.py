@@ -0,0 +1,67 @@
+import csv
+import json
+
+from functions import scryfall_to_db
+
+
+CARDS = [
+    {"id": "a", "name": "Sol Ring", "set": "tdc", "collector_number": "101", "full_art": False,
+     "prices": {"usd": "1.25"}, "tcgplayer_id": 555},
+    {"id": "b", "name": "Island", "set": "tdc", "collector_number": "251", "full_art": True,
+     "prices": {"usd": "0.10"}},
+]
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.conn.queries.append(query)
+        if "MERGE" in query:
+            self.rowcount = len(self.conn.copied)
+
+    def fetchall(self):
+        return list(self.conn.hashes.items())
+
+    def copy_expert(self, query, buffer):
+        self.conn.copied = list(csv.reader(buffer))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+        self.queries = []
+        self.copied = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_import_only_copies_changed_cards(tmp_path):
+    (tmp_path / "tdc_cards.json").write_text(json.dumps(CARDS))
+    unchanged = scryfall_to_db.content_hash(scryfall_to_db.card_row(CARDS[0]))
+    conn = FakeConnection({"a": unchanged, "b": "stale"})
+
+    assert scryfall_to_db.import_cards(conn, str(tmp_path)) == (2, 1)
+    assert [row[0] for row in conn.copied] == ["b"]
+    assert conn.copied[0][3] == "\\N"  # released_at
+    assert not any("DROP TABLE" in query for query in conn.queries)
+    # Scraped ids are never written by the import
+    assert "tcgplayer_id_normal" not in scryfall_to_db.COLUMNS
+
+    conn = FakeConnection({"a": unchanged, "b": scryfall_to_db.content_hash(scryfall_to_db.card_row(CARDS[1]))})
+    assert scryfall_to_db.import_cards(conn, str(tmp_path)) == (2, 0)
+    assert not any("MERGE" in query for query in conn.queries)